@@ -28,16 +28,10 @@ import os
 #import rogue.interfaces.stream
 #import pyrogue    
 import time
+import types
 import numpy as np
 import ePixViewer.imgProcessing as imgPr
-
-try:
-    from PyQt5.QtWidgets import *
-    from PyQt5.QtCore    import *
-    from PyQt5.QtGui     import *
-except ImportError:
-    from PyQt4.QtCore    import *
-    from PyQt4.QtGui     import *
+import ePixViewer.frameAssembler as frameAssembler
 
 PRINT_VERBOSE = 0
 
@@ -53,6 +47,35 @@ HRADC32x32 = 7
 CRYO64XN   = 8
 EPIXMNX64  = 9
 
+# payload headers, the first dwords of every frame payload
+HEADER_DTYPE_3DW = np.dtype([('dword0', '<u4'), ('acqNum', '<u4'), ('dword2', '<u4')])
+HEADER_DTYPE_8DW = np.dtype(HEADER_DTYPE_3DW.descr + [('dword%d' % i, '<u4') for i in range(3, 8)])
+# header fields decoded by Camera.decodeHeaders, one row per frame
+DECODED_HEADER_DTYPE = np.dtype([('vc', 'u1'), ('asic', 'u1'), ('acqNum', 'u4'), ('asicNum', 'u1'), ('isTOA', 'u1')])
+
+
+################################################################################
+################################################################################
+#   Camera decoder class
+#   Functions decoding the frames of one camera type, see Camera.registerCamera
+################################################################################
+class CameraDecoder():
+    """init, descramble and frame building functions of a camera type.
+       The functions take the Camera as first argument and are bound once per Camera."""
+
+    def __init__(self, init, descramble, buildFrame, descrambleBatch = None, usesPool = False, batchShape = None):
+        self.init = init
+        # descramble(camera, rawData[, pool]) returns the image before the bit mask
+        self.descramble = descramble
+        # buildFrame(camera, currentRawData, newRawData) returns [frameComplete, readyForDisplay, data]
+        self.buildFrame = buildFrame
+        # descrambleBatch(camera, [frames, payload] uint8 array) returns [images, rows, cols]
+        self.descrambleBatch = descrambleBatch
+        # batchShape(camera, payload bytes) returns the image shape of descrambleBatch, or None for a bad length
+        self.batchShape = batchShape
+        # True if descramble takes the BufferPool of its output as pool keyword
+        self.usesPool = usesPool
+
 
 ################################################################################
 ################################################################################
@@ -70,130 +93,236 @@ class Camera():
     sensorWidth = 0
     sensorHeight = 0
     pixelDepth = 0
+    # (rows, cols) pixel block of each common mode grouping, set by the camera init
+    commonModeBlocks = {}
     availableCameras = {  'ePix100a':  EPIX100A, 'ePix100p' : EPIX100P, 'Tixel48x48' : TIXEL48X48, 'ePix10ka' : EPIX10KA,  'Cpix2' : CPIX2, 'ePixM32Array' : EPIXM32, 'HrAdc32x32': HRADC32x32, 'cryo64xN':  CRYO64XN, 'ePixHrePixM' : EPIXMNX64 }
+    # cameras supported by descrambleBatch and the number of frames per image
+    batchCameras = { 'cryo64xN' : 1, 'ePixHrePixM' : 1, 'HrAdc32x32' : 2, 'ePixM32Array' : 2 }
+    # payload header of each camera, mask of the ASIC number and of the TOA flag in header dword 2
+    headerLayouts = { 'ePix100a'     : (HEADER_DTYPE_8DW, 0x0, 0x0), 'ePix100p'   : (HEADER_DTYPE_8DW, 0x0, 0x0),
+                      'ePix10ka'     : (HEADER_DTYPE_8DW, 0x0, 0x0), 'Tixel48x48' : (HEADER_DTYPE_3DW, 0x7, 0x8),
+                      'Cpix2'        : (HEADER_DTYPE_3DW, 0x7, 0x8), 'ePixM32Array' : (HEADER_DTYPE_3DW, 0xF, 0x0),
+                      'HrAdc32x32'   : (HEADER_DTYPE_3DW, 0x7, 0x0), 'cryo64xN'   : (HEADER_DTYPE_3DW, 0x0, 0x0),
+                      'ePixHrePixM'  : (HEADER_DTYPE_3DW, 0x0, 0x0) }
+    # decoder of each camera type, filled by registerCamera
+    decoders = {}
     
 
     def __init__(self, cameraType = 'ePix100a') :
         
-        camID = self.availableCameras.get(cameraType, NOCAMERA)
+        decoder = self.decoders.get(cameraType)
 
         # check if the camera exists
         print("Camera ", cameraType, " selected.")
-        if (camID == NOCAMERA):
+        if decoder is None:
             print("Camera ", cameraType ," not supported")
+            decoder = NO_CAMERA_DECODER
             
         self.cameraType = cameraType
-
-        #selcts proper initialization based on camera type
-        if (camID == EPIX100A):
-            self._initEPix100a()
-        if (camID == EPIX100P):
-            self._initEPix100p()
-        if (camID == TIXEL48X48):
-            self._initTixel48x48()
-        if (camID == EPIX10KA):
-            self._initEpix10ka()
-        if (camID == CPIX2):
-            self._initCpix2()
-        if (camID == EPIXM32):
-            self._initEpixM32()
-        if (camID == HRADC32x32):
-            self._initEpixHRADC32x32()
-        if (camID == CRYO64XN):
-            self._initCRYO64XN()
-        if (camID == EPIXMNX64):
-            self._initEPIXMNX64()
+        #frames that could not be descrambled (wrong length), they are skipped
+        self.descrambleErrors = 0
+
+        #camera specific initialization (geometry, gather plans, frame assembler)
+        decoder.init(self)
+        #the decoder functions are bound once, each frame is then a single method call
+        if decoder.usesPool:
+            self._descramble = types.MethodType(decoder.descramble, self)
+        else:
+            descramble = types.MethodType(decoder.descramble, self)
+            self._descramble = lambda rawData, pool = None: descramble(rawData)
+        self._buildFrame = types.MethodType(decoder.buildFrame, self)
+        self._descrambleBatch = None
+        if decoder.descrambleBatch is not None:
+            self._descrambleBatch = types.MethodType(decoder.descrambleBatch, self)
+        self._batchShape = None
+        if decoder.batchShape is not None:
+            self._batchShape = types.MethodType(decoder.batchShape, self)
 
         #creates a image processing tool for local use
         self.imgTool = imgPr.ImageProcessing(self)
+        #recycles the descrambled images between frames (see descrambleImage out parameter)
+        self.bufferPool = imgPr.BufferPool()
         
     # return a dict with all available cameras    
     def getAvailableCameras():
         return self.availableCameras
 
+    @classmethod
+    def registerCamera(cls, cameraType, init, descramble, buildFrame = None, descrambleBatch = None, usesPool = False,
+                       framesPerImage = 1, headerLayout = None, batchShape = None):
+        """adds a camera type, or replaces the decoder of an existing one.
+           init, descramble, buildFrame, descrambleBatch and batchShape are functions taking
+           the Camera as first argument (see CameraDecoder), buildFrame defaults to one frame
+           per image and batchShape to the sensor size.
+           framesPerImage is used by the batch readers when descrambleBatch is given and
+           headerLayout is (header dtype, asicNum mask, isTOA mask) for decodeHeaders."""
+        if buildFrame is None:
+            buildFrame = cls._buildFrameSingle
+        cls.decoders[cameraType] = CameraDecoder(init, descramble, buildFrame, descrambleBatch, usesPool, batchShape)
+        if cameraType not in cls.availableCameras:
+            cls.availableCameras[cameraType] = max(cls.availableCameras.values()) + 1
+        if descrambleBatch is not None:
+            cls.batchCameras[cameraType] = framesPerImage
+        if headerLayout is not None:
+            cls.headerLayouts[cameraType] = headerLayout
+
     # return the descrambled image based on the current camera settings
-    def descrambleImage(self, rawData):
-        camID = self.availableCameras.get(self.cameraType, NOCAMERA)
-        if (camID == EPIX100A):
-            descImg = self._descrambleEPix100aImage(rawData)
-            return self.imgTool.applyBitMask(descImg, mask = self.bitMask)
-        if (camID == EPIX100P):
-            descImg = self._descrambleEPix100aImage(rawData)        
-            return self.imgTool.applyBitMask(descImg, mask = self.bitMask)
-        if (camID == TIXEL48X48):
-            descImg = self._descrambleTixel48x48Image(rawData) 
-            return self.imgTool.applyBitMask(descImg, mask = self.bitMask)
-        if (camID == EPIX10KA):
-            descImg = self._descrambleEPix100aImage(rawData)
+    def descrambleImage(self, rawData, out = None):
+        """returns the descrambled image with the bit mask applied, or None if the frame
+           cannot be descrambled (counted in descrambleErrors).
+           out is None (new arrays), an array of the image shape, or a BufferPool
+           (usually self.bufferPool) recycling the arrays between frames. With a pool
+           the image can come back in the unsigned type of the bit mask (same values)."""
+        # intermediate arrays also come from the pool when an output is given
+        pool = None if out is None else self.bufferPool
+        descImg = self._descramble(rawData, pool = pool)
+        if descImg is None:
+            return None
+        return self._maskImage(descImg, out, pool)
+
+    def processImage(self, rawData, out = None, pedestal = None, gain = None, dtype = np.float32, returnDescrambled = False,
+                     commonMode = None):
+        """descramble, bit mask, pedestal subtraction and gain in a single call:
+           (descrambled image & bitMask - pedestal) * gain.
+           A commonMode correction (see commonModeCorrection) is then applied in place.
+           The descrambled image is gathered and masked in a pooled buffer and the
+           conversion to dtype, subtraction and gain are written straight into out
+           (an array, a BufferPool or None for a new array). pedestal and gain of the
+           same dtype as the output avoid a conversion on every call.
+           With returnDescrambled = True returns [descrambled image, processed image].
+           Returns None for frames that cannot be descrambled."""
+        descImg = self.descrambleImage(rawData, out = self.bufferPool)
+        if descImg is None:
+            return [None, None] if returnDescrambled else None
+        if isinstance(out, imgPr.BufferPool):
+            out = out.get(descImg.shape, dtype)
+        procImg = self.imgTool.subtractPedestal(descImg, pedestal = pedestal, gain = gain, out = out, dtype = dtype)
+        if commonMode is not None:
+            commonMode.correct(procImg, out = procImg)
+        if returnDescrambled:
+            return [descImg, procImg]
+        return procImg
+
+    def commonModeCorrection(self, grouping = 'adc', method = 'median', hitThreshold = None):
+        """returns the common mode correction of one of the groupings of the camera
+           (commonModeBlocks keys) with method 'median', 'mean' or 'maskedMean'"""
+        if grouping not in self.commonModeBlocks:
+            raise ValueError("Camera " + self.cameraType + ": no common mode grouping " + str(grouping))
+        return imgPr.CommonModeCorrection(self.commonModeBlocks[grouping], method = method, hitThreshold = hitThreshold)
+
+    def _maskImage(self, descImg, out, pool):
+        """applies the bit mask, in place on pool buffers when the masked dtype does not change.
+           A mask keeping every bit of unsigned samples is skipped. An out array of another
+           dtype receives the masked values converted (as subtractPedestal does)."""
+        if self._maskIsNoOp(descImg.dtype):
+            if out is None:
+                return descImg if descImg.flags.owndata else descImg.copy()
+            if isinstance(out, imgPr.BufferPool):
+                if (pool is not None) and pool.owns(descImg):
+                    return descImg
+                out = out.get(descImg.shape, descImg.dtype)
+            np.copyto(out, descImg, casting = 'unsafe')
+            return out
+        if out is None:
             return self.imgTool.applyBitMask(descImg, mask = self.bitMask)
-        if (camID == CPIX2):
-            descImg = self._descrambleCpix2Image(rawData)
-            return self.imgTool.applyBitMask(descImg, mask = self.bitMask)
-        if (camID == EPIXM32):
-            descImg = self._descrambleEpixM32Image(rawData)
-            return self.imgTool.applyBitMask(descImg, mask = self.bitMask)
-        if (camID == HRADC32x32):
-            descImg = self._descrambleEpixHRADC32x32Image(rawData)
-            return self.imgTool.applyBitMask(descImg, mask = self.bitMask)
-        if (camID == CRYO64XN):
-            descImg = self._descrambleCRYO64XNImage(rawData)
-            return self.imgTool.applyBitMask(descImg, mask = self.bitMask)
-        if (camID == EPIXMNX64):
-            descImg = self._descrambleEPIXMNX64Image(rawData)
-            return self.imgTool.applyBitMask(descImg, mask = self.bitMask)
-        if (camID == NOCAMERA):
-            return Null
+        if isinstance(out, imgPr.BufferPool):
+            maskedType = np.result_type(descImg, self.bitMask)
+            if (pool is not None) and pool.owns(descImg):
+                if (descImg.dtype == maskedType):
+                    out = descImg
+                elif (descImg.dtype.kind == 'i') and (descImg.dtype.itemsize == np.dtype(self.bitMask.dtype).itemsize):
+                    # signed samples and an unsigned mask of the same size (ePix100a/10ka): the masked
+                    # values fit the unsigned type, which is masked in place instead of widened
+                    out = descImg.view(self.bitMask.dtype)
+                    descImg = out
+                else:
+                    out = out.get(descImg.shape, maskedType)
+            else:
+                out = out.get(descImg.shape, maskedType)
+        return self.imgTool.applyBitMask(descImg, mask = self.bitMask, out = out)
+
+    def _maskIsNoOp(self, dtype):
+        """True if the bit mask keeps every bit of the unsigned samples of dtype (e.g. 0xFFFF on uint16)"""
+        dtype = np.dtype(dtype)
+        if (dtype.kind != 'u'):
+            return False
+        allBits = (1 << (8 * dtype.itemsize)) - 1
+        return (int(self.bitMask) & allBits) == allBits
+
+    def headerDtype(self):
+        """structured dtype of the payload header of the current camera"""
+        return self.headerLayouts.get(self.cameraType, (HEADER_DTYPE_3DW, 0x0, 0x0))[0]
+
+    # return the header fields of many frames as columns
+    def decodeHeaders(self, rawData):
+        """decodes the payload headers of many frames at once.
+           rawData is a [frames, payload] array of any dtype (or the [frames, bytes] array of
+           the header bytes returned by the frame readers' headers()), or a list of payloads.
+           Returns a DECODED_HEADER_DTYPE array with one row per frame, so selections are
+           vectorized, e.g. the acqNum gaps of the frames of ASIC 1:
+               h = h[h['asic'] == 1]
+               gaps = np.flatnonzero(np.diff(h['acqNum'].astype('int64')) != 1)"""
+        headerDtype, asicNumMask, isTOAMask = self.headerLayouts.get(self.cameraType, (HEADER_DTYPE_3DW, 0x0, 0x0))
+        numBytes = headerDtype.itemsize
+        if (isinstance(rawData, np.ndarray) and (rawData.ndim == 2)):
+            raw8 = rawData.view('uint8')[:, :numBytes]
+        else:
+            # payloads shorter than the header are padded with zeros
+            raw8 = np.zeros((len(rawData), numBytes), dtype='uint8')
+            for i, frame in enumerate(rawData):
+                frame = np.frombuffer(frame, dtype='uint8')[:numBytes]
+                raw8[i, :len(frame)] = frame
+        if (raw8.shape[1] < numBytes):
+            raw8 = np.concatenate((raw8, np.zeros((len(raw8), numBytes - raw8.shape[1]), dtype='uint8')), 1)
+        headers = np.ascontiguousarray(raw8).view(headerDtype).reshape(-1)
+
+        decoded = np.empty(len(headers), dtype = DECODED_HEADER_DTYPE)
+        decoded['vc']      =  headers['dword0'] & 0xF                    # header dword 0 (VC info)
+        decoded['asic']    = (headers['dword0'] & 0x10) >> 4             # header dword 0 (ASIC)
+        decoded['acqNum']  =  headers['acqNum']                          # header dword 1
+        decoded['asicNum'] =  headers['dword2'] & asicNumMask            # header dword 2
+        decoded['isTOA']   = (headers['dword2'] & isTOAMask) != 0        # header dword 2
+        return decoded
+
+    # return a [images, rows, cols] stack of descrambled images from a [frames, payload] stack
+    def descrambleBatch(self, rawData):
+        """descrambles a stack of frame payloads with whole array operations.
+           rawData is a 2D array of any dtype, one frame payload per row (e.g. a strided view
+           of a memory mapped file, which is not copied). For cameras taking two frames per
+           image the frames are paired by acquisition number. Returns None if the stack
+           cannot be descrambled."""
+        rawData = np.asarray(rawData)
+        if (rawData.ndim != 2):
+            print("descrambleBatch: expected a [frames, payload] array, got shape", rawData.shape)
+            return None
+        # whole frames of 16 and 32 bit words (the last axis of a strided view is contiguous)
+        rawData = rawData.view('uint8')
+        if self._descrambleBatch is None:
+            print("descrambleBatch: camera ", self.cameraType, " not supported")
+            return None
+        descImg = self._descrambleBatch(rawData)
+        if descImg is None:
+            return None
+        # the bit mask is applied in place over the whole stack
+        if not self._maskIsNoOp(descImg.dtype):
+            np.bitwise_and(descImg, self.bitMask, out = descImg)
+        return descImg
+
+    # return the image shape of descrambleBatch for a payload length
+    def batchImageShape(self, numBytes):
+        """returns the (rows, cols) of the images descrambled by descrambleBatch from payloads
+           of numBytes bytes, or None if that length cannot be descrambled. Only the gather
+           plan is built, no frame is descrambled."""
+        if self._batchShape is not None:
+            return self._batchShape(numBytes)
+        if (self.sensorHeight == 0) or (self.sensorWidth == 0):
+            return None
+        return (self.sensorHeight, self.sensorWidth)
 
     # return
     def buildImageFrame(self, currentRawData, newRawData):
-        camID = self.availableCameras.get(self.cameraType, NOCAMERA)
-
-        if (PRINT_VERBOSE): print('buildImageFrame - camID: ', camID)
-
-        frameComplete = 0
-        readyForDisplay = 0
-        if (camID == EPIX100A):
-            # The flags are always true since each frame holds an entire image
-            frameComplete = 1
-            readyForDisplay = 1
-            return [frameComplete, readyForDisplay, newRawData]
-        if (camID == EPIX100P):
-            # The flags are always true since each frame holds an entire image
-            frameComplete = 1
-            readyForDisplay = 1
-            return [frameComplete, readyForDisplay, newRawData]
-        if (camID == TIXEL48X48):
-            #Needs to check the two frames and make a decision on the flags
-            [frameComplete, readyForDisplay, newRawData]  = self._buildFrameTixel48x48Image(currentRawData, newRawData)
-            return [frameComplete, readyForDisplay, newRawData]
-        if (camID == EPIX10KA):
-            # The flags are always true since each frame holds an entire image
-            frameComplete = 1
-            readyForDisplay = 1
-            return [frameComplete, readyForDisplay, newRawData]
-        if (camID == CPIX2):
-            #Needs to check the two frames and make a decision on the flags
-            [frameComplete, readyForDisplay, newRawData]  = self._buildFrameCpix2Image(currentRawData, newRawData)
-            return [frameComplete, readyForDisplay, newRawData]
-            print('end of buildImageFrame')
-        if (camID == EPIXM32):
-            [frameComplete, readyForDisplay, newRawData]  = self._buildFrameEpixM32Image(currentRawData, newRawData)
-            return [frameComplete, readyForDisplay, newRawData]
-        if (camID == HRADC32x32):
-            [frameComplete, readyForDisplay, newRawData]  = self._buildFrameEpixHRADC32x32Image(currentRawData, newRawData)
-            return [frameComplete, readyForDisplay, newRawData]
-        if (camID == CRYO64XN):
-            # The flags are always true since each frame holds an entire image
-            frameComplete = 1
-            readyForDisplay = 1
-            return [frameComplete, readyForDisplay, newRawData]
-        if (camID == EPIXMNX64):
-            # The flags are always true since each frame holds an entire image
-            frameComplete = 1
-            readyForDisplay = 1
-            return [frameComplete, readyForDisplay, newRawData]
-        if (camID == NOCAMERA):
-            return Null
+        """returns [frameComplete, readyForDisplay, image data] (see the camera buildFrame functions)"""
+        return self._buildFrame(currentRawData, newRawData)
 
     ##########################################################
     # define all camera specific init values
@@ -209,6 +338,9 @@ class Camera():
         self.pixelDepth = 16
         self.cameraModule = "Standard ePix100a"
         self.bitMask = np.uint16(0xFFFF)
+        # row permutation, computed on first use
+        self._rowOrder = None
+        self.commonModeBlocks = self._ePixCommonModeBlocks()
 
     def _initEPix100p(self):
         self._superRowSize = 384
@@ -220,8 +352,12 @@ class Camera():
         self.sensorHeight = 706
         self.pixelDepth = 16
         self.bitMask = np.uint16(0xFFFF)
+        # row permutation, computed on first use
+        self._rowOrder = None
+        self.commonModeBlocks = self._ePixCommonModeBlocks()
 
     def _initTixel48x48(self):
+        self.frameAssembler = frameAssembler.FrameAssembler()
         #self._superRowSize = 384
         self._NumAsicsPerSide = 1
         #self._NumAdcChPerAsic = 4
@@ -243,8 +379,12 @@ class Camera():
         self.pixelDepth = 16
         self.cameraModule = "Standard ePix10ka"
         self.bitMask = np.uint16(0x3FFF)
+        # row permutation, computed on first use
+        self._rowOrder = None
+        self.commonModeBlocks = self._ePixCommonModeBlocks()
 
     def _initCpix2(self):
+        self.frameAssembler = frameAssembler.FrameAssembler()
         #self._superRowSize = 384
         self._NumAsicsPerSide = 1
         #self._NumAdcChPerAsic = 4
@@ -283,6 +423,13 @@ class Camera():
         self.pixelDepth = 16
         self.cameraModule = "Single ASIC CRYO"
         self.bitMask = np.uint16(0xFFFF)
+        # image row n holds the stream channel _cryoChannelOrder[n]
+        self._cryoChannelOrder = np.array([ch + offset for group in [0, 4, 8, 12, 1, 5, 9, 13]
+                                           for ch in [group, group + 2] for offset in [0, 16, 32, 48]])
+        # gather index of each payload length (in 16 bit words)
+        self._cryoPlans = {}
+        # rows are grouped by ADC (8 channels) and bank (4 ADCs), each sample is corrected on its own
+        self.commonModeBlocks = {'adc': (8, 1), 'bank': (32, 1)}
 
     def _initEPIXMNX64(self):
         self._NumAsicsPerSide = 1
@@ -291,257 +438,27 @@ class Camera():
         self.pixelDepth = 16
         self.cameraModule = "Single ASIC CRYO"
         self.bitMask = np.uint16(0xFFFF)
+        # gather index of each payload length (in 16 bit words)
+        self._epixMNX64Plans = {}
 
     ##########################################################
     # define all camera specific build frame functions
     ##########################################################
-    def _buildFrameTixel48x48Image(self, currentRawData, newRawData):
-        """ Performs the Tixel frame building.
-            For this sensor the image takes four frames, twa with time of arrival info
-            and two with time over threshold. There is no guarantee both frames will always arrive nor on their order."""
-        #init local variables
-        frameComplete = 0
-        readyForDisplay = 0
-        returnedRawData = []
-        acqNum_currentRawData  = 0
-        isTOA_currentRawData   = 0
-        asicNum_currentRawData = 0
-        acqNum_newRawData  = 0
-        isTOA_newRawData   = 0
-        asicNum_newRawData = 0
-
-        
-        ##if (PRINT_VERBOSE): print('\nlen current Raw data', len(currentRawData), 'len new raw data', len(newRawData))
-        #converts data to 32 bit 
-        newRawData_DW = np.frombuffer(newRawData,dtype='uint32')
-        ##if (PRINT_VERBOSE): print('\nlen current Raw data', len(currentRawData), 'len new raw data DW', len(newRawData_DW))
-
-        #retrieves header info
-                                                                  # header dword 0 (VC info)
-        acqNum_newRawData  =  newRawData_DW[1]                    # header dword 1
-        isTOA_newRawData   = (newRawData_DW[2] & 0x8) >> 3        # header dword 2  
-        asicNum_newRawData =  newRawData_DW[2] & 0x7              # header dword 2
-        ##if (PRINT_VERBOSE): print('\nacqNum_newRawData: ', acqNum_newRawData, '\nisTOA_newRawData:', isTOA_newRawData, '\nasicNum_newRawData:', asicNum_newRawData)
-
-
-        #interpret headers
-        #case 1: new image (which means currentRawData is empty)
-        if (len(currentRawData) == 0):
-            frameComplete = 0
-            readyForDisplay = 0
-            z = np.zeros((1156,),dtype='uint32')# 2310 for the package plus 1 (first byte for the valid flag 
-            returnedRawData = np.array([z,z,z,z])
-            #makes the current raw data info the same as new so the logic later on this function will add the new data to the memory
-            acqNum_currentRawData  = acqNum_newRawData
-            isTOA_currentRawData   = isTOA_newRawData
-            asicNum_currentRawData = asicNum_newRawData
-        #case where the currentRawData is a byte array
-        elif(len(currentRawData) == 4620):
-            frameComplete = 0
-            readyForDisplay = 0
-            z = np.zeros((1156,),dtype='uint32')# 2310 for the package plus 1 (first byte for the valid flag 
-            returnedRawData = np.array([z,z,z,z])
-            #
-            currentRawData_DW = np.frombuffer(currentRawData,dtype='uint32')
-                                                                             # header dword 0 (VC info)
-            acqNum_currentRawData  =  currentRawData_DW[1]                   # header dword 1
-            isTOA_currentRawData   = (currentRawData_DW[2] & 0x8) >> 3       # header dword 2  
-            asicNum_currentRawData =  currentRawData_DW[2] & 0x7             # header dword 2
-
-            currentRawData = self.fill_memory(returnedRawData, asicNum_currentRawData, isTOA_currentRawData, currentRawData_DW)
-            returnedRawData = currentRawData
-        
-        elif(len(currentRawData)==4):
-            #recovers currentRawData header info
-            #loop traverses the four traces to find the info
-            for j in range(0,4):
-                #print(len(currentRawData))
-                if(currentRawData[j,0]==1):
-                                                                                # extended header dword 0 (valid trace)
-                                                                                # extended header dword 1 (VC info)
-                    acqNum_currentRawData  =  currentRawData[j,2]               # extended header dword 2 (acq num)
-                    isTOA_currentRawData   = (currentRawData[j,3] & 0x8) >> 3   # extended header dword 3 
-                    asicNum_currentRawData =  currentRawData[j,3] & 0x7         # extended header dword 1 (VC info)
-            #saves current data on returned data before adding new data
-            returnedRawData = currentRawData
-        else:
-            #packet size error
-            if (PRINT_VERBOSE): print('\n packet size error, packet len: ', len(currentRawData))
-
-        ##if (PRINT_VERBOSE): print('\nacqNum_currentRawData: ', acqNum_currentRawData, '\nisTOA_currentRawData: ', isTOA_currentRawData, '\nasicNum_currentRawData: ', asicNum_currentRawData)
-        ##if (PRINT_VERBOSE): print('\nacqNum_newRawData: ',     acqNum_newRawData,     '\nisTOA_newRawData: ',     isTOA_newRawData, '\nasicNum_newRawData: ', asicNum_newRawData)
-        #case 2: acqNumber are different
-        if(acqNum_newRawData != acqNum_currentRawData):
-            frameComplete = 0
-            readyForDisplay = 1
-            return [frameComplete, readyForDisplay, currentRawData]
-
-        #fill the memory with the new data (when acqNums matches)
-        returnedRawData = self.fill_memory(returnedRawData, asicNum_newRawData, isTOA_newRawData, newRawData_DW)
-        if (PRINT_VERBOSE): print('Return data 0:', returnedRawData[0,0:10])
-        if (PRINT_VERBOSE): print('Return data 1:', returnedRawData[1,0:10])
-        if (PRINT_VERBOSE): print('Return data 2:', returnedRawData[2,0:10])
-        if (PRINT_VERBOSE): print('Return data 3:', returnedRawData[3,0:10])
-
-        #checks if the image is complete
-        isValidTrace0 =  returnedRawData[0,0]
-        if (PRINT_VERBOSE): print('\nisValidTrace0', isValidTrace0)
-        isValidTrace1 =  returnedRawData[1,0]
-        if (PRINT_VERBOSE): print('\nisValidTrace1', isValidTrace1)
-        isValidTrace2 =  returnedRawData[2,0]
-        if (PRINT_VERBOSE): print('\nisValidTrace2', isValidTrace2)
-        isValidTrace3 =  returnedRawData[3,0]
-        if (PRINT_VERBOSE): print('\nisValidTrace3', isValidTrace3)
-
-        if((isValidTrace0 == 1) and (isValidTrace1 == 1) and (isValidTrace2 == 1) and (isValidTrace3 == 1)):
-            frameComplete = 1
-            readyForDisplay = 1
-        else:
-            frameComplete = 0
-            readyForDisplay = 0
-
-        if (PRINT_VERBOSE): print('frameComplete: ', frameComplete, 'readyForDisplay: ', readyForDisplay, 'returned raw data len', len(returnedRawData))
-        #return parameters
-        return [frameComplete, readyForDisplay, returnedRawData]
-
-    def _buildFrameCpix2Image(self, currentRawData, newRawData):
-        """ Performs the Cpix2 frame building.
-            For this sensor the image takes four frames, twa with time of arrival info
-            and two with time over threshold. There is no guarantee both frames will always arrive nor on their order."""
-        #init local variables
-        frameComplete = 0
-        readyForDisplay = 0
-        returnedRawData = []
-        acqNum_currentRawData  = 0
-        isTOA_currentRawData   = 0
-        asicNum_currentRawData = 0
-        acqNum_newRawData  = 0
-        isTOA_newRawData   = 0
-        asicNum_newRawData = 0
-
-        
-        if (PRINT_VERBOSE): print('\n0 \nlen current Raw data', len(currentRawData), 'len new raw data', len(newRawData))
-        #converts data to 32 bit 
-        newRawData_DW = np.frombuffer(newRawData,dtype='uint32')
-        if (PRINT_VERBOSE): print('\n1 \nlen current Raw data', len(currentRawData), 'len new raw data DW', len(newRawData_DW))
-
-        #retrieves header info
-                                                                  # header dword 0 (VC info)
-        acqNum_newRawData  =  newRawData_DW[1]                    # header dword 1
-        isTOA_newRawData   = (newRawData_DW[2] & 0x8) >> 3        # header dword 2  
-        asicNum_newRawData =  newRawData_DW[2] & 0x7              # header dword 2
-        if (PRINT_VERBOSE): print('\n2 \n acqNum_newRawData: ', acqNum_newRawData, '\nisTOA_newRawData:', isTOA_newRawData, '\nasicNum_newRawData:', asicNum_newRawData)
-
+    def _buildFrameSingle(self, currentRawData, newRawData):
+        """ Frame building of the cameras sending an entire image in each frame."""
+        # The flags are always true since each frame holds an entire image
+        return [1, 1, newRawData]
+
+    def _buildFrameFromAssembler(self, currentRawData, newRawData):
+        """ Frame building of the four packet cameras (Tixel48x48 and Cpix2).
+            Packets of several acquisitions are assembled by acqNum, currentRawData is not used.
+            Only complete images are returned, the drop counts are kept by self.frameAssembler."""
+        imgData = self.frameAssembler.addPacket(newRawData)
+        if imgData is None:
+            # nothing to keep on the caller side, the partial images are in the assembler slots
+            return [0, 0, []]
+        return [1, 1, imgData]
 
-        #interpret headers
-        #case 1: new image (which means currentRawData is empty)
-        if (len(currentRawData) == 0):
-            frameComplete = 0
-            readyForDisplay = 0
-            z = np.zeros((1156,),dtype='uint32')# 2310 for the package plus 1 (first byte for the valid flag 
-            returnedRawData = np.array([z,z,z,z])
-            #makes the current raw data info the same as new so the logic later on this function will add the new data to the memory
-            acqNum_currentRawData  = acqNum_newRawData
-            isTOA_currentRawData   = isTOA_newRawData
-            asicNum_currentRawData = asicNum_newRawData
-        #case where the currentRawData is a byte array
-        elif((len(currentRawData) == 1155) or (len(currentRawData) == 4620)):
-            frameComplete = 0
-            readyForDisplay = 0
-            z = np.zeros((1156,),dtype='uint32')# 2310 for the package plus 1 (first byte for the valid flag 
-            returnedRawData = np.array([z,z,z,z])
-            #
-            currentRawData_DW = np.frombuffer(currentRawData,dtype='uint32')
-                                                                             # header dword 0 (VC info)
-            acqNum_currentRawData  =  currentRawData_DW[1]                   # header dword 1
-            isTOA_currentRawData   = (currentRawData_DW[2] & 0x8) >> 3       # header dword 2  
-            asicNum_currentRawData =  currentRawData_DW[2] & 0x7             # header dword 2
-
-            currentRawData = self.fill_memory(returnedRawData, asicNum_currentRawData, isTOA_currentRawData, currentRawData_DW)
-            returnedRawData = currentRawData
-
-            if (PRINT_VERBOSE): print('\n3 \n Return data 0:', returnedRawData[0,0:10])
-            if (PRINT_VERBOSE): print('\n3 \n Return data 1:', returnedRawData[1,0:10])
-            if (PRINT_VERBOSE): print('\n3 \n Return data 2:', returnedRawData[2,0:10])
-            if (PRINT_VERBOSE): print('\n3 \n Return data 3:', returnedRawData[3,0:10])
-        
-        elif(len(currentRawData)==4):
-            #recovers currentRawData header info
-            #loop traverses the four traces to find the info
-            for j in range(0,4):
-                #print(len(currentRawData))
-                if(currentRawData[j,0]==1):
-                                                                                # extended header dword 0 (valid trace)
-                                                                                # extended header dword 1 (VC info)
-                    acqNum_currentRawData  =  currentRawData[j,2]               # extended header dword 2 (acq num)
-                    isTOA_currentRawData   = (currentRawData[j,3] & 0x8) >> 3   # extended header dword 3 
-                    asicNum_currentRawData =  currentRawData[j,3] & 0x7         # extended header dword 1 (VC info)
-            #saves current data on returned data before adding new data
-            if (PRINT_VERBOSE): print('\n3B \n len 4')
-            returnedRawData = currentRawData
-        else:
-            #packet size error
-            if (PRINT_VERBOSE): print('\n4  \npacket size error, packet len: ', len(currentRawData))
-
-        if (PRINT_VERBOSE): print('\n5 \nacqNum_currentRawData: ', acqNum_currentRawData, '\nisTOA_currentRawData: ', isTOA_currentRawData, '\nasicNum_currentRawData: ', asicNum_currentRawData)
-        if (PRINT_VERBOSE): print('\n5 \nacqNum_newRawData: ',     acqNum_newRawData,     '\nisTOA_newRawData: ',     isTOA_newRawData, '\nasicNum_newRawData: ', asicNum_newRawData)
-        #case 2: acqNumber are different
-        if(acqNum_newRawData != acqNum_currentRawData):
-            frameComplete = 0
-            readyForDisplay = 1
-            return [frameComplete, readyForDisplay, currentRawData]
-
-        #fill the memory with the new data (when acqNums matches)
-        returnedRawData = self.fill_memory(returnedRawData, asicNum_newRawData, isTOA_newRawData, newRawData_DW)
-        if (PRINT_VERBOSE): print('\n6 \nReturn data 0:', returnedRawData[0,0:10])
-        if (PRINT_VERBOSE): print('\n6 \nReturn data 1:', returnedRawData[1,0:10])
-        if (PRINT_VERBOSE): print('\n6 \nReturn data 2:', returnedRawData[2,0:10])
-        if (PRINT_VERBOSE): print('\n6 \nReturn data 3:', returnedRawData[3,0:10])
-
-        #checks if the image is complete
-        isValidTrace0 =  returnedRawData[0,0]
-        if (PRINT_VERBOSE): print('\n7 \nisValidTrace0', isValidTrace0)
-        isValidTrace1 =  returnedRawData[1,0]
-        if (PRINT_VERBOSE): print('\n8 \nisValidTrace1', isValidTrace1)
-        isValidTrace2 =  returnedRawData[2,0]
-        if (PRINT_VERBOSE): print('\n9 \nisValidTrace2', isValidTrace2)
-        isValidTrace3 =  returnedRawData[3,0]
-        if (PRINT_VERBOSE): print('\n10 \nisValidTrace3', isValidTrace3)
-
-        if((isValidTrace0 == 1) and (isValidTrace1 == 1) and (isValidTrace2 == 1) and (isValidTrace3 == 1)):
-            frameComplete = 1
-            readyForDisplay = 1
-        else:
-            frameComplete = 0
-            readyForDisplay = 0
-
-        if (PRINT_VERBOSE): print('\n11 \nframeComplete: ', frameComplete, 'readyForDisplay: ', readyForDisplay, 'returned raw data len', len(returnedRawData))
-        #return parameters
-        return [frameComplete, readyForDisplay, returnedRawData]
-    
-    #fill the memory with the new data (when acqNums matches)
-    def fill_memory(self, returnedRawData, asicNum_currentRawData, isTOA_currentRawData, newRawData_DW):
-        ##if (PRINT_VERBOSE): print('New data:', newRawData_DW[0:10])
-        if (len(newRawData_DW)==1155):
-            if(asicNum_currentRawData==0 and isTOA_currentRawData==0):
-                returnedRawData[0,0]  = 1
-                returnedRawData[0,1:] = newRawData_DW
-            if(asicNum_currentRawData==1 and isTOA_currentRawData==0):
-                returnedRawData[1,0]  = 1
-                returnedRawData[1,1:] = newRawData_DW
-            if(asicNum_currentRawData==0 and isTOA_currentRawData==1):
-                returnedRawData[2,0]  = 1
-                returnedRawData[2,1:] = newRawData_DW
-            if(asicNum_currentRawData==1 and isTOA_currentRawData==1):
-                returnedRawData[3,0]  = 1
-                returnedRawData[3,1:] = newRawData_DW
-            ##if (PRINT_VERBOSE): print('Return data 0:', returnedRawData[0,0:10])
-            ##if (PRINT_VERBOSE): print('Return data 1:', returnedRawData[1,0:10])
-            ##if (PRINT_VERBOSE): print('Return data 2:', returnedRawData[2,0:10])
-            ##if (PRINT_VERBOSE): print('Return data 3:', returnedRawData[3,0:10])
-        return returnedRawData
-
-    
     def _buildFrameEpixM32Image(self, currentRawData, newRawData):
         """ Performs the epixM32 frame building.
             For this sensor the image takes two frames
@@ -762,33 +679,16 @@ class Camera():
     # define all camera specific descrabler functions
     ##########################################################
 
-    def _descrambleEPix100pImage(self, rawData):
-        """performs the ePix100p image descrambling"""
-        
-        #removes header before displying the image
-        for j in range(0,32):
-            rawData.pop(0)
-        
-        #get the first superline
-        imgBot = rawData[(0*self._superRowSizeInBytes):(1*self._superRowSizeInBytes)] 
-        imgTop = rawData[(1*self._superRowSizeInBytes):(2*self._superRowSizeInBytes)] 
-        for j in range(2,self.sensorHeight):
-            if (j%2):
-                imgBot.extend(rawData[(j*self._superRowSizeInBytes):((j+1)*self._superRowSizeInBytes)])
-            else:
-                imgTop.extend(rawData[(j*self._superRowSizeInBytes):((j+1)*self._superRowSizeInBytes)]) 
-        imgDesc = imgBot
-        imgDesc.extend(imgTop)
-
-        # convert to numpy array
-        imgDesc = np.array(imgDesc,dtype='uint8')
-
-        # returns final image
-        return imgDesc
-
+    def _rowPlan(self):
+        """returns the cached output row order of the ePix100a/ePix10ka/ePix100p descrambling"""
+        if self._rowOrder is None:
+            H = self.sensorHeight
+            # top half: odd rows from the last one down, bottom half: even rows up
+            self._rowOrder = np.concatenate((np.arange(H-1, 0, -2), np.arange(0, H, 2)))
+        return self._rowOrder
 
     def _descrambleEPix100aImageAsByteArray(self, rawData):
-        """performs the ePix100a image descrambling (this is a place holder only)"""
+        """performs the ePix100a image descrambling row by row (used for short frames)"""
         
         #removes header before displying the image
         for j in range(0,32):
@@ -808,10 +708,22 @@ class Camera():
         # returns final image
         return imgDesc
 
-    def _descrambleEPix100aImage(self, rawData):
+    def _descrambleEPix100aImage(self, rawData, pool = None):
         """performs the ePix100a image descrambling """
-        
-        imgDescBA = self._descrambleEPix100aImageAsByteArray(rawData)
+
+        # header of 32 bytes is skipped by offset, rawData is not modified
+        raw8 = np.frombuffer(rawData, dtype='uint8')
+        if (len(raw8) >= (32 + self.sensorHeight*self._superRowSizeInBytes)):
+            img = np.frombuffer(raw8, dtype='int16', count = self.sensorHeight*self.sensorWidth, offset = 32)
+            # single gather of the rows in display order
+            if pool is None:
+                return img.reshape(self.sensorHeight, self.sensorWidth)[self._rowPlan()]
+            imgDesc = pool.get((self.sensorHeight, self.sensorWidth), 'int16')
+            # (the plan indices are always valid, mode 'clip' avoids a buffered copy of out)
+            return np.take(img.reshape(self.sensorHeight, self.sensorWidth), self._rowPlan(), axis = 0, out = imgDesc, mode = 'clip')
+
+        # short frames keep the row by row descrambling
+        imgDescBA = self._descrambleEPix100aImageAsByteArray(bytearray(raw8.tobytes()))
 
         imgDesc = np.frombuffer(imgDescBA,dtype='int16')
         if self.sensorHeight*self.sensorWidth != len(imgDesc):
@@ -917,75 +829,190 @@ class Camera():
         # returns final image
         return imgDesc
 
-    def _descrambleCRYO64XNImage(self, rawData):
-        """performs a single Cryo ASIC image descrambling """
-
-        if (type(rawData != 'numpy.ndarray')):
-            img = np.frombuffer(rawData,dtype='uint16')
-                
-        print("Incoming data shape", img.shape)
-                
-        #calculate number of samples
-        samples = int((img.shape[0]-self._Header_Length)/self._NumChPerAsic)
-
-        if (samples) != ((img.shape[0]-self._Header_Length)/self._NumChPerAsic):
-            imgDesc = np.zeros((self._NumChPerAsic,self._NumChPerAsic), dtype='uint16')
-            print("_descrambleCRYO64XNImage(: Wrong data length, Returning zeros. Data length: ", (img.shape[0]-self._Header_Length))
-            return imgDesc
-
-        #remove header and separates the two streams
-        img2 = img[self._Header_Length:].reshape(samples,self._NumChPerAsic)
-        #print(img2.shape)
-        #print(self._NumChPerAsic)
-
-        #descramble image
-        #imgDesc = np.append(img2[:,0:self._NumChPerAsic:2].transpose(), img2[:,1:self._NumChPerAsic:2].transpose()).reshape(self._NumChPerAsic,samples)
-        imgDesc0 = np.append(img2[:,0:self._NumChPerAsic:16].transpose(), img2[:,2:self._NumChPerAsic:16].transpose())
-        imgDesc4 = np.append(img2[:,4:self._NumChPerAsic:16].transpose(), img2[:,6:self._NumChPerAsic:16].transpose())
-        imgDesc8 = np.append(img2[:,8:self._NumChPerAsic:16].transpose(), img2[:,10:self._NumChPerAsic:16].transpose())
-        imgDesc12 = np.append(img2[:,12:self._NumChPerAsic:16].transpose(), img2[:,14:self._NumChPerAsic:16].transpose())
-        imgDesc1 = np.append(img2[:,1:self._NumChPerAsic:16].transpose(), img2[:,3:self._NumChPerAsic:16].transpose())
-        imgDesc5 = np.append(img2[:,5:self._NumChPerAsic:16].transpose(), img2[:,7:self._NumChPerAsic:16].transpose())
-        imgDesc9 = np.append(img2[:,9:self._NumChPerAsic:16].transpose(), img2[:,11:self._NumChPerAsic:16].transpose())
-        imgDesc13 = np.append(img2[:,13:self._NumChPerAsic:16].transpose(), img2[:,15:self._NumChPerAsic:16].transpose())
-        imgDesc = np.append(imgDesc0,imgDesc4)
-        imgDesc = np.append(imgDesc,imgDesc8)
-        imgDesc = np.append(imgDesc,imgDesc12)
-        imgDesc = np.append(imgDesc,imgDesc1)
-        imgDesc = np.append(imgDesc,imgDesc5)
-        imgDesc = np.append(imgDesc,imgDesc9)
-        imgDesc = np.append(imgDesc,imgDesc13).reshape(self._NumChPerAsic,samples)
-        #print(imgDesc.shape)
-        
+    def _cryoGatherPlan(self, numWords):
+        """returns the [channels, samples] gather index of a cryo payload of numWords 16 bit words,
+           or None if the length does not hold a whole number of samples"""
+        plan = self._cryoPlans.get(numWords)
+        if plan is None:
+            samples = (numWords - self._Header_Length) // self._NumChPerAsic
+            if ((samples * self._NumChPerAsic) != (numWords - self._Header_Length)) or (samples <= 0):
+                return None
+            # word of channel c and sample s: header + s * channels + c
+            plan = (self._Header_Length + self._cryoChannelOrder[:, None] +
+                    self._NumChPerAsic * np.arange(samples)[None, :]).astype('intp')
+            self._cryoPlans[numWords] = plan
+            if (PRINT_VERBOSE): print("_cryoGatherPlan: new plan for", samples, "samples")
+        return plan
+
+    def _descrambleError(self, function, numWords, numFrames = 1):
+        """counts the frames that cannot be descrambled, the first error is always reported"""
+        if (PRINT_VERBOSE) or (self.descrambleErrors == 0):
+            print(function + ": Wrong data length, frame skipped. Data length: ", (numWords-self._Header_Length))
+        self.descrambleErrors = self.descrambleErrors + numFrames
+
+    def _streamPayload(self, rawData):
+        """returns the payload as 16 bit words, or None for an odd number of bytes"""
+        raw8 = np.frombuffer(rawData, dtype='uint8')
+        if (len(raw8) % 2):
+            return None
+        return raw8.view('uint16')
+
+    def _descrambleCRYO64XNImage(self, rawData, pool = None):
+        """performs a single Cryo ASIC image descrambling, any number of samples per channel.
+           Returns None if the payload does not hold a whole number of samples."""
+
+        img = self._streamPayload(rawData)
+        if img is None:
+            self._descrambleError("_descrambleCRYO64XNImage", len(rawData) // 2)
+            return None
+        if (PRINT_VERBOSE): print("Incoming data shape", img.shape)
+
+        # one plan is cached for each payload length seen
+        plan = self._cryoGatherPlan(img.shape[0])
+        if plan is None:
+            self._descrambleError("_descrambleCRYO64XNImage", img.shape[0])
+            return None
+
+        #descramble image, a single gather of the samples into the [channels, samples] image
+        if pool is None:
+            imgDesc = np.empty(plan.shape, dtype='uint16')
+        else:
+            imgDesc = pool.get(plan.shape, 'uint16')
+        np.take(img, plan, out = imgDesc, mode = 'clip')
+
         # returns final image
         return imgDesc
 
-    def _descrambleEPIXMNX64Image(self, rawData):
-        """performs a single Cryo ASIC image descrambling """
-
-        if (type(rawData != 'numpy.ndarray')):
-            img = np.frombuffer(rawData,dtype='uint16')
-                
-        print("Incoming data shape", img.shape)
-                
-        #calculate number of samples
-        samples = int((img.shape[0]-self._Header_Length)/self._NumChPerAsic)
-
-        if (samples) != ((img.shape[0]-self._Header_Length)/self._NumChPerAsic):
-            imgDesc = np.zeros((self._NumChPerAsic,self._NumChPerAsic), dtype='uint16')
-            print("_descramble EPIXMNX64 Image: Wrong data length, Returning zeros. Data length: ", (img.shape[0]-self._Header_Length))
-            return imgDesc
-
-        #remove header
-        img2 = img[self._Header_Length:].reshape(samples,self._NumChPerAsic)
+    def _cryoBatchShape(self, numBytes):
+        """[channels, samples] of a cryo payload of numBytes bytes"""
+        plan = self._cryoGatherPlan(numBytes // 2) if (numBytes % 2 == 0) else None
+        return None if plan is None else plan.shape
+
+    def _descrambleCRYO64XNBatch(self, rawData):
+        """descrambles a [frames, bytes] stack of Cryo ASIC frames in a single gather"""
+        img = rawData[:, :(rawData.shape[1] // 2) * 2].view('uint16')
+        plan = self._cryoGatherPlan(img.shape[1]) if (rawData.shape[1] % 2 == 0) else None
+        if plan is None:
+            self._descrambleError("_descrambleCRYO64XNBatch", img.shape[1], len(rawData))
+            return None
+        return np.take(img, plan, axis = 1)
+
+    def _epixMNX64GatherPlan(self, numWords):
+        """returns the [samples, channels] gather index of an ePixHrePixM payload of numWords 16 bit words,
+           or None if the length does not hold a whole number of samples"""
+        plan = self._epixMNX64Plans.get(numWords)
+        if plan is None:
+            samples = (numWords - self._Header_Length) // self._NumChPerAsic
+            if ((samples * self._NumChPerAsic) != (numWords - self._Header_Length)) or (samples <= 0):
+                return None
+            # even channels first, then odd channels
+            order = np.append(np.arange(0, self._NumChPerAsic, 2), np.arange(1, self._NumChPerAsic, 2))
+            plan = (self._Header_Length + self._NumChPerAsic * np.arange(samples)[:, None] + order[None, :]).astype('intp')
+            self._epixMNX64Plans[numWords] = plan
+        return plan
+
+    def _epixMNX64BatchShape(self, numBytes):
+        """[samples, channels] of an ePixHrePixM payload of numBytes bytes"""
+        plan = self._epixMNX64GatherPlan(numBytes // 2) if (numBytes % 2 == 0) else None
+        return None if plan is None else plan.shape
+
+    def _descrambleEPIXMNX64Batch(self, rawData):
+        """descrambles a [frames, bytes] stack of ePixHrePixM frames in a single gather"""
+        img = rawData[:, :(rawData.shape[1] // 2) * 2].view('uint16')
+        plan = self._epixMNX64GatherPlan(img.shape[1]) if (rawData.shape[1] % 2 == 0) else None
+        if plan is None:
+            self._descrambleError("_descrambleEPIXMNX64Batch", img.shape[1], len(rawData))
+            return None
+        return np.take(img, plan, axis = 1)
+
+    def _descrambleEpixM32Batch(self, rawData):
+        """EpixM32 stack, quadrant 0 from ASIC 0 and quadrant 1 from ASIC 1"""
+        return self._descrambleQuadrantBatch(rawData, 1027, 0xF, [0], [1], (64,32))
+
+    def _descrambleEpixHRADC32x32Batch(self, rawData):
+        """HrAdc32x32 stack, quadrant 0 from ASIC 0 or 2 and quadrant 1 from ASIC 1"""
+        return self._descrambleQuadrantBatch(rawData, 515, 0x7, [0, 2], [1], (32,32))
+
+    def _descrambleQuadrantBatch(self, rawData, numDwords, asicMask, asicsQuadrant0, asicsQuadrant1, quadrantShape):
+        """descrambles a [frames, bytes] stack of two frame cameras (EpixM32, HrAdc32x32).
+           Frames are paired by acquisition number, the image order follows the first frame of each pair."""
+        if (rawData.shape[1] != numDwords * 4):
+            print("descrambleBatch: Wrong frame length, expected ", numDwords * 4, " bytes. Got: ", rawData.shape[1])
+            return None
+        dw = rawData.view('uint32')
+        acqNum  = dw[:, 1]                  # header dword 1
+        asicNum = dw[:, 2] & asicMask       # header dword 2
+        frames0 = np.flatnonzero(np.isin(asicNum, asicsQuadrant0))
+        frames1 = np.flatnonzero(np.isin(asicNum, asicsQuadrant1))
+        # first frame of each acquisition number on both quadrants
+        acq, pair0, pair1 = np.intersect1d(acqNum[frames0], acqNum[frames1], assume_unique = False, return_indices = True)
+        frames0 = frames0[pair0]
+        frames1 = frames1[pair1]
+        order = np.argsort(np.minimum(frames0, frames1), kind = 'stable')
+        frames0 = frames0[order]
+        frames1 = frames1[order]
+        # pixels start after the 3 header dwords
+        rows, cols = quadrantShape
+        quadrant0 = rawData[frames0, 12:].view('uint16').reshape(len(frames0), rows, cols)
+        quadrant1 = rawData[frames1, 12:].view('uint16').reshape(len(frames1), rows, cols)
+        return np.concatenate((quadrant0, quadrant1), 2)
+
+    def _descrambleEPIXMNX64Image(self, rawData, pool = None):
+        """performs a single ePixHrePixM image descrambling, any number of samples per channel.
+           Returns the [samples, channels] image (even channels first), or None if the payload
+           does not hold a whole number of samples."""
+
+        img = self._streamPayload(rawData)
+        if img is None:
+            self._descrambleError("_descrambleEPIXMNX64Image", len(rawData) // 2)
+            return None
+        if (PRINT_VERBOSE): print("Incoming data shape", img.shape)
+
+        # one plan is cached for each payload length seen
+        plan = self._epixMNX64GatherPlan(img.shape[0])
+        if plan is None:
+            self._descrambleError("_descrambleEPIXMNX64Image", img.shape[0])
+            return None
+
+        #descramble image, a single gather of the samples into the [samples, channels] image
+        if pool is None:
+            imgDesc = np.empty(plan.shape, dtype='uint16')
+        else:
+            imgDesc = pool.get(plan.shape, 'uint16')
+        np.take(img, plan, out = imgDesc, mode = 'clip')
 
-        #descramble image
-        imgDesc = np.append(img2[:,0:self._NumChPerAsic:2].transpose(), img2[:,1:self._NumChPerAsic:2].transpose()).reshape(self._NumChPerAsic,samples)
-        
         # returns final image
-        return np.transpose(imgDesc)
+        return imgDesc
 
     # helper functions
+    def _ePixCommonModeBlocks(self):
+        """ePix groupings: an ADC channel of a row, an ADC bank of an ASIC, an ASIC row"""
+        return {'adc'  : (1, self._NumColPerAdcCh),
+                'bank' : (self.sensorHeight // 2, self._NumColPerAdcCh),
+                'row'  : (1, self._NumAdcChPerAsic * self._NumColPerAdcCh)}
+
     def _calcImgWidth(self):
         return self._NumAsicsPerSide * self._NumAdcChPerAsic * self._NumColPerAdcCh
 
+
+##########################################################
+# camera decoders
+##########################################################
+# used for unknown camera types, no image is ever built
+NO_CAMERA_DECODER = CameraDecoder(init = lambda camera: None, descramble = lambda camera, rawData: None,
+                                  buildFrame = lambda camera, currentRawData, newRawData: [0, 0, []])
+
+Camera.registerCamera('ePix100a',     Camera._initEPix100a,        Camera._descrambleEPix100aImage, usesPool = True)
+# the ePix100p images are descrambled like the ePix100a ones
+Camera.registerCamera('ePix100p',     Camera._initEPix100p,        Camera._descrambleEPix100aImage, usesPool = True)
+Camera.registerCamera('Tixel48x48',   Camera._initTixel48x48,      Camera._descrambleTixel48x48Image, Camera._buildFrameFromAssembler)
+Camera.registerCamera('ePix10ka',     Camera._initEpix10ka,        Camera._descrambleEPix100aImage, usesPool = True)
+Camera.registerCamera('Cpix2',        Camera._initCpix2,           Camera._descrambleCpix2Image, Camera._buildFrameFromAssembler)
+Camera.registerCamera('ePixM32Array', Camera._initEpixM32,         Camera._descrambleEpixM32Image, Camera._buildFrameEpixM32Image,
+                      descrambleBatch = Camera._descrambleEpixM32Batch, framesPerImage = 2)
+Camera.registerCamera('HrAdc32x32',   Camera._initEpixHRADC32x32,  Camera._descrambleEpixHRADC32x32Image, Camera._buildFrameEpixHRADC32x32Image,
+                      descrambleBatch = Camera._descrambleEpixHRADC32x32Batch, framesPerImage = 2)
+Camera.registerCamera('cryo64xN',     Camera._initCRYO64XN,        Camera._descrambleCRYO64XNImage, usesPool = True,
+                      descrambleBatch = Camera._descrambleCRYO64XNBatch, batchShape = Camera._cryoBatchShape)
+Camera.registerCamera('ePixHrePixM',  Camera._initEPIXMNX64,       Camera._descrambleEPIXMNX64Image, usesPool = True,
+                      descrambleBatch = Camera._descrambleEPIXMNX64Batch, batchShape = Camera._epixMNX64BatchShape)
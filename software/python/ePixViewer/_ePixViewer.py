@@ -30,6 +30,8 @@ import pyrogue
 import time
 import ePixViewer.imgProcessing as imgPr
 import ePixViewer.Cameras as cameras
+import ePixViewer.dataReader as dataReader
+import ePixViewer.noiseSpectrum as noiseSpectrum
 import numpy as np
 from matplotlib.backends.backend_qt4agg import FigureCanvasQTAgg as FigureCanvas
 from matplotlib.figure import Figure
@@ -110,6 +112,7 @@ class Window(QMainWindow, QObject):
         self.eventReaderScope = EventReader(self)
         self.eventReaderMonitoring = EventReader(self)
         self.dilplayFramesFromAsics = -1 # 0 for asic 0, 1 for asic 1, -1 for all
+        self.dataFileIndex = None
 
 
         # Connect the fileReader to our event processor
@@ -130,7 +133,10 @@ class Window(QMainWindow, QObject):
         # initialize image processing objects
         self.rawImgFrame = []
         self.imgDesc = []
+        self.ImgDarkSub = None
         self.imgTool = imgPr.ImageProcessing(self)
+        # noise spectrum averaged over the displayed images
+        self.noiseSpectrum = noiseSpectrum.NoiseSpectrum()
 
         #init mouse variables
         self.mouseX = 0
@@ -218,8 +224,8 @@ class Window(QMainWindow, QObject):
         self.eventReader.frameIndex = 1
         self.eventReader.VIEW_DATA_CHANNEL_ID = 1
         self.setReadDelay(0.1)
-        self.filename = QFileDialog.getOpenFileName(self, 'Open File', '', 'Rogue Images (*.dat);; GenDAQ Images (*.bin);;Any (*.*)')  
-        if (os.path.splitext(self.filename)[1] == '.dat'): 
+        self.filename = QFileDialog.getOpenFileName(self, 'Open File', '', 'Rogue Images (*.dat);; Compressed Rogue Images (*.h5);; GenDAQ Images (*.bin);;Any (*.*)')  
+        if ((os.path.splitext(self.filename)[1] == '.dat') or dataReader.isFrameStore(self.filename)): 
             self.displayImagDat(self.filename)
         else:
             self.displayImag(self.filename)
@@ -250,6 +256,13 @@ class Window(QMainWindow, QObject):
             numDarkImg = self.imgTool.numDarkImages
         if (numDarkImg>0):
             self.imgTool.numDarkImages = numDarkImg
+        #weight of the newest frame once the dark image is tracked (0 is a plain average)
+        try:
+            darkForgetting = float(self.darkForgetting.text())
+        except ValueError:
+            darkForgetting = self.imgTool.darkForgetting
+        if (darkForgetting>=0 and darkForgetting<1):
+            self.imgTool.darkForgetting = darkForgetting
         #starts capturing the images for the dark image generation
         self.imgTool.setDarkImg(self.imgDesc)
         print("Dark image requested.")
@@ -258,6 +271,15 @@ class Window(QMainWindow, QObject):
     def unsetDark(self):
         self.imgTool.unsetDarkImg()
         print("Dark image unset.")
+
+
+    def showDarkRms(self):
+        #noise map of the dark frames on the line display 1
+        darkRms = self.imgTool.getDarkRms()
+        if darkRms is None:
+            print("No dark frames, the dark RMS is not available.")
+            return
+        self.lineDisplay1.update_figure(darkRms, autoScale = True, plotImageTranspose = self.cbPlotImageTranspose.isChecked())
         
 
     # display the previous frame from the current file
@@ -303,20 +325,33 @@ class Window(QMainWindow, QObject):
 #                    QtCore.Qt.SmoothTransformation))
 
 
-    # if the image is a rogue type, calls the file reader object to read all frames
+    # if the image is a rogue type (or a compressed frame store), uses the file index to read the requested frame directly
     def displayImagDat(self, filename):
 
         print('File name: ', filename)
         self.eventReader.readDataDone = False
-        self.eventReader.numAcceptedFrames = 0
-        self.fileReader.open(filename)
-
-        # waits until data is found
-        timeoutCnt = 0
-        while ((self.eventReader.readDataDone == False) and (timeoutCnt < 10)):
-             timeoutCnt += 1
-             print('Loading image...', self.eventReader.frameIndex, 'atempt',  timeoutCnt)
-             time.sleep(0.1)
+        # the index is built once per file (or reloaded from its index file)
+        if ((self.dataFileIndex is None) or (self.dataFileIndex.filename != filename)):
+            self.dataFileIndex = dataReader.openFrameIndex(filename)
+        self.eventReader.numAcceptedFrames = len(self.dataFileIndex)
+
+        frameNumber = self.eventReader.frameIndex - 1
+        if (frameNumber >= len(self.dataFileIndex)):
+            print('Frame ', self.eventReader.frameIndex, ' not found. File has ', len(self.dataFileIndex), ' frames.')
+            return
+
+        p = bytearray(self.dataFileIndex.readFrame(frameNumber))
+        chNum = self.dataFileIndex.channel[frameNumber]
+        self.eventReader.readDataDone = True
+        if (chNum == self.eventReader.VIEW_DATA_CHANNEL_ID):
+            self.eventReader.frameData = p
+            self.buildImageFrame()
+        elif (chNum == self.eventReader.VIEW_PSEUDOSCOPE_ID):
+            self.eventReader.frameDataScope[:] = p
+            self.displayPseudoScopeFromReader()
+        elif (chNum == self.eventReader.VIEW_MONITORING_DATA_ID):
+            self.eventReader.frameDataMonitoring[:] = p
+            self.displayMonitoringDataFromReader()
     
     # build image frame. 
     # If image frame is completed calls displayImageFromReader
@@ -340,20 +375,45 @@ class Window(QMainWindow, QObject):
                 self.rawImgFrame = []              
         
 
+    def _getDarkSubtractedImg(self):
+        """dark subtracted copy of imgDesc written into a buffer of the camera pool"""
+        outType = np.result_type(self.imgDesc, self.imgTool.imgDark)
+        out = self.currentCam.bufferPool.get(self.imgDesc.shape, outType)
+        return self.imgTool.getDarkSubtractedImg(self.imgDesc, out = out)
+
+    def _correctCommonMode(self):
+        """median common mode per ADC removed from the dark subtracted image, in place"""
+        if (self.cbCommonMode.isChecked()) and ('adc' in self.currentCam.commonModeBlocks):
+            self.currentCam.commonModeCorrection('adc').correct(self.ImgDarkSub, out = self.ImgDarkSub)
+
     # core code for displaying the image
     def displayImageFromReader(self, imageData):
         #init variables
         self.imgTool.imgWidth = self.currentCam.sensorWidth
         self.imgTool.imgHeight = self.currentCam.sensorHeight
-        #get descrambled image com camera
-        self.imgDesc = self.currentCam.descrambleImage(imageData)
+        #get descrambled image com camera, the arrays are recycled by the camera buffer pool
+        fusedDarkSub = self.cbFusedProcessing.isChecked() and self.imgTool.imgDark_isSet
+        if (fusedDarkSub):
+            #descrambling, bit mask and dark subtraction done by the camera in one call
+            [imgDesc, imgDarkSub] = self.currentCam.processImage(imageData, out = self.currentCam.bufferPool,
+                                                                 pedestal = self.imgTool.getDarkImg(np.float32), returnDescrambled = True)
+        else:
+            imgDesc = self.currentCam.descrambleImage(imageData, out = self.currentCam.bufferPool)
+        if imgDesc is None:
+            #frame that cannot be descrambled (counted by the camera), the previous image stays on display
+            return
+        self.imgDesc = imgDesc
+        if (fusedDarkSub):
+            self.ImgDarkSub = imgDarkSub
                     
         arrayLen = len(self.imgDesc)
 
         self._updateImageScales()
 
         if (self.imgTool.imgDark_isSet):
-            self.ImgDarkSub = self.imgTool.getDarkSubtractedImg(self.imgDesc)
+            if not fusedDarkSub:
+                self.ImgDarkSub = self._getDarkSubtractedImg()
+            self._correctCommonMode()
             _8bitImg = self.ImgDarkSub#self.imgTool.reScaleImgTo8bit(self.ImgDarkSub, self.imageScaleMax, self.imageScaleMin)
         else:
             # get the data into the image object
@@ -461,14 +521,23 @@ class Window(QMainWindow, QObject):
         #saves dark image set, if requested
         if (self.imgTool.imgDark_isRequested):
             self.imgTool.setDarkImg(self.imgDesc)
-        #if the image gets done, saves it for other processes
-        if (self.imgTool.imgDark_isSet):
-            self.ImgDarkSub = self.imgTool.getDarkSubtractedImg(self.imgDesc)
+            #if the image gets done, saves it for other processes
+            #(otherwise the display already computed it for this frame)
+            if (self.imgTool.imgDark_isSet):
+                self.ImgDarkSub = self._getDarkSubtractedImg()
+                self._correctCommonMode()
+        elif (self.imgTool.imgDark_isSet and self.cbDarkTracking.isChecked()):
+            #the dark image keeps following the frames (drifts with a forgetting factor)
+            self.imgTool.updateDarkImg(self.imgDesc)
             
         #check horizontal line display
         if ((self.cbHorizontalLineEnabled.isChecked()) or (self.cbVerticalLineEnabled.isChecked()) or (self.cbpixelTimeSeriesEnabled.isChecked())):
             self.updatePixelTimeSeriesLinePlot()
             self.updateLinePlots()
+
+        #noise spectrum display
+        if (self.cbNoiseSpectrumEnabled.isChecked()):
+            self.updateNoiseSpectrum()
     
     def updateLinePlots(self):
         ##if (PRINT_VERBOSE): print('Horizontal plot processing')
@@ -492,6 +561,34 @@ class Window(QMainWindow, QObject):
                 print("Invalid line plot position")
 
 
+    def updateNoiseSpectrum(self):
+        """adds the image to the running noise spectrum of its rows (channels) and plots it in line display 1"""
+        if (np.ndim(self.imgDesc) != 2):
+            return
+        try:
+            self.noiseSpectrum.update(self.imgDesc)
+        except ValueError:
+            # the image shape changed, a new spectrum is started
+            self.noiseSpectrum.reset()
+            self.noiseSpectrum.update(self.imgDesc)
+        psd = self.noiseSpectrum.psd()
+        try:
+            channel = int(self.noiseSpectrumChannel.text())
+        except ValueError:
+            channel = -1
+        if (0 <= channel < psd.shape[0]):
+            label = "channel " + str(channel)
+            psd = psd[channel]
+        else:
+            label = "mean of all channels"
+            psd = np.mean(psd, axis=0)
+        self.lineDisplay1.update_spectrum(self.noiseSpectrum.frequencies(), psd, label + ", " + str(self.noiseSpectrum.numSegments) + " segments")
+
+    def resetNoiseSpectrum(self):
+        self.noiseSpectrum.reset()
+        print("Noise spectrum reset.")
+
+
     """ Plot pixel values for multiple images """
     def clearPixelTimeSeriesLinePlot(self):
         self.pixelTimeSeries = np.array([])
@@ -801,6 +898,16 @@ class MplCanvas(FigureCanvas):
         self.axes.set_title(self.MyTitle)        
         self.draw()
 
+    def update_spectrum(self, frequencies, psd, label = ""):
+        """power spectral density in log scale, without the DC bin"""
+        self.axes.cla()
+        self.axes.semilogy(frequencies[1:], psd[1:], 'b')
+        self.axes.set_xlabel('Frequency (1/sample)')
+        self.axes.text(0.5, 0.95, label, horizontalalignment='center', verticalalignment='center', transform=self.axes.transAxes)
+        self.axes.grid()
+        self.axes.set_title(self.MyTitle)
+        self.draw()
+
     def update_figure(self, image=None, contrast=None, autoScale = True, plotImageTranspose = True):
         self.axes.cla()
         self.axes.autoscale = autoScale
@@ -846,6 +953,7 @@ class TabbedCtrlCanvas(QTabWidget):
         tab2	= QWidget()
         tab3    = QWidget()
         tab4    = QWidget()
+        tab5    = QWidget()
 
         ######################################################      
         # create widgets for tab 1 (Main)
@@ -867,6 +975,19 @@ class TabbedCtrlCanvas(QTabWidget):
         myParent.numDarkImg.setMaximumWidth(150)
         myParent.numDarkImg.setMinimumWidth(100)
         myParent.numDarkImg.setText(str(10))
+        # dark image tracking
+        darkForgettingLabel = QLabel("Dark forgetting factor")
+        myParent.darkForgetting = QLineEdit()
+        myParent.darkForgetting.setMaximumWidth(150)
+        myParent.darkForgetting.setMinimumWidth(100)
+        myParent.darkForgetting.setText(str(myParent.imgTool.darkForgetting))
+        myParent.cbDarkTracking = QCheckBox('Track dark drift')
+        myParent.cbDarkTracking.setChecked(False)
+        # button show dark rms
+        btnShowDarkRms = QPushButton("Show Dark RMS")
+        btnShowDarkRms.setMaximumWidth(150)
+        btnShowDarkRms.clicked.connect(myParent.showDarkRms)
+        btnShowDarkRms.resize(btnShowDarkRms.minimumSizeHint())
         # button quit
         btnQuit = QPushButton("Quit")
         btnQuit.setMaximumWidth(150)
@@ -906,6 +1027,10 @@ class TabbedCtrlCanvas(QTabWidget):
         # check boxes
         myParent.cbPlotImageTranspose = QCheckBox('Plot image transposed')
         myParent.cbPlotImageTranspose.setChecked(True)
+        myParent.cbFusedProcessing = QCheckBox('Fused dark subtraction')
+        myParent.cbFusedProcessing.setChecked(True)
+        myParent.cbCommonMode = QCheckBox('Common mode (ADC median)')
+        myParent.cbCommonMode.setChecked(False)
         
         # set layout to tab 1
         tab1Frame = QFrame()
@@ -932,6 +1057,12 @@ class TabbedCtrlCanvas(QTabWidget):
         grid.addWidget(myParent.imageScaleMaxLine, 4, 2)
         grid.addWidget(myParent.imageScaleMinLine,4, 3)
         grid.addWidget(myParent.cbPlotImageTranspose,4, 4)
+        grid.addWidget(darkForgettingLabel, 5, 1)
+        grid.addWidget(myParent.darkForgetting, 5, 2)
+        grid.addWidget(myParent.cbDarkTracking, 5, 3)
+        grid.addWidget(myParent.cbFusedProcessing,5, 4)
+        grid.addWidget(btnShowDarkRms, 6, 1)
+        grid.addWidget(myParent.cbCommonMode,6, 4)
 
         # complete tab1
         tab1.setLayout(grid)
@@ -1076,12 +1207,45 @@ class TabbedCtrlCanvas(QTabWidget):
         # complete tab4
         tab4.setLayout(grid4)
 
+        ######################################################      
+        # create widgets for tab 5 (Noise spectrum)
+        ######################################################      
+        myParent.cbNoiseSpectrumEnabled = QCheckBox('Noise spectrum (Line Display 1)')
+        noiseSpectrumChannelLabel = QLabel("Channel (-1 for mean)")
+        myParent.noiseSpectrumChannel = QLineEdit()
+        myParent.noiseSpectrumChannel.setMaximumWidth(100)
+        myParent.noiseSpectrumChannel.setMinimumWidth(50)
+        myParent.noiseSpectrumChannel.setText(str(-1))
+        # button reset spectrum
+        btnResetNoiseSpectrum = QPushButton("Reset")
+        btnResetNoiseSpectrum.setMaximumWidth(150)
+        btnResetNoiseSpectrum.clicked.connect(myParent.resetNoiseSpectrum)
+        btnResetNoiseSpectrum.resize(btnResetNoiseSpectrum.minimumSizeHint())
+
+        # set layout to tab 5
+        tab5Frame1 = QFrame()
+        tab5Frame1.setFrameStyle(QFrame.Panel);
+        tab5Frame1.setGeometry(100, 200, 0, 0)
+        tab5Frame1.setLineWidth(1);
+
+        grid5 = QGridLayout()
+        grid5.setSpacing(5)
+        grid5.addWidget(tab5Frame1,0,0,4,7)
+        grid5.addWidget(myParent.cbNoiseSpectrumEnabled, 1, 1)
+        grid5.addWidget(noiseSpectrumChannelLabel, 2, 1)
+        grid5.addWidget(myParent.noiseSpectrumChannel, 2, 2)
+        grid5.addWidget(btnResetNoiseSpectrum, 3, 1)
+
+        # complete tab5
+        tab5.setLayout(grid5)
+
 
         # Add tabs
         self.addTab(tab1,"Main")
         self.addTab(tab2,"File controls")
         self.addTab(tab3,"Line Display 1")
         self.addTab(tab4,"Line Display 2")
+        self.addTab(tab5,"Noise spectrum")
 
         self.setGeometry(300, 300, 300, 150)
         self.setWindowTitle('')    
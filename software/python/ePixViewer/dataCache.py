@@ -0,0 +1,193 @@
+#!/usr/bin/env python
+#-----------------------------------------------------------------------------
+# Title      : on disk cache of decoded data
+#-----------------------------------------------------------------------------
+# File       : dataCache.py
+# Created    : 2026-10-18
+# Last update: 2026-10-18
+#-----------------------------------------------------------------------------
+# Description:
+# Keeps descrambled image stacks and their reductions on local disk so the
+# same raw file is only decoded once. Entries are keyed by the identity of
+# the raw file (path, size, modification time) and by the decoding
+# parameters (camera type, bit mask, ...). The least recently used entries
+# are removed when the cache grows over its size budget.
+#
+#-----------------------------------------------------------------------------
+# This file is part of the ePix rogue. It is subject to
+# the license terms in the LICENSE.txt file found in the top-level directory
+# of this distribution and at:
+#    https://confluence.slac.stanford.edu/display/ppareg/LICENSE.html.
+# No part of the ePix rogue, including this file, may be
+# copied, modified, propagated, or distributed except according to the terms
+# contained in the LICENSE.txt file.
+#-----------------------------------------------------------------------------
+
+import os
+import hashlib
+import numpy as np
+import ePixViewer.imgStream as imgStream
+
+PRINT_VERBOSE = 0
+
+DEFAULT_CACHE_DIR   = os.path.join(os.path.expanduser('~'), '.cache', 'ePixViewer')
+DEFAULT_CACHE_BYTES = 8*1024*1024*1024
+
+
+################################################################################
+################################################################################
+#   Data cache class
+#   One .npy file per array result, one .npz file per list of arrays
+################################################################################
+class DataCache():
+    """LRU cache of decoded results stored on local disk"""
+
+    def __init__(self, cacheDir = DEFAULT_CACHE_DIR, maxBytes = DEFAULT_CACHE_BYTES):
+        self.cacheDir = cacheDir
+        self.maxBytes = maxBytes
+        os.makedirs(self.cacheDir, exist_ok = True)
+
+    def key(self, filename, cameraType, bitMask, kind, **params):
+        """returns the cache key of a result computed from a raw file"""
+        stat = os.stat(filename)
+        identity = [os.path.abspath(filename), stat.st_size, stat.st_mtime_ns, cameraType, int(bitMask), kind]
+        identity = identity + ["%s=%r" % (name, params[name]) for name in sorted(params)]
+        return hashlib.sha1(repr(identity).encode()).hexdigest()
+
+    def _entry(self, key):
+        """returns the existing file of an entry, or None"""
+        for suffix in ('.npy', '.npz'):
+            entryFilename = os.path.join(self.cacheDir, key + suffix)
+            if os.path.isfile(entryFilename):
+                return entryFilename
+        return None
+
+    def get(self, key, mmapMode = None):
+        """returns the cached result, or None if it is not in the cache.
+           Array results can be memory mapped with mmapMode = 'r'."""
+        entryFilename = self._entry(key)
+        if entryFilename is None:
+            return None
+        try:
+            if entryFilename.endswith('.npy'):
+                result = np.load(entryFilename, mmap_mode = mmapMode)
+            else:
+                with np.load(entryFilename) as entry:
+                    result = [entry['arr_%d' % i] for i in range(len(entry.files))]
+            # the modification time is used as the last access time
+            os.utime(entryFilename)
+        except (OSError, ValueError):
+            return None
+        if (PRINT_VERBOSE): print("DataCache: hit", key)
+        return result
+
+    def put(self, key, result):
+        """stores an array or a list of arrays and evicts old entries if needed.
+           Results holding None (no frames) are not stored: np.savez would write them
+           as object arrays, which get cannot load back."""
+        if (result is None) or (isinstance(result, (list, tuple)) and any(item is None for item in result)):
+            return
+        if isinstance(result, (list, tuple)):
+            entryFilename = os.path.join(self.cacheDir, key + '.npz')
+        else:
+            entryFilename = os.path.join(self.cacheDir, key + '.npy')
+        # written under a temporary name so a partial entry is never read back
+        tmpFilename = entryFilename + '.%d.tmp' % os.getpid()
+        try:
+            with open(tmpFilename, mode = 'wb') as f:
+                if isinstance(result, (list, tuple)):
+                    np.savez(f, *result)
+                else:
+                    np.save(f, result)
+            os.replace(tmpFilename, entryFilename)
+        except OSError:
+            if (PRINT_VERBOSE): print("DataCache: could not write", entryFilename)
+            if os.path.isfile(tmpFilename):
+                os.remove(tmpFilename)
+            return
+        self.evict()
+
+    def getOrCompute(self, filename, cameraType, bitMask, kind, compute, mmapMode = None, **params):
+        """returns the cached result or calls compute() and caches what it returns"""
+        key = self.key(filename, cameraType, bitMask, kind, **params)
+        result = self.get(key, mmapMode = mmapMode)
+        if result is None:
+            if (PRINT_VERBOSE): print("DataCache: miss", kind, filename)
+            result = compute()
+            self.put(key, result)
+        return result
+
+    def size(self):
+        """returns the number of bytes used by the cache"""
+        return sum(size for entryFilename, size, mtime in self._entries())
+
+    def _entries(self):
+        entries = []
+        for name in os.listdir(self.cacheDir):
+            if not (name.endswith('.npy') or name.endswith('.npz')):
+                continue
+            try:
+                stat = os.stat(os.path.join(self.cacheDir, name))
+            except OSError:
+                continue
+            entries.append((os.path.join(self.cacheDir, name), stat.st_size, stat.st_mtime_ns))
+        return entries
+
+    def evict(self):
+        """removes the least recently used entries until the cache fits its budget"""
+        entries = sorted(self._entries(), key = lambda entry: entry[2])
+        total = sum(entry[1] for entry in entries)
+        for entryFilename, size, mtime in entries:
+            if (total <= self.maxBytes):
+                break
+            try:
+                os.remove(entryFilename)
+            except OSError:
+                continue
+            total = total - size
+            if (PRINT_VERBOSE): print("DataCache: evicted", entryFilename)
+
+    def clear(self):
+        """removes all entries"""
+        for entryFilename, size, mtime in self._entries():
+            os.remove(entryFilename)
+
+
+##########################################################
+# cached decoding of rogue files
+##########################################################
+def cachedImages(camera, filename, channel = 1, asic = None, dtype = None, cache = None, mmapMode = None):
+    """returns the [images, rows, cols] stack of descrambled images of a rogue file"""
+    if cache is None:
+        cache = DataCache()
+    compute = lambda: imgStream.stackImages(imgStream.iterImageBatchesFromFile(camera, filename, channel = channel, asic = asic, dtype = dtype))
+    return cache.getOrCompute(filename, camera.cameraType, camera.bitMask, 'images', compute, mmapMode = mmapMode,
+                              channel = channel, asic = asic, dtype = None if dtype is None else np.dtype(dtype).str)
+
+
+def cachedMeanStd(camera, filename, channel = 1, asic = None, cache = None):
+    """returns [mean, std] per pixel of the descrambled images of a rogue file"""
+    if cache is None:
+        cache = DataCache()
+    compute = lambda: imgStream.batchMeanStd(imgStream.iterImageBatchesFromFile(camera, filename, channel = channel, asic = asic))
+    return cache.getOrCompute(filename, camera.cameraType, camera.bitMask, 'meanStd', compute, channel = channel, asic = asic)
+
+
+def cachedHistogram(camera, filename, bins, channel = 1, asic = None, cache = None):
+    """returns [counts, bins] of all pixel values of the descrambled images of a rogue file"""
+    if cache is None:
+        cache = DataCache()
+    bins = np.asarray(bins)
+    compute = lambda: imgStream.batchHistogram(imgStream.iterImageBatchesFromFile(camera, filename, channel = channel, asic = asic), bins)
+    return cache.getOrCompute(filename, camera.cameraType, camera.bitMask, 'histogram', compute, channel = channel, asic = asic,
+                              bins = hashlib.sha1(bins.tobytes()).hexdigest())
+
+
+def cachedNoiseSpectrum(camera, filename, segmentLength = None, overlap = 0.5, sampleRate = 1.0, channel = 1, asic = None, cache = None):
+    """returns [frequencies, psd] of each channel (image row) of the descrambled images of a rogue file"""
+    if cache is None:
+        cache = DataCache()
+    compute = lambda: imgStream.batchNoiseSpectrum(imgStream.iterImageBatchesFromFile(camera, filename, channel = channel, asic = asic),
+                                                   segmentLength = segmentLength, overlap = overlap, sampleRate = sampleRate)
+    return cache.getOrCompute(filename, camera.cameraType, camera.bitMask, 'noiseSpectrum', compute, channel = channel, asic = asic,
+                              segmentLength = segmentLength, overlap = overlap, sampleRate = sampleRate)
@@ -0,0 +1,600 @@
+#!/usr/bin/env python
+#-----------------------------------------------------------------------------
+# Title      : offline readers for rogue data files
+#-----------------------------------------------------------------------------
+# File       : dataReader.py
+# Created    : 2026-10-18
+# Last update: 2026-10-18
+#-----------------------------------------------------------------------------
+# Description:
+# Random access to the frames stored in rogue .dat files. A single pass over
+# the 8 byte file headers builds an index of all frames which is saved next
+# to the data file so later runs can jump to any frame directly.
+# Compressed frame stores (.h5) are read through the same interface.
+# FrameFollower reads a file while the data writer is still filling it.
+#
+#-----------------------------------------------------------------------------
+# This file is part of the ePix rogue. It is subject to
+# the license terms in the LICENSE.txt file found in the top-level directory
+# of this distribution and at:
+#    https://confluence.slac.stanford.edu/display/ppareg/LICENSE.html.
+# No part of the ePix rogue, including this file, may be
+# copied, modified, propagated, or distributed except according to the terms
+# contained in the LICENSE.txt file.
+#-----------------------------------------------------------------------------
+
+import os
+import time
+import mmap
+import struct
+import numpy as np
+try:
+    from inotify_simple import INotify, flags as inotifyFlags
+except ImportError:
+    INotify = None
+
+PRINT_VERBOSE = 0
+
+# rogue file header: dword 0 is the frame size in bytes (including dword 1),
+# dword 1 holds the channel number on its upper byte
+FILE_HEADER_SIZE   = 8
+INDEX_FILE_SUFFIX  = '.idx.npz'
+INDEX_FILE_VERSION = 3
+# header checks used to detect corrupted data
+VALID_CHANNELS        = (0, 1, 2, 3)
+MAX_PAYLOAD_SIZE      = 64*1024*1024
+# the cameras read here send payloads of whole 32 bit words, an unaligned size is
+# taken as corruption (FrameIndex(sizeAlignment = None) accepts any size)
+FRAME_SIZE_ALIGNMENT  = 4
+# channel of the image frames, the only one where the ASIC bit of the payload is meaningful
+IMAGE_CHANNEL         = 1
+# bytes searched at once for the next valid header after corrupted data
+RESYNC_WINDOW         = 1024*1024
+# file follower defaults
+FOLLOW_POLL_INTERVAL  = 0.5
+FOLLOW_READ_AHEAD     = 1024
+# compressed frame stores (see frameStore.py) are read through the same interface
+FRAME_STORE_EXTENSIONS = ('.h5', '.hdf5')
+
+
+################################################################################
+################################################################################
+#   Frame index class
+#   Keeps offset, size, channel and ASIC of every frame in a rogue file
+################################################################################
+class FrameIndex():
+    """index of the frames stored in a rogue .dat file.
+       A header is valid when its channel is in validChannels, its payload is at most
+       MAX_PAYLOAD_SIZE and its size a multiple of sizeAlignment (None accepts any size).
+       In a finished file a header is only accepted when its frame ends at a valid header
+       or at the end of the file, otherwise the scan resyncs. growing = True is for files
+       still being written: a frame running past the end of the file stops the scan there
+       until the next update."""
+
+    def __init__(self, filename, useIndexFile = True, validChannels = VALID_CHANNELS, maxFrames = None,
+                 sizeAlignment = FRAME_SIZE_ALIGNMENT, growing = False):
+        self.filename = filename
+        self.indexFilename = filename + INDEX_FILE_SUFFIX
+        self.useIndexFile = useIndexFile
+        self.validChannels = validChannels
+        self.sizeAlignment = sizeAlignment
+        self.growing = growing
+        # one entry per frame
+        self.offset  = np.zeros(0, dtype='int64')   # payload position in the file
+        self.size    = np.zeros(0, dtype='int64')   # payload size in bytes
+        self.channel = np.zeros(0, dtype='uint8')   # header dword 1 >> 24
+        self.asic    = np.zeros(0, dtype='uint8')   # payload dword 0 bit 4
+        # [start, end) byte ranges skipped because the headers were not valid
+        self.badRegions = np.zeros((0, 2), dtype='int64')
+        # number of bytes of the file already indexed
+        self._scanEnd = 0
+
+        if not (self.useIndexFile and self.load()):
+            self.update(maxFrames = maxFrames)
+            if self.useIndexFile:
+                self.save()
+
+    def __len__(self):
+        return len(self.offset)
+
+    def validHeader(self, frameSize, frameFlags):
+        """checks the size and channel of a rogue file header"""
+        if ((frameSize < 4) or ((frameSize - 4) > MAX_PAYLOAD_SIZE)):
+            return False
+        if self.sizeAlignment and (frameSize % self.sizeAlignment):
+            return False
+        return (self.validChannels is None) or ((frameFlags >> 24) in self.validChannels)
+
+    def _validHeaders(self, mm, start, stop, fileSize):
+        """returns a mask of the positions in [start, stop) that hold a valid header of a frame ending in the file"""
+        data  = np.frombuffer(mm, dtype='uint8', count = stop - start + FILE_HEADER_SIZE - 1, offset = start).astype('int64')
+        count = stop - start
+        frameSize = data[0:count] | (data[1:count+1] << 8) | (data[2:count+2] << 16) | (data[3:count+3] << 24)
+        channel   = data[7:count+7]
+        valid = (frameSize >= 4) & ((frameSize - 4) <= MAX_PAYLOAD_SIZE)
+        if self.sizeAlignment:
+            valid &= (frameSize % self.sizeAlignment) == 0
+        if self.validChannels is not None:
+            valid &= np.isin(channel, self.validChannels)
+        valid &= (np.arange(start, stop) + 4 + frameSize) <= fileSize
+        return valid, frameSize
+
+    def _resync(self, mm, start, fileSize, stop = None):
+        """searches the next valid header confirmed by a valid header (or the end of file) right after its frame,
+           starting before stop (the end of the file when None). Returns its position, or None if there is none."""
+        end = fileSize - FILE_HEADER_SIZE + 1
+        if stop is not None:
+            end = min(end, stop)
+        for windowStart in range(start, end, RESYNC_WINDOW):
+            windowStop = min(windowStart + RESYNC_WINDOW, end)
+            valid, frameSize = self._validHeaders(mm, windowStart, windowStop, fileSize)
+            for candidate in np.flatnonzero(valid).tolist():
+                pos = windowStart + candidate
+                if self._confirmed(mm, pos + 4 + int(frameSize[candidate]), fileSize):
+                    return pos
+        return None
+
+    def _confirmed(self, mm, nextPos, fileSize):
+        """True if a frame ending at nextPos is followed by a valid header or ends the file"""
+        if ((nextPos + FILE_HEADER_SIZE) > fileSize):
+            # the end of the file, or less than a header after the frame (being written, or trailing bytes)
+            return True
+        return self.validHeader(*struct.unpack_from('<II', mm, nextPos))
+
+    def update(self, maxFrames = None):
+        """scans the file headers past the last indexed frame, returns the number of new frames.
+           The payloads are skipped, only the headers and the first payload word are read.
+           Corrupted data is skipped up to the next valid header and recorded in badRegions.
+           maxFrames limits the number of frames indexed by this call."""
+        fileSize = os.path.getsize(self.filename)
+        if (fileSize - self._scanEnd) < FILE_HEADER_SIZE:
+            return 0
+
+        offsets = []
+        sizes   = []
+        flags   = []
+        words0  = []
+        badRegions = []
+        with open(self.filename, mode = 'rb') as f:
+            mm = mmap.mmap(f.fileno(), 0, access = mmap.ACCESS_READ)
+            try:
+                pos = self._scanEnd
+                while ((pos + FILE_HEADER_SIZE) <= fileSize) and ((maxFrames is None) or (len(offsets) < maxFrames)):
+                    frameSize, frameFlags = struct.unpack_from('<II', mm, pos)
+                    payloadSize = frameSize - 4
+                    frameEnd = pos + FILE_HEADER_SIZE + payloadSize
+                    valid = self.validHeader(frameSize, frameFlags)
+                    nextPos = None
+                    if valid and (frameEnd > fileSize):
+                        if self.growing:
+                            # a frame still being written, the scan restarts from here when the file grows
+                            break
+                        # the size of a finished file runs past its end
+                        valid = False
+                    elif valid and not self._confirmed(mm, frameEnd, fileSize):
+                        # either the size or the data after the frame is corrupted,
+                        # the size is wrong if a confirmed header starts inside the frame
+                        nextPos = self._resync(mm, pos + 1, fileSize, stop = frameEnd)
+                        valid = nextPos is None
+                    if not valid:
+                        if nextPos is None:
+                            nextPos = self._resync(mm, pos + 1, fileSize)
+                        if nextPos is None:
+                            if self.growing:
+                                # nothing valid up to the end yet, the scan restarts from here
+                                break
+                            nextPos = fileSize
+                        print("FrameIndex: invalid header (size", frameSize, ", channel", frameFlags >> 24, ") at byte", pos,
+                              ", skipped", nextPos - pos, "bytes")
+                        badRegions.append((pos, nextPos))
+                        pos = nextPos
+                        continue
+                    offsets.append(pos + FILE_HEADER_SIZE)
+                    sizes.append(payloadSize)
+                    flags.append(frameFlags)
+                    if (payloadSize >= 4):
+                        words0.append(struct.unpack_from('<I', mm, pos + FILE_HEADER_SIZE)[0])
+                    else:
+                        words0.append(0)
+                    pos = frameEnd
+            finally:
+                mm.close()
+        self._scanEnd = pos
+
+        if (len(offsets) > 0):
+            flags  = np.array(flags,  dtype='uint32')
+            words0 = np.array(words0, dtype='uint32')
+            self.offset  = np.append(self.offset,  np.array(offsets, dtype='int64'))
+            self.size    = np.append(self.size,    np.array(sizes,   dtype='int64'))
+            self.channel = np.append(self.channel, (flags >> 24).astype('uint8'))
+            self.asic    = np.append(self.asic,    ((words0 & 0x10) >> 4).astype('uint8'))
+        if (len(badRegions) > 0):
+            self.badRegions = np.append(self.badRegions, np.array(badRegions, dtype='int64'), axis = 0)
+        if (PRINT_VERBOSE): print("FrameIndex: indexed", len(offsets), "new frames of", self.filename)
+        return len(offsets)
+
+    def save(self):
+        """writes the index next to the data file, returns False if that is not possible"""
+        stat = os.stat(self.filename)
+        try:
+            with open(self.indexFilename, mode = 'wb') as f:
+                np.savez(f, version = INDEX_FILE_VERSION, fileSize = stat.st_size, fileMtime = stat.st_mtime_ns,
+                         sizeAlignment = self.sizeAlignment or 0, scanEnd = self._scanEnd, offset = self.offset, size = self.size,
+                         channel = self.channel, asic = self.asic, badRegions = self.badRegions)
+        except OSError:
+            # read only data areas simply keep the index in memory
+            if (PRINT_VERBOSE): print("FrameIndex: could not write", self.indexFilename)
+            return False
+        return True
+
+    def load(self):
+        """reads a previously saved index, returns False if it is missing or out of date"""
+        try:
+            stat = os.stat(self.filename)
+            with np.load(self.indexFilename) as idx:
+                if ((int(idx['version']) != INDEX_FILE_VERSION) or (int(idx['fileSize']) != stat.st_size) or
+                    (int(idx['fileMtime']) != stat.st_mtime_ns) or (int(idx['sizeAlignment']) != (self.sizeAlignment or 0))):
+                    return False
+                self._scanEnd = int(idx['scanEnd'])
+                self.offset   = idx['offset']
+                self.size     = idx['size']
+                self.channel  = idx['channel']
+                self.asic     = idx['asic']
+                self.badRegions = idx['badRegions']
+        except (OSError, KeyError, ValueError):
+            return False
+        return True
+
+    def select(self, channel = None, asic = None, payloadSize = None):
+        """returns the frame numbers matching the channel, ASIC and payload size in bytes (None matches all)"""
+        mask = np.ones(len(self), dtype=bool)
+        if channel is not None:
+            mask &= (self.channel == channel)
+        if asic is not None:
+            mask &= (self.asic == asic)
+        if payloadSize is not None:
+            mask &= (self.size == payloadSize)
+        return np.flatnonzero(mask)
+
+    def countPerChannel(self):
+        """returns a dict with the number of frames of each channel"""
+        channels, counts = np.unique(self.channel, return_counts = True)
+        return dict(zip(channels.tolist(), counts.tolist()))
+
+    def dataSize(self):
+        """returns the size in bytes of the rogue data"""
+        return os.path.getsize(self.filename)
+
+    def summary(self):
+        """returns a text report of the frames per channel, the gaps between frames and the bad regions"""
+        fileSize = self.dataSize()
+        lines = ["%s: %d bytes, %d frames" % (self.filename, fileSize, len(self))]
+        for channel, count in self.countPerChannel().items():
+            sizes = np.unique(self.size[self.channel == channel])
+            lines.append("  channel %d: %d frames, payload sizes %s" % (channel, count, sizes.tolist()))
+        # bytes between the end of a frame and the next header
+        if (len(self) > 1):
+            gaps = (self.offset[1:] - FILE_HEADER_SIZE) - (self.offset[:-1] + self.size[:-1])
+            for frameNumber in np.flatnonzero(gaps).tolist():
+                lines.append("  gap of %d bytes after frame %d" % (gaps[frameNumber], frameNumber))
+        for start, stop in self.badRegions.tolist():
+            lines.append("  bad region at bytes %d to %d (%d bytes)" % (start, stop, stop - start))
+        if (self._scanEnd < fileSize):
+            lines.append("  %d bytes not indexed at the end of the file" % (fileSize - self._scanEnd))
+        return "\n".join(lines)
+
+    def readFrame(self, frameNumber, dtype = 'uint8'):
+        """reads the payload of a single frame (frames are numbered from 0)"""
+        with open(self.filename, mode = 'rb') as f:
+            f.seek(self.offset[frameNumber])
+            return np.fromfile(f, dtype = dtype, count = int(self.size[frameNumber]) // np.dtype(dtype).itemsize)
+
+
+################################################################################
+################################################################################
+#   Memory mapped frame reader class
+#   Returns numpy views into the mapped file, payloads are never copied
+################################################################################
+class MappedFrameReader():
+    """zero copy access to the frames of a rogue .dat file"""
+
+    def __init__(self, filename, index = None, useIndexFile = True):
+        self.filename = filename
+        if index is None:
+            index = FrameIndex(filename, useIndexFile = useIndexFile)
+        self.index = index
+        self._map = None
+        self.remap()
+
+    def __len__(self):
+        return len(self.index)
+
+    def remap(self):
+        """maps the file again, needed after the file has grown"""
+        if (os.path.getsize(self.filename) > 0):
+            self._map = np.memmap(self.filename, dtype='uint8', mode='r')
+        else:
+            self._map = np.zeros(0, dtype='uint8')
+
+    def close(self):
+        self._map = None
+
+    def frame(self, frameNumber, dtype = 'uint16'):
+        """returns a read only view of the payload of a single frame"""
+        dtype = np.dtype(dtype)
+        return np.ndarray(shape = (int(self.index.size[frameNumber]) // dtype.itemsize,), dtype = dtype,
+                          buffer = self._map, offset = int(self.index.offset[frameNumber]))
+
+    def frames(self, frameNumbers, dtype = 'uint16'):
+        """returns a list of views, one for each frame number"""
+        return [self.frame(n, dtype) for n in frameNumbers]
+
+    def frameRun(self, start, stop, dtype = 'uint16'):
+        """returns frames start to stop-1 as a single [frames, words] strided view.
+           The frames must be consecutive in the file and have the same size."""
+        dtype   = np.dtype(dtype)
+        sizes   = self.index.size[start:stop]
+        offsets = self.index.offset[start:stop]
+        if (len(sizes) == 0):
+            return np.zeros((0, 0), dtype = dtype)
+        stride = int(sizes[0]) + FILE_HEADER_SIZE
+        if (np.any(sizes != sizes[0]) or np.any(np.diff(offsets) != stride)):
+            raise ValueError("frames %d to %d are not a contiguous run of equal size frames" % (start, stop - 1))
+        return np.ndarray(shape = (len(sizes), int(sizes[0]) // dtype.itemsize), dtype = dtype,
+                          buffer = self._map, offset = int(offsets[0]), strides = (stride, dtype.itemsize))
+
+    def frameRuns(self, frameNumbers, dtype = 'uint16'):
+        """splits the frame numbers in runs of consecutive, equal size frames.
+           Yields (frame numbers, [frames, words] view) for each run."""
+        frameNumbers = np.asarray(frameNumbers, dtype='int64')
+        if (len(frameNumbers) == 0):
+            return
+        # a run breaks when the frame numbers skip, the payload size changes or a bad region was skipped
+        sizes   = self.index.size[frameNumbers]
+        offsets = self.index.offset[frameNumbers]
+        breaks  = np.flatnonzero((np.diff(frameNumbers) != 1) | (np.diff(sizes) != 0) |
+                                 (np.diff(offsets) != (sizes[:-1] + FILE_HEADER_SIZE))) + 1
+        for run in np.split(frameNumbers, breaks):
+            yield run, self.frameRun(run[0], run[-1] + 1, dtype)
+
+    def headers(self, frameNumbers, numBytes):
+        """returns the first numBytes of each payload as a [frames, numBytes] uint8 array,
+           gathered in one operation. Bytes past the end of a shorter payload are 0."""
+        frameNumbers = np.asarray(frameNumbers, dtype='int64')
+        byteNumbers = np.arange(numBytes)
+        inFrame = byteNumbers[None, :] < self.index.size[frameNumbers][:, None]
+        positions = np.minimum(self.index.offset[frameNumbers][:, None] + byteNumbers, max(0, len(self._map) - 1))
+        return np.where(inFrame, self._map[positions], 0).astype('uint8')
+
+
+################################################################################
+################################################################################
+#   Reader selection by file type
+################################################################################
+def isFrameStore(filename):
+    """True if the file is a compressed frame store instead of a rogue .dat file"""
+    return os.path.splitext(filename)[1].lower() in FRAME_STORE_EXTENSIONS
+
+
+def openFrameIndex(filename, useIndexFile = True):
+    """returns the frame index of a rogue .dat file or of a compressed frame store.
+       useIndexFile = False neither reads nor writes the <file>.idx.npz index file
+       (shared or read only data areas, many small files read once)."""
+    if isFrameStore(filename):
+        import ePixViewer.frameStore as frameStore
+        return frameStore.FrameStoreIndex(filename)
+    return FrameIndex(filename, useIndexFile = useIndexFile)
+
+
+def openFrameReader(filename, useIndexFile = True):
+    """returns a frame reader for a rogue .dat file or a compressed frame store (see openFrameIndex for useIndexFile)"""
+    if isFrameStore(filename):
+        import ePixViewer.frameStore as frameStore
+        return frameStore.FrameStore(filename)
+    return MappedFrameReader(filename, useIndexFile = useIndexFile)
+
+
+################################################################################
+################################################################################
+#   Bulk loader
+################################################################################
+def _copyFrames(reader, frameNumbers, dtype):
+    """copies the frames into a preallocated [frames, words] array, or a list of arrays when the sizes differ"""
+    sizes = reader.index.size[frameNumbers]
+    if (len(frameNumbers) == 0):
+        return np.zeros((0, 0), dtype = dtype)
+    if np.all(sizes == sizes[0]):
+        allFrames = np.empty((len(frameNumbers), int(sizes[0]) // dtype.itemsize), dtype = dtype)
+        row = 0
+        for run, frames in reader.frameRuns(frameNumbers, dtype):
+            allFrames[row:row + len(run)] = frames
+            row = row + len(run)
+        return allFrames
+    return [np.array(frame) for frame in reader.frames(frameNumbers, dtype)]
+
+
+def loadFrames(filename, channel = 1, asic = None, dtype = 'uint32', maxFrames = -1, payloadSize = None, useIndexFile = True):
+    """reads the payloads of all frames of a channel (and ASIC) in a single pass.
+       Returns a preallocated [frames, words] array, or a list of arrays when the
+       selected frames do not all have the same size. maxFrames = -1 reads all frames."""
+    dtype = np.dtype(dtype)
+    reader = openFrameReader(filename, useIndexFile = useIndexFile)
+    frameNumbers = reader.index.select(channel = channel, asic = asic, payloadSize = payloadSize)
+    if (maxFrames >= 0):
+        frameNumbers = frameNumbers[:maxFrames]
+    if (PRINT_VERBOSE): print("loadFrames: reading", len(frameNumbers), "frames of", filename)
+
+    allFrames = _copyFrames(reader, frameNumbers, dtype)
+    reader.close()
+    return allFrames
+
+
+def iterFrames(filename, channel = 1, asic = None, dtype = 'uint8', maxFrames = -1, payloadSize = None, useIndexFile = True):
+    """yields a read only view of each frame payload of a channel (and ASIC).
+       Only the frame being processed is paged in, so the file can be larger than memory."""
+    reader = openFrameReader(filename, useIndexFile = useIndexFile)
+    frameNumbers = reader.index.select(channel = channel, asic = asic, payloadSize = payloadSize)
+    if (maxFrames >= 0):
+        frameNumbers = frameNumbers[:maxFrames]
+    for frameNumber in frameNumbers:
+        yield reader.frame(frameNumber, dtype)
+    reader.close()
+
+
+################################################################################
+################################################################################
+#   Demultiplexer
+################################################################################
+def demuxFrames(filename, dtype = 'uint32', maxFrames = -1, outputRoot = None, useIndexFile = True):
+    """splits the frames of a rogue file by channel, and the image channel by ASIC, in a single
+       pass over the index. Returns a dict keyed by (channel, asic), asic being None for the
+       other channels, holding a [frames, words] array (or a list of arrays when the frame sizes
+       differ). When outputRoot is given each group is instead written in rogue format to
+       <outputRoot>_ch<channel>_asic<asic>.dat (<outputRoot>_ch<channel>.dat for the other
+       channels) and the dict holds the file names. maxFrames = -1 keeps all frames of each group."""
+    dtype = np.dtype(dtype)
+    reader = openFrameReader(filename, useIndexFile = useIndexFile)
+    index = reader.index
+
+    # one key per frame, frames of a group keep their file order after the stable sort
+    keys = index.channel.astype('int64') * 2 + np.where(index.channel == IMAGE_CHANNEL, index.asic, 0)
+    groups, inverse = np.unique(keys, return_inverse = True)
+    order = np.argsort(inverse, kind = 'stable')
+    bounds = np.cumsum(np.bincount(inverse, minlength = len(groups)))
+
+    demuxed = {}
+    start = 0
+    for group, stop in zip(groups.tolist(), bounds.tolist()):
+        frameNumbers = order[start:stop]
+        start = stop
+        if (maxFrames >= 0):
+            frameNumbers = frameNumbers[:maxFrames]
+        key = (group // 2, group % 2) if (group // 2 == IMAGE_CHANNEL) else (group // 2, None)
+        if (PRINT_VERBOSE): print("demuxFrames: channel", key[0], "ASIC", key[1], ",", len(frameNumbers), "frames")
+
+        if outputRoot is not None:
+            if key[1] is None:
+                outFilename = "%s_ch%d.dat" % (outputRoot, key[0])
+            else:
+                outFilename = "%s_ch%d_asic%d.dat" % (outputRoot, key[0], key[1])
+            with open(outFilename, mode = 'wb') as f:
+                if isinstance(reader, MappedFrameReader):
+                    # consecutive frames are copied with their headers as a single block
+                    for run, frames in reader.frameRuns(frameNumbers, 'uint8'):
+                        first = int(index.offset[run[0]]) - FILE_HEADER_SIZE
+                        last  = int(index.offset[run[-1]] + index.size[run[-1]])
+                        f.write(reader._map[first:last])
+                else:
+                    # frame stores keep header dword 1, dword 0 is rebuilt from the size
+                    for frameNumber in frameNumbers:
+                        f.write(struct.pack('<II', int(index.size[frameNumber]) + 4, int(index.flags[frameNumber])))
+                        f.write(reader.frame(frameNumber, 'uint8').tobytes())
+            demuxed[key] = outFilename
+            continue
+
+        demuxed[key] = _copyFrames(reader, frameNumbers, dtype)
+    reader.close()
+    return demuxed
+
+
+################################################################################
+################################################################################
+#   File follower class
+#   Reads a rogue file while the data writer is still filling it
+################################################################################
+class FrameFollower():
+    """yields the complete frames of a growing rogue .dat file as they are written.
+       The file is only read, so the follower can run in any process."""
+
+    def __init__(self, filename, channel = 1, asic = None, dtype = 'uint8', pollInterval = FOLLOW_POLL_INTERVAL,
+                 readAhead = FOLLOW_READ_AHEAD, idleTimeout = None, fromStart = True, useInotify = True):
+        self.filename     = filename
+        self.channel      = channel
+        self.asic         = asic
+        self.dtype        = dtype
+        self.pollInterval = pollInterval
+        # maximum number of frames indexed beyond the last frame handed out
+        self.readAhead    = readAhead
+        # seconds without new frames before the iteration ends, None follows forever
+        self.idleTimeout  = idleTimeout
+        self.fromStart    = fromStart
+        self._stop        = False
+        self._inotify     = None
+        self._useInotify  = useInotify and (INotify is not None)
+        self.index        = None
+        self.reader       = None
+
+    def _open(self):
+        """waits for the file to exist and opens it, returns False if stopped or idle before that"""
+        lastActivity = time.time()
+        while not os.path.isfile(self.filename):
+            if self._stop or self._idle(lastActivity):
+                return False
+            time.sleep(self.pollInterval)
+        # the index file would be out of date at the next write
+        self.index  = FrameIndex(self.filename, useIndexFile = False, maxFrames = self.readAhead if self.fromStart else None, growing = True)
+        self.reader = MappedFrameReader(self.filename, index = self.index)
+        if self._useInotify:
+            self._inotify = INotify()
+            self._inotify.add_watch(self.filename, inotifyFlags.MODIFY)
+        return True
+
+    def _idle(self, lastActivity):
+        return (self.idleTimeout is not None) and ((time.time() - lastActivity) > self.idleTimeout)
+
+    def _wait(self):
+        """sleeps until the file is modified (inotify) or for one poll interval"""
+        if self._inotify is not None:
+            self._inotify.read(timeout = int(self.pollInterval * 1000))
+        else:
+            time.sleep(self.pollInterval)
+
+    def poll(self):
+        """indexes the frames written since the last call, returns the number of new frames"""
+        if (os.path.getsize(self.filename) < self.index._scanEnd):
+            raise ValueError("%s is shorter than the indexed data, was it rewritten?" % self.filename)
+        newFrames = self.index.update(maxFrames = self.readAhead)
+        if (newFrames > 0):
+            self.reader.remap()
+        return newFrames
+
+    def stop(self):
+        """ends the iteration at the next poll (can be called from another thread)"""
+        self._stop = True
+
+    def close(self):
+        if self._inotify is not None:
+            self._inotify.close()
+            self._inotify = None
+        if self.reader is not None:
+            self.reader.close()
+
+    def __iter__(self):
+        if not self._open():
+            return
+        nextFrame = 0 if self.fromStart else len(self.index)
+        lastActivity = time.time()
+        try:
+            while True:
+                if (nextFrame < len(self.index)):
+                    # hands out the indexed frames, all of them are complete
+                    stop = len(self.index)
+                    frameNumbers = np.arange(nextFrame, stop)
+                    mask = np.ones(len(frameNumbers), dtype=bool)
+                    if self.channel is not None:
+                        mask &= (self.index.channel[nextFrame:stop] == self.channel)
+                    if self.asic is not None:
+                        mask &= (self.index.asic[nextFrame:stop] == self.asic)
+                    for frameNumber in frameNumbers[mask]:
+                        yield self.reader.frame(frameNumber, self.dtype)
+                    nextFrame = stop
+                    lastActivity = time.time()
+                if self._stop:
+                    return
+                if (self.poll() == 0):
+                    if self._idle(lastActivity):
+                        if (PRINT_VERBOSE): print("FrameFollower: no new frame in", self.idleTimeout, "s, stopping")
+                        return
+                    self._wait()
+        finally:
+            self.close()
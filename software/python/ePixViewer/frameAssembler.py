@@ -0,0 +1,158 @@
+#!/usr/bin/env python
+#-----------------------------------------------------------------------------
+# Title      : multi acquisition frame assembler
+#-----------------------------------------------------------------------------
+# File       : frameAssembler.py
+# Created    : 2026-10-18
+# Last update: 2026-10-18
+#-----------------------------------------------------------------------------
+# Description:
+# Rebuilds the Tixel48x48 and Cpix2 images from their four packets (ASIC 0/1,
+# time over threshold/time of arrival). Packets are matched by acquisition
+# number, so several acquisitions can be in flight and their packets can
+# arrive interleaved or out of order. Each acquisition is filled in a
+# preallocated slot; the slots that do not complete within a number of
+# packets are dropped. The timeout is counted in packets, not in seconds, so
+# the replay of a file gives the same images on any host.
+#
+# A slot holds a [4, 1156] array: dword 0 of each trace is the valid flag
+# followed by the 1155 packet dwords.
+#
+#-----------------------------------------------------------------------------
+# This file is part of the ePix rogue. It is subject to
+# the license terms in the LICENSE.txt file found in the top-level directory
+# of this distribution and at:
+#    https://confluence.slac.stanford.edu/display/ppareg/LICENSE.html.
+# No part of the ePix rogue, including this file, may be
+# copied, modified, propagated, or distributed except according to the terms
+# contained in the LICENSE.txt file.
+#-----------------------------------------------------------------------------
+
+import numpy as np
+
+PRINT_VERBOSE = 0
+
+# number of dwords of a Tixel48x48/Cpix2 packet
+PACKET_DWORDS = 1155
+# number of packets (traces) of an image
+NUM_TRACES = 4
+# acquisitions assembled at the same time
+DEFAULT_SLOTS = 8
+# packets received after the first packet of an acquisition before it is dropped if incomplete
+DEFAULT_TIMEOUT = 64
+# completed acquisitions remembered to drop their late duplicate packets
+COMPLETED_HISTORY = 64
+
+
+################################################################################
+################################################################################
+#   Frame assembler class
+################################################################################
+class FrameAssembler():
+    """assembles four packet images keyed by acquisition number.
+       timeout is the number of packets after which an incomplete acquisition
+       is dropped (None keeps it until its slot is needed)."""
+
+    def __init__(self, numSlots = DEFAULT_SLOTS, timeout = DEFAULT_TIMEOUT, packetDwords = PACKET_DWORDS):
+        self.numSlots = numSlots
+        self.timeout = timeout
+        self.packetDwords = packetDwords
+        # preallocated slots, [4, 1156] image data of each acquisition
+        self._slots = np.zeros((numSlots, NUM_TRACES, packetDwords + 1), dtype='uint32')
+        self._acqNum = np.full(numSlots, -1, dtype='int64')
+        self._startPacket = np.zeros(numSlots, dtype='int64')
+        # ring of the last completed acquisition numbers
+        self._completed = np.full(COMPLETED_HISTORY, -1, dtype='int64')
+        # slot filled first is reused first when no slot is free
+        self._order = []
+        self.reset()
+
+    def reset(self):
+        """drops all acquisitions in flight and clears the counters"""
+        self._slots[:, :, 0] = 0
+        self._acqNum[:] = -1
+        self._order = []
+        self._completed[:] = -1
+        self._numPackets = 0
+        self.completedImages = 0
+        self.droppedImages   = 0
+        self.droppedPackets  = 0
+
+    def stats(self):
+        """returns the counters and the number of acquisitions in flight"""
+        return {'completedImages': self.completedImages, 'droppedImages': self.droppedImages,
+                'droppedPackets': self.droppedPackets, 'inFlight': len(self._order)}
+
+    def _free(self, slot):
+        self._slots[slot, :, 0] = 0
+        self._acqNum[slot] = -1
+        self._order.remove(slot)
+
+    def expire(self):
+        """drops the acquisitions older than timeout packets, returns how many were dropped"""
+        if self.timeout is None:
+            return 0
+        expired = [slot for slot in self._order if (self._numPackets - self._startPacket[slot]) > self.timeout]
+        for slot in expired:
+            if (PRINT_VERBOSE): print('FrameAssembler: acquisition', self._acqNum[slot], 'expired')
+            self._free(slot)
+        self.droppedImages = self.droppedImages + len(expired)
+        return len(expired)
+
+    def _slotFor(self, acqNum):
+        """returns the slot of an acquisition, taking a free or the oldest slot for a new one"""
+        found = np.flatnonzero(self._acqNum == acqNum)
+        if (len(found) > 0):
+            return found[0]
+        if (len(self._order) == self.numSlots):
+            # no free slot, the oldest acquisition is dropped
+            if (PRINT_VERBOSE): print('FrameAssembler: acquisition', self._acqNum[self._order[0]], 'dropped, no free slot')
+            self._free(self._order[0])
+            self.droppedImages = self.droppedImages + 1
+        slot = np.flatnonzero(self._acqNum < 0)[0]
+        self._acqNum[slot] = acqNum
+        self._startPacket[slot] = self._numPackets
+        self._order.append(slot)
+        return slot
+
+    def addPacket(self, newRawData):
+        """adds a packet, returns the [4, 1156] image data when its acquisition
+           is complete and None otherwise"""
+        self._numPackets = self._numPackets + 1
+        self.expire()
+        newRawData_8 = np.frombuffer(newRawData, dtype='uint8')
+        if (len(newRawData_8) != 4*self.packetDwords):
+            if (PRINT_VERBOSE): print('FrameAssembler: packet size error, packet len: ', len(newRawData_8))
+            self.droppedPackets = self.droppedPackets + 1
+            return None
+        newRawData_DW = newRawData_8.view('uint32')
+                                                                  # header dword 0 (VC info)
+        acqNum  = int(newRawData_DW[1])                           # header dword 1
+        isTOA   = (int(newRawData_DW[2]) & 0x8) >> 3              # header dword 2
+        asicNum =  int(newRawData_DW[2]) & 0x7                    # header dword 2
+        if (asicNum > 1):
+            self.droppedPackets = self.droppedPackets + 1
+            return None
+        if np.any(self._completed == acqNum):
+            # late duplicate of an acquisition already returned, it must not open a new slot
+            self.droppedPackets = self.droppedPackets + 1
+            return None
+        # trace order: asic 0 TOT, asic 1 TOT, asic 0 TOA, asic 1 TOA
+        trace = asicNum + 2*isTOA
+
+        slot = self._slotFor(acqNum)
+        if (self._slots[slot, trace, 0] == 1):
+            # the same packet twice, the first one is kept
+            self.droppedPackets = self.droppedPackets + 1
+            return None
+        self._slots[slot, trace, 1:] = newRawData_DW
+        self._slots[slot, trace, 0] = 1
+
+        if not np.all(self._slots[slot, :, 0] == 1):
+            return None
+        # the image is copied out so the slot can be reused right away
+        image = self._slots[slot].copy()
+        self._free(slot)
+        self._completed[self.completedImages % COMPLETED_HISTORY] = acqNum
+        self.completedImages = self.completedImages + 1
+        return image
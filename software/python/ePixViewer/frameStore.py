@@ -0,0 +1,217 @@
+#!/usr/bin/env python
+#-----------------------------------------------------------------------------
+# Title      : compressed frame store
+#-----------------------------------------------------------------------------
+# File       : frameStore.py
+# Created    : 2026-10-18
+# Last update: 2026-10-18
+#-----------------------------------------------------------------------------
+# Description:
+# Lossless compressed copy of a rogue .dat file in HDF5. Frames of the same
+# payload size are stored in one dataset with one frame per chunk, so any
+# frame can be read by decompressing a single chunk. The shuffle filter in
+# front of lzf/gzip groups the unused upper bits of the 12/14 bit ADC
+# samples, which is where most of the compression comes from.
+#
+# Layout of the file:
+#   /frames/<payload size>  [frames, words] payloads, shuffle + lzf/gzip
+#   /flags                  rogue header dword 1 of every frame
+#   /offset, /size, /channel, /asic, /badRegions
+#                           dataReader.FrameIndex of the original file
+#   /group, /row            payload dataset and row of every frame
+#
+#-----------------------------------------------------------------------------
+# This file is part of the ePix rogue. It is subject to
+# the license terms in the LICENSE.txt file found in the top-level directory
+# of this distribution and at:
+#    https://confluence.slac.stanford.edu/display/ppareg/LICENSE.html.
+# No part of the ePix rogue, including this file, may be
+# copied, modified, propagated, or distributed except according to the terms
+# contained in the LICENSE.txt file.
+#-----------------------------------------------------------------------------
+
+import os
+import numpy as np
+import ePixViewer.dataReader as dataReader
+
+PRINT_VERBOSE = 0
+
+FRAME_STORE_VERSION = 2
+# number of frames gathered in memory before they are written to the store
+CONVERT_BLOCK_FRAMES = 1024
+
+
+def convertToFrameStore(filename, storeFilename = None, compression = 'lzf', compressionLevel = 4):
+    """writes a compressed copy of a rogue .dat file, returns the name of the store file.
+       compression is 'lzf' (fast) or 'gzip' (smaller, compressionLevel 1 to 9)."""
+    import h5py
+    if storeFilename is None:
+        storeFilename = os.path.splitext(filename)[0] + '.h5'
+    reader = dataReader.MappedFrameReader(filename)
+    index = reader.index
+    numFrames = len(index)
+
+    # dword 1 of each header sits just before the payload
+    headerBytes = reader._map[(index.offset - 4)[:, None] + np.arange(4)]
+    flags = np.ascontiguousarray(headerBytes).view('<u4').reshape(-1)
+
+    sizes, group = np.unique(index.size, return_inverse = True)
+    row = np.zeros(numFrames, dtype = 'int64')
+
+    f = h5py.File(storeFilename, 'w')
+    f.attrs['version']    = FRAME_STORE_VERSION
+    f.attrs['sourceFile'] = os.path.abspath(filename)
+    f.attrs['sourceSize'] = os.path.getsize(filename)
+    f.attrs['scanEnd']    = index._scanEnd
+    frames = f.create_group('frames')
+    for g, size in enumerate(sizes.tolist()):
+        frameNumbers = np.flatnonzero(group == g)
+        row[frameNumbers] = np.arange(len(frameNumbers))
+        # 16 bit words let the shuffle filter separate the sample bytes
+        dtype = np.dtype('uint16') if (size % 2 == 0) else np.dtype('uint8')
+        words = size // dtype.itemsize
+        options = {}
+        if (words > 0):
+            options = dict(chunks = (1, words), shuffle = True, compression = compression)
+            if (compression == 'gzip'):
+                options['compression_opts'] = compressionLevel
+        dataset = frames.create_dataset(str(size), shape = (len(frameNumbers), words), dtype = dtype, **options)
+        for start in range(0, len(frameNumbers), CONVERT_BLOCK_FRAMES):
+            block = frameNumbers[start:start + CONVERT_BLOCK_FRAMES]
+            dataset[start:start + len(block)] = dataReader._copyFrames(reader, block, dtype)
+        if (PRINT_VERBOSE): print("convertToFrameStore:", len(frameNumbers), "frames of", size, "bytes")
+
+    f['flags']   = flags
+    f['offset']  = index.offset
+    f['size']    = index.size
+    f['channel'] = index.channel
+    f['asic']    = index.asic
+    f['group']   = group.astype('uint16')
+    f['row']     = row
+    f['sizes']   = sizes
+    f['badRegions'] = index.badRegions
+    f.close()
+    reader.close()
+    return storeFilename
+
+
+################################################################################
+################################################################################
+#   Frame store index class
+#   Same interface as dataReader.FrameIndex, read from the store
+################################################################################
+class FrameStoreIndex(dataReader.FrameIndex):
+    """index of the frames held in a frame store"""
+
+    def __init__(self, filename, store = None):
+        self.filename = filename
+        self.useIndexFile = False
+        if store is None:
+            store = FrameStore(filename, index = self)
+        self.store = store
+        f = store._file
+        # offsets and bad regions refer to the original .dat file
+        self.offset  = f['offset'][:]
+        self.size    = f['size'][:]
+        self.channel = f['channel'][:]
+        self.asic    = f['asic'][:]
+        self.flags   = f['flags'][:]
+        self.group   = f['group'][:]
+        self.row     = f['row'][:]
+        self.badRegions = f['badRegions'][:]
+        self.validChannels = None
+        self.sizeAlignment = None
+        self.growing       = False
+        self._scanEnd   = int(f.attrs['scanEnd'])
+        self._dataSize  = int(f.attrs['sourceSize'])
+
+    def update(self):
+        # a store does not grow
+        return 0
+
+    def save(self):
+        return False
+
+    def dataSize(self):
+        """returns the size in bytes of the original rogue data"""
+        return self._dataSize
+
+    def load(self):
+        return False
+
+    def readFrame(self, frameNumber, dtype = 'uint8'):
+        """reads the payload of a single frame (frames are numbered from 0)"""
+        return self.store.frame(frameNumber, dtype)
+
+
+################################################################################
+################################################################################
+#   Frame store reader class
+#   Same interface as dataReader.MappedFrameReader
+################################################################################
+class FrameStore():
+    """random access to the frames of a compressed frame store"""
+
+    def __init__(self, filename, index = None):
+        import h5py
+        self.filename = filename
+        self._file = h5py.File(filename, 'r')
+        if (self._file.attrs.get('version') != FRAME_STORE_VERSION):
+            self._file.close()
+            raise ValueError("%s is not a version %d frame store, convert the .dat file again" % (filename, FRAME_STORE_VERSION))
+        sizes = self._file['sizes'][:]
+        self._datasets = [self._file['frames'][str(size)] for size in sizes.tolist()]
+        if index is None:
+            index = FrameStoreIndex(filename, store = self)
+        self.index = index
+
+    def __len__(self):
+        return len(self.index)
+
+    def remap(self):
+        pass
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _asDtype(self, data, dtype):
+        """reinterprets [..., words] payloads as dtype, dropping incomplete words like the mapped reader"""
+        data = data.view('uint8')
+        itemsize = np.dtype(dtype).itemsize
+        return data[..., :(data.shape[-1] // itemsize) * itemsize].view(dtype)
+
+    def frame(self, frameNumber, dtype = 'uint16'):
+        """returns the payload of a single frame, only its chunk is decompressed"""
+        dataset = self._datasets[self.index.group[frameNumber]]
+        return self._asDtype(dataset[int(self.index.row[frameNumber])], dtype)
+
+    def frames(self, frameNumbers, dtype = 'uint16'):
+        """returns a list of arrays, one for each frame number"""
+        return [self.frame(n, dtype) for n in frameNumbers]
+
+    def frameRuns(self, frameNumbers, dtype = 'uint16'):
+        """splits the frame numbers in runs stored in consecutive rows of one dataset.
+           Yields (frame numbers, [frames, words] array) for each run."""
+        frameNumbers = np.asarray(frameNumbers, dtype='int64')
+        if (len(frameNumbers) == 0):
+            return
+        groups = self.index.group[frameNumbers]
+        rows   = self.index.row[frameNumbers]
+        breaks = np.flatnonzero((np.diff(rows) != 1) | (np.diff(groups) != 0)) + 1
+        for run in np.split(np.arange(len(frameNumbers)), breaks):
+            dataset = self._datasets[groups[run[0]]]
+            yield frameNumbers[run], self._asDtype(dataset[int(rows[run[0]]):int(rows[run[-1]]) + 1], dtype)
+
+    def headers(self, frameNumbers, numBytes):
+        """returns the first numBytes of each payload as a [frames, numBytes] uint8 array.
+           Bytes past the end of a shorter payload are 0."""
+        headerBytes = np.zeros((len(frameNumbers), numBytes), dtype='uint8')
+        row = 0
+        for run, frames in self.frameRuns(frameNumbers, 'uint8'):
+            # whole chunks are decompressed, only their first bytes are kept
+            n = min(numBytes, frames.shape[1])
+            headerBytes[row:row + len(run), :n] = frames[:, :n]
+            row = row + len(run)
+        return headerBytes
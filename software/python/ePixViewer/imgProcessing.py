@@ -24,23 +24,20 @@
 
 import sys
 import os
-import rogue.utilities
-import rogue.utilities.fileio
-import rogue.interfaces.stream
-import pyrogue    
+#import rogue.utilities
+#import rogue.utilities.fileio
+#import rogue.interfaces.stream
+#import pyrogue    
 import time
 import numpy as np
 
-try:
-    from PyQt5.QtWidgets import *
-    from PyQt5.QtCore    import *
-    from PyQt5.QtGui     import *
-except ImportError:
-    from PyQt4.QtCore    import *
-    from PyQt4.QtGui     import *
-
 PRINT_VERBOSE = 0
 
+# largest block whose common mode median is computed by sorting
+SORT_MEDIAN_SIZE = 128
+# float64 temporaries of a PedestalEstimator batch update are bounded to about this size
+PEDESTAL_SLICE_BYTES = 32*1024*1024
+
 ################################################################################
 ################################################################################
 #   Image processing class
@@ -61,14 +58,18 @@ class ImageProcessing():
     numDarkImages = 10
     numSavedDarkImg = 0
     imgDark = np.array([],dtype='uint16')
-    _imgDarkSet = np.array([],dtype='uint16')
     imgDark_isSet = False
     imgDark_isRequested = False
+    # weight of the newest frame in the running dark image (0: plain average, see PedestalEstimator),
+    # used by the next setDarkImg
+    darkForgetting = 0.0
 
 
     def __init__(self, parent) :
         # pointer to the parent class        
         self.parent = parent
+        # dark image converted to other dtypes (see getDarkImg)
+        self._imgDarkCast = {}
         # init compound variables
         self.calcImgWidth()
         # creates the placehold for the dark images to be stored
@@ -78,31 +79,59 @@ class ImageProcessing():
         self.imgWidth = self.imgNumAsicsPerSide * self.imgNumAdcChPerAsic * self.imgNumColPerAdcCh      
 
     def createDarkImageSet(self):
-        self._imgDarkSet = np.zeros([self.numDarkImages,self.imgHeight,self.imgWidth],dtype='uint16')
+        """the dark frames are accumulated in a running estimator, not stored"""
+        self.darkEstimator = PedestalEstimator(forgetting = self.darkForgetting)
 
     def setDarkImg(self, rawData):
-        """performs the ePix100A image descrambling"""
+        """adds a frame to the dark image, the dark image is set after numDarkImages frames"""
         #init variable that tells dark image was requested
         if (self.numSavedDarkImg == 0):
             self.createDarkImageSet()
             self.imgDark_isRequested = True
-        # save the set
-        self._imgDarkSet[self.numSavedDarkImg,:,:] = np.array(rawData,dtype='uint16')
+        # running pedestal and noise, memory does not depend on numDarkImages
+        self.darkEstimator.update(rawData)
         self.numSavedDarkImg = self.numSavedDarkImg + 1
         #checks for end condition
         if (self.numSavedDarkImg == self.numDarkImages):
-            self.imgDark = np.average(self._imgDarkSet,axis=0)
+            self._copyDarkImg()
             self.imgDark_isSet = True
             self.imgDark_isRequested = False
             self.numSavedDarkImg = 0
             print("Dark image set.")
 
+    def updateDarkImg(self, rawData):
+        """adds one more dark frame once the dark image is set, with darkForgetting > 0
+           the dark image follows slow drifts (e.g. temperature)"""
+        if (not self.imgDark_isSet) or (np.shape(rawData) != self.imgDark.shape):
+            return
+        self.darkEstimator.update(rawData)
+        self._copyDarkImg()
+
+    def _copyDarkImg(self):
+        # copies so the dark image does not change under the images already subtracted
+        self.imgDark = self.darkEstimator.pedestal().copy()
+        self._imgDarkCast = {}
+
     def unsetDarkImg(self):
         """performs the ePix100A image descrambling"""
         self.imgDark_isSet = False
 
-    def getDarkSubtractedImg(self, rawImg):
-        return rawImg - self.imgDark
+    def getDarkRms(self):
+        """returns the per pixel noise (standard deviation) of the dark frames, None before the first one"""
+        return self.darkEstimator.rms()
+
+    def getDarkImg(self, dtype = np.float64):
+        """returns the dark image converted to dtype, the conversion is done once per dark image"""
+        dtype = np.dtype(dtype)
+        if (dtype == self.imgDark.dtype):
+            return self.imgDark
+        if dtype not in self._imgDarkCast:
+            self._imgDarkCast[dtype] = self.imgDark.astype(dtype)
+        return self._imgDarkCast[dtype]
+
+    def getDarkSubtractedImg(self, rawImg, out = None):
+        """subtracts the dark image, the result is written to out when given"""
+        return np.subtract(rawImg, self.imgDark, out = out)
 
     def reScaleImgTo8bit(self, rawImage, scaleMax=20000, scaleMin=-200):
         #init
@@ -118,7 +147,336 @@ class ImageProcessing():
         #return results
         return image8b
 
+    def subtractPedestal(self, image, pedestal = None, gain = None, out = None, dtype = np.float64):
+        """(image - pedestal) * gain written to out (a new dtype array if out is None).
+           The conversion to dtype is done by the subtraction itself, no temporary copies."""
+        if out is None:
+            out = np.empty(np.shape(image), dtype = dtype)
+        if pedestal is None:
+            np.copyto(out, image, casting = 'unsafe')
+        else:
+            np.subtract(image, pedestal, out = out)
+        if gain is not None:
+            np.multiply(out, gain, out = out)
+        return out
+
     """Uses the bitwise and function to apply a bit mask into the descrabled image"""
-    def applyBitMask(self, image, mask = 0xFFFF):
-        return np.bitwise_and(image, mask)
+    def applyBitMask(self, image, mask = 0xFFFF, out = None):
+        if out is None:
+            return np.bitwise_and(image, mask)
+        # out can be of another dtype, as in subtractPedestal
+        return np.bitwise_and(image, mask, out = out, casting = 'unsafe')
+
+
+################################################################################
+################################################################################
+#   Pedestal estimator class
+#   Running per pixel mean and variance of a sequence of frames
+################################################################################
+class PedestalEstimator():
+    """per pixel mean (pedestal) and variance updated in place, one frame or
+       batch at a time, in constant memory (Welford).
+       With forgetting = 0 all frames have the same weight. With 0 < forgetting < 1
+       the newest frame has weight forgetting (exponential moving mean and
+       variance) once more than 1/forgetting frames were added, so the
+       estimates follow slow drifts."""
+
+    def __init__(self, shape = None, forgetting = 0.0):
+        self.forgetting = forgetting
+        self.reset(shape)
+
+    def reset(self, shape = None):
+        """clears the estimates, the shape is taken from the first frame when None"""
+        self.count = 0
+        self._mean = None
+        self._var  = None
+        if shape is not None:
+            self._allocate(tuple(shape))
+
+    def _allocate(self, shape):
+        self._mean  = np.zeros(shape, dtype = np.float64)
+        self._var   = np.zeros(shape, dtype = np.float64)
+        # scratch arrays so an update does not allocate
+        self._delta = np.empty(shape, dtype = np.float64)
+        self._step  = np.empty(shape, dtype = np.float64)
+
+    def _weight(self, count):
+        """weight of the newest frame, 1/count is the plain running average"""
+        weight = 1.0 / count
+        if (self.forgetting > 0):
+            weight = max(weight, self.forgetting)
+        return weight
+
+    def update(self, image):
+        """adds one frame"""
+        if self._mean is None:
+            self._allocate(np.shape(image))
+        self.count = self.count + 1
+        weight = self._weight(self.count)
+        # mean += w*delta, var = (1-w)*(var + w*delta^2)
+        np.subtract(image, self._mean, out = self._delta)
+        np.multiply(self._delta, weight, out = self._step)
+        self._mean += self._step
+        self._step *= self._delta
+        self._var += self._step
+        self._var *= (1.0 - weight)
+
+    def updateBatch(self, batch):
+        """adds a [frames, ...] stack of frames. The stack is reduced a slice of frames at
+           a time, so the float64 temporaries stay below PEDESTAL_SLICE_BYTES whatever the batch size."""
+        n = len(batch)
+        if (n == 0):
+            return
+        if (self.forgetting > 0):
+            # the frame weights depend on the order, frame by frame
+            for image in batch:
+                self.update(image)
+            return
+        if self._mean is None:
+            self._allocate(np.shape(batch)[1:])
+        size = max(1, PEDESTAL_SLICE_BYTES // (8 * max(1, self._mean.size)))
+        for start in range(0, n, size):
+            part = batch[start:start + size]
+            self._combine(np.mean(part, axis = 0, dtype = np.float64), np.var(part, axis = 0, dtype = np.float64), len(part))
+
+    def merge(self, other):
+        """adds the frames of another estimator (e.g. of another file or process), returns self.
+           Only estimators without forgetting can be merged."""
+        if (self.forgetting > 0) or (other.forgetting > 0):
+            raise ValueError("PedestalEstimator: estimators with forgetting cannot be merged")
+        if (other.count == 0):
+            return self
+        if self._mean is None:
+            self._allocate(other._mean.shape)
+        if (other._mean.shape != self._mean.shape):
+            raise ValueError("PedestalEstimator: cannot merge " + str(other._mean.shape) + " and " + str(self._mean.shape) + " frames")
+        self._combine(other._mean, other._var, other.count)
+        return self
+
+    def _combine(self, mean, var, n):
+        """parallel variance algorithm: merges the mean and variance of n frames with the frames already added"""
+        total = self.count + n
+        np.subtract(mean, self._mean, out = self._delta)
+        self._var *= (self.count / total)
+        self._var += var * (n / total)
+        self._var += np.square(self._delta) * (self.count * n / total / total)
+        self._mean += self._delta * (n / total)
+        self.count = total
+
+    def pedestal(self):
+        """per pixel mean, updated in place by the following frames"""
+        return self._mean
+
+    def variance(self):
+        return self._var
+
+    def rms(self):
+        """per pixel standard deviation (noise map)"""
+        return None if self._var is None else np.sqrt(self._var)
+
+
+################################################################################
+################################################################################
+#   Histogram accumulator class
+#   Per channel code histograms filled batch by batch
+################################################################################
+class HistogramAccumulator():
+    """integer [channels, numCodes] histogram table updated with one offset
+       np.bincount per batch. Bin k of channel c counts the values in
+       [minCode + k*binWidth, minCode + (k+1)*binWidth); minCode can be a scalar
+       or one value per channel. channelAxis is the channel axis of the data
+       given to update (-2 for [..., channels, samples] cryo stacks). Values
+       outside the range are counted in underflow and overflow.
+       Accumulators of the same geometry filled by parallel workers are combined
+       with merge."""
+
+    def __init__(self, numChannels, numCodes = 65536, minCode = 0, binWidth = 1, channelAxis = -2):
+        self.numChannels = numChannels
+        self.numCodes = numCodes
+        self.minCode = np.asarray(minCode)
+        self.binWidth = binWidth
+        self.channelAxis = channelAxis
+        self.reset()
+
+    def reset(self):
+        self.counts    = np.zeros((self.numChannels, self.numCodes), dtype = 'int64')
+        self.underflow = np.zeros(self.numChannels, dtype = 'int64')
+        self.overflow  = np.zeros(self.numChannels, dtype = 'int64')
+
+    def _channelShape(self, ndim):
+        """shape that broadcasts a per channel array along the channel axis of ndim data"""
+        shape = [1] * ndim
+        shape[self.channelAxis] = self.numChannels
+        return shape
+
+    def _bins(self, data):
+        """bin number of each value"""
+        minCode = self.minCode.reshape(self._channelShape(data.ndim)) if self.minCode.ndim else self.minCode
+        if (data.dtype.kind in 'ui') and (self.binWidth == 1) and (self.minCode.dtype.kind in 'ui'):
+            # integer codes, no rounding
+            return np.subtract(data, minCode, dtype = 'int64')
+        return np.floor((data - minCode) / self.binWidth).astype('int64')
+
+    def update(self, data):
+        """adds all values of a batch, channels along channelAxis"""
+        data = np.asarray(data)
+        if (data.size == 0):
+            return
+        if (data.shape[self.channelAxis] != self.numChannels):
+            raise ValueError("HistogramAccumulator: " + str(data.shape[self.channelAxis]) + " channels, expected " + str(self.numChannels))
+        index = self._bins(data)
+        otherAxes = tuple(axis for axis in range(data.ndim) if axis != (self.channelAxis % data.ndim))
+        if (index.min() < 0) or (index.max() >= self.numCodes):
+            below = index < 0
+            above = index >= self.numCodes
+            self.underflow += np.count_nonzero(below, axis = otherAxes)
+            self.overflow  += np.count_nonzero(above, axis = otherAxes)
+            inRange = ~(below | above)
+        else:
+            inRange = None
+        # bin of channel c is shifted to row c of the flattened table
+        index += (np.arange(self.numChannels, dtype = 'int64') * self.numCodes).reshape(self._channelShape(data.ndim))
+        index = index.ravel() if inRange is None else index[inRange]
+        self.counts += np.bincount(index, minlength = self.counts.size).reshape(self.counts.shape)
+
+    def merge(self, other):
+        """adds the counts of another accumulator with the same bins, returns self"""
+        if (other.counts.shape != self.counts.shape) or np.any(other.minCode != self.minCode) or (other.binWidth != self.binWidth):
+            raise ValueError("HistogramAccumulator: cannot merge histograms with different bins")
+        self.counts    += other.counts
+        self.underflow += other.underflow
+        self.overflow  += other.overflow
+        return self
+
+    def binEdges(self):
+        """[channels, numCodes + 1] bin edges (a single row when minCode is a scalar)"""
+        minCode = self.minCode.reshape(-1, 1) if self.minCode.ndim else self.minCode.reshape(1, 1)
+        return minCode + self.binWidth * np.arange(self.numCodes + 1)
+
+    def entries(self):
+        """number of values of each channel inside the range"""
+        return self.counts.sum(axis = 1)
+
+    def mean(self):
+        """mean of each channel from the bin centers"""
+        centers = self.binEdges()[:, :-1] + 0.5 * self.binWidth
+        entries = self.entries()
+        return (self.counts * centers).sum(axis = 1) / np.maximum(entries, 1)
+
+
+################################################################################
+################################################################################
+#   Common mode correction class
+#   Removes the baseline shift shared by the pixels read by the same ADC
+################################################################################
+class CommonModeCorrection():
+    """subtracts the common mode of blocks of pixels from [rows, cols] images or
+       [images, rows, cols] stacks, all blocks of all images at once.
+       blockShape is the (rows, cols) size of a block, None for the whole axis.
+       The statistic of each block is one of
+         'median'     median of the block
+         'mean'       mean of the block
+         'maskedMean' mean of the pixels below hitThreshold, so pixels with a
+                      signal do not shift the baseline (0 when all are hits)
+       The images are expected to be pedestal subtracted."""
+
+    methods = ['median', 'mean', 'maskedMean']
+
+    def __init__(self, blockShape, method = 'median', hitThreshold = None):
+        if method not in self.methods:
+            raise ValueError("CommonModeCorrection: unknown method " + str(method))
+        if (method == 'maskedMean') and (hitThreshold is None):
+            raise ValueError("CommonModeCorrection: maskedMean needs a hitThreshold")
+        self.blockShape = tuple(blockShape)
+        self.method = method
+        self.hitThreshold = hitThreshold
+
+    def _blocks(self, images):
+        """[images, row blocks, block rows, col blocks, block cols] view of an image stack"""
+        numImages, rows, cols = images.shape
+        blockRows = rows if self.blockShape[0] is None else self.blockShape[0]
+        blockCols = cols if self.blockShape[1] is None else self.blockShape[1]
+        if (rows % blockRows) or (cols % blockCols):
+            raise ValueError("CommonModeCorrection: image shape " + str((rows, cols)) + " is not a multiple of the block " + str((blockRows, blockCols)))
+        return images.reshape(numImages, rows // blockRows, blockRows, cols // blockCols, blockCols)
+
+    def commonMode(self, images):
+        """returns the common mode of each block, [images, row blocks, 1, col blocks, 1]"""
+        images = np.asarray(images)
+        blocks = self._blocks(images if images.ndim == 3 else images[None])
+        if (self.method == 'median'):
+            return self._median(blocks)
+        if (self.method == 'mean'):
+            return np.mean(blocks, axis = (2, 4), keepdims = True, dtype = np.float64)
+        keep = blocks < self.hitThreshold
+        total = np.sum(blocks, axis = (2, 4), keepdims = True, where = keep, dtype = np.float64)
+        count = np.count_nonzero(keep, axis = (2, 4), keepdims = True)
+        return np.divide(total, count, out = np.zeros(total.shape), where = count > 0)
+
+    def _median(self, blocks):
+        """median of each block, blocks along a single axis (the ADC groups) are sorted,
+           which is several times faster than np.median for small blocks"""
+        axis = 2 if (blocks.shape[4] == 1) else 4 if (blocks.shape[2] == 1) else None
+        if (axis is None) or (blocks.shape[axis] > SORT_MEDIAN_SIZE):
+            return np.median(blocks, axis = (2, 4), keepdims = True)
+        n = blocks.shape[axis]
+        middle = np.sort(blocks, axis = axis).take([(n - 1) // 2, n // 2], axis = axis)
+        return np.mean(middle, axis = axis, keepdims = True, dtype = np.float64)
+
+    def correct(self, images, out = None):
+        """returns the images minus the common mode of their blocks, written to out
+           when given (out can be the images themselves). Integer images are
+           converted to float32."""
+        images = np.asarray(images)
+        if out is None:
+            out = np.empty(images.shape, dtype = np.result_type(images.dtype, np.float32))
+        commonMode = self.commonMode(images).astype(out.dtype, copy = False)
+        single = (images.ndim == 2)
+        imageBlocks = self._blocks(images[None] if single else images)
+        outBlocks = self._blocks(out[None] if single else out)
+        if not np.may_share_memory(outBlocks, out):
+            raise ValueError("CommonModeCorrection: out must be a contiguous array")
+        np.subtract(imageBlocks, commonMode, out = outBlocks)
+        return out
+
+
+################################################################################
+################################################################################
+#   Buffer pool class
+#   Recycles the image arrays between frames instead of allocating new ones
+################################################################################
+class BufferPool():
+    """ring of preallocated arrays for each image shape and dtype.
+       An array handed out is reused depth calls later, so it must not be
+       kept longer than that (copy it if it is needed for longer)."""
+
+    def __init__(self, depth = 3, maxShapes = 8):
+        self.depth = depth
+        # oldest rings are dropped when more shapes than this are in use
+        self.maxShapes = maxShapes
+        self._rings = {}
+
+    def get(self, shape, dtype):
+        """returns the next array of the ring of this shape and dtype (contents are not cleared)"""
+        key = (tuple(shape), np.dtype(dtype).str)
+        ring = self._rings.get(key)
+        if ring is None:
+            if (len(self._rings) >= self.maxShapes):
+                del self._rings[next(iter(self._rings))]
+            ring = [[None] * self.depth, 0]
+            self._rings[key] = ring
+        buffers, nextBuffer = ring
+        if buffers[nextBuffer] is None:
+            buffers[nextBuffer] = np.empty(shape, dtype = dtype)
+            if (PRINT_VERBOSE): print("BufferPool: new buffer", key)
+        ring[1] = (nextBuffer + 1) % self.depth
+        return buffers[nextBuffer]
+
+    def owns(self, array):
+        """True if the array is one of the pool buffers"""
+        ring = self._rings.get((array.shape, array.dtype.str))
+        return (ring is not None) and any(array is buf for buf in ring[0])
+
+    def clear(self):
+        self._rings = {}
 
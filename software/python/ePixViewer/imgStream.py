@@ -0,0 +1,297 @@
+#!/usr/bin/env python
+#-----------------------------------------------------------------------------
+# Title      : streaming image pipeline for offline analysis
+#-----------------------------------------------------------------------------
+# File       : imgStream.py
+# Created    : 2026-10-18
+# Last update: 2026-10-18
+#-----------------------------------------------------------------------------
+# Description:
+# Generator pipeline from a rogue .dat file to batches of descrambled images:
+# frame iterator -> Camera.buildImageFrame -> Camera.descrambleImage -> batch.
+# Reductions consume the batches one at a time so the memory used does not
+# depend on the number of frames in the file.
+#
+#-----------------------------------------------------------------------------
+# This file is part of the ePix rogue. It is subject to
+# the license terms in the LICENSE.txt file found in the top-level directory
+# of this distribution and at:
+#    https://confluence.slac.stanford.edu/display/ppareg/LICENSE.html.
+# No part of the ePix rogue, including this file, may be
+# copied, modified, propagated, or distributed except according to the terms
+# contained in the LICENSE.txt file.
+#-----------------------------------------------------------------------------
+
+import numpy as np
+import ePixViewer.dataReader as dataReader
+import ePixViewer.imgProcessing as imgPr
+import ePixViewer.noiseSpectrum as noiseSpectrum
+
+PRINT_VERBOSE = 0
+
+# default memory ceiling of a single batch of images
+DEFAULT_BATCH_BYTES = 256*1024*1024
+
+
+def iterImages(camera, frames, pooled = False):
+    """rebuilds the images from a frame iterator and yields them descrambled.
+       With pooled = True the images are recycled by camera.bufferPool and are
+       only valid until a few more images have been yielded. Frames that cannot
+       be descrambled are skipped (counted in camera.descrambleErrors)."""
+    out = camera.bufferPool if pooled else None
+    currentRawData = []
+    for newRawData in frames:
+        [frameComplete, readyForDisplay, rawImgFrame] = camera.buildImageFrame(currentRawData = currentRawData, newRawData = newRawData)
+        if (readyForDisplay):
+            image = camera.descrambleImage(rawImgFrame, out = out)
+            if image is not None:
+                yield image
+        # same frame building logic as ePixViewer.Window.buildImageFrame
+        if (frameComplete == 0 and readyForDisplay == 1):
+            currentRawData = newRawData
+        elif (frameComplete == 1):
+            currentRawData = []
+        else:
+            currentRawData = rawImgFrame
+
+
+def _batchLength(camera, numBytes, batchSize, maxBytes, dtype):
+    """number of single frame images of numBytes payloads held by a batch of at most maxBytes"""
+    if (batchSize is not None):
+        return batchSize
+    # the image size comes from the gather plan, the frame is not descrambled
+    shape = camera.batchImageShape(numBytes)
+    if shape is None:
+        return 1
+    # descrambleBatch masks the stack in place, in the type of the bit mask
+    itemsize = np.dtype(np.min_scalar_type(camera.bitMask) if dtype is None else dtype).itemsize
+    return max(1, maxBytes // max(1, int(np.prod(shape)) * itemsize))
+
+
+def _processingDtype(dtype, pedestal, gain, commonMode = None):
+    """batches are floating point when a pedestal, a gain or a common mode correction is applied"""
+    if (dtype is None) and ((pedestal is not None) or (gain is not None) or (commonMode is not None)):
+        return np.dtype(np.float64)
+    return dtype
+
+
+def _iterStackBatches(camera, frames, batchSize, maxBytes, dtype, pedestal = None, gain = None, commonMode = None):
+    """descrambles a [frames, payload] stack with Camera.descrambleBatch, a slice of rows at a time"""
+    if (len(frames) == 0):
+        return
+    size = _batchLength(camera, frames[0].nbytes, batchSize, maxBytes, dtype)
+    for start in range(0, len(frames), size):
+        batch = camera.descrambleBatch(frames[start:start + size])
+        if batch is None:
+            # wrong payload length, the frames are skipped
+            continue
+        if (PRINT_VERBOSE): print("iterImageBatches: batch of", len(batch), "images")
+        if (pedestal is not None) or (gain is not None) or (commonMode is not None):
+            # conversion, pedestal and gain in a single pass over the stack
+            yield _correctCommonMode(camera.imgTool.subtractPedestal(batch, pedestal = pedestal, gain = gain, dtype = dtype), commonMode)
+        else:
+            yield batch if dtype is None else batch.astype(dtype)
+
+
+def _correctCommonMode(batch, commonMode):
+    """common mode correction in place on a floating point batch"""
+    if commonMode is None:
+        return batch
+    return commonMode.correct(batch, out = batch)
+
+
+def iterImageBatches(camera, frames, batchSize = None, maxBytes = DEFAULT_BATCH_BYTES, dtype = None, pedestal = None, gain = None,
+                     commonMode = None):
+    """groups the descrambled images in [images, rows, cols] batches.
+       When batchSize is None the batch size is derived from maxBytes.
+       A batch is also closed when the image shape changes.
+       A [frames, payload] array of a camera with one frame per image is
+       descrambled with Camera.descrambleBatch instead of frame by frame.
+       The pedestal is subtracted and the gain applied (as in Camera.processImage)
+       when they are given, the batches are then float64 unless dtype is set.
+       A commonMode correction (Camera.commonModeCorrection) is applied last, batch by batch."""
+    dtype = _processingDtype(dtype, pedestal, gain, commonMode)
+    if (isinstance(frames, np.ndarray) and (frames.ndim == 2) and (camera.batchCameras.get(camera.cameraType) == 1)):
+        yield from _iterStackBatches(camera, frames, batchSize, maxBytes, dtype, pedestal, gain, commonMode)
+        return
+    batch = None
+    numImages = 0
+    # images are copied into the batch right away so pooled buffers can be used
+    for image in iterImages(camera, frames, pooled = True):
+        if ((batch is not None) and (image.shape != batch.shape[1:])):
+            yield _correctCommonMode(batch[:numImages], commonMode)
+            batch = None
+        if (batch is None):
+            batchDtype = np.dtype(image.dtype if dtype is None else dtype)
+            size = batchSize
+            if (size is None):
+                size = max(1, maxBytes // max(1, image.size * batchDtype.itemsize))
+            batch = np.empty((size,) + image.shape, dtype = batchDtype)
+            numImages = 0
+        if (pedestal is not None) or (gain is not None) or (commonMode is not None):
+            camera.imgTool.subtractPedestal(image, pedestal = pedestal, gain = gain, out = batch[numImages])
+        else:
+            batch[numImages] = image
+        numImages = numImages + 1
+        if (numImages == len(batch)):
+            if (PRINT_VERBOSE): print("iterImageBatches: batch of", numImages, "images")
+            yield _correctCommonMode(batch, commonMode)
+            batch = None
+    if (batch is not None):
+        yield _correctCommonMode(batch[:numImages], commonMode)
+
+
+def iterImageBatchesFromFile(camera, filename, channel = 1, asic = None, batchSize = None, maxBytes = DEFAULT_BATCH_BYTES, dtype = None,
+                             pedestal = None, gain = None, commonMode = None, useIndexFile = True, maxFrames = -1, payloadSize = None):
+    """reads, rebuilds and descrambles the images of a rogue file batch by batch.
+       Runs of consecutive frames of one frame per image cameras are descrambled
+       directly from the mapped file with Camera.descrambleBatch. A block is split
+       where the payload size changes, so files mixing several sample counts stay
+       on the batch path (one cached reorder plan per size).
+       useIndexFile = False does not read or write the index file of the data file.
+       maxFrames and payloadSize select the frames as in dataReader.loadFrames."""
+    dtype = _processingDtype(dtype, pedestal, gain, commonMode)
+    if (camera.batchCameras.get(camera.cameraType) == 1):
+        reader = dataReader.openFrameReader(filename, useIndexFile = useIndexFile)
+        frameNumbers = reader.index.select(channel = channel, asic = asic, payloadSize = payloadSize)
+        if (maxFrames >= 0):
+            frameNumbers = frameNumbers[:maxFrames]
+        if (len(frameNumbers) > 0):
+            size = _batchLength(camera, int(reader.index.size[frameNumbers[0]]), batchSize, maxBytes, dtype)
+        for start in range(0, len(frameNumbers), size if len(frameNumbers) else 1):
+            block = frameNumbers[start:start + size]
+            sizes = reader.index.size[block]
+            for segment in np.split(block, np.flatnonzero(np.diff(sizes)) + 1):
+                runs = list(reader.frameRuns(segment, 'uint8'))
+                if (len(runs) == 1):
+                    # consecutive frames are descrambled straight from the mapped file
+                    frames = runs[0][1]
+                else:
+                    frames = dataReader._copyFrames(reader, segment, np.dtype('uint8'))
+                yield from _iterStackBatches(camera, frames, len(frames), maxBytes, dtype, pedestal, gain, commonMode)
+        reader.close()
+        return
+    frames = dataReader.iterFrames(filename, channel = channel, asic = asic, maxFrames = maxFrames, payloadSize = payloadSize,
+                                   useIndexFile = useIndexFile)
+    yield from iterImageBatches(camera, frames, batchSize = batchSize, maxBytes = maxBytes, dtype = dtype, pedestal = pedestal, gain = gain,
+                                commonMode = commonMode)
+
+
+def decodeFileHeaders(camera, filename, channel = 1, asic = None, reader = None):
+    """decodes the payload headers of all frames of a channel (and ASIC) of a rogue file
+       or frame store. Returns (frame numbers, Camera.decodeHeaders columns).
+       An already open reader (e.g. on an index just built) is used instead of opening the file."""
+    ownReader = reader is None
+    if ownReader:
+        reader = dataReader.openFrameReader(filename)
+    frameNumbers = reader.index.select(channel = channel, asic = asic)
+    headers = camera.decodeHeaders(reader.headers(frameNumbers, camera.headerDtype().itemsize))
+    if ownReader:
+        reader.close()
+    return frameNumbers, headers
+
+
+def stackImages(batches):
+    """concatenates all batches in a single [images, rows, cols] array (returns [] if there are none).
+       Raises ValueError when the image shape changes between batches (e.g. files mixing
+       several sample counts), such batches have to be processed one at a time."""
+    batches = list(batches)
+    if (len(batches) == 0):
+        return []
+    shapes = sorted(set(batch.shape[1:] for batch in batches))
+    if (len(shapes) > 1):
+        raise ValueError("stackImages: images of shapes " + ", ".join(str(shape) for shape in shapes) +
+                         " cannot be stacked, select one channel/ASIC or process the batches one at a time")
+    return np.concatenate(batches, 0)
+
+
+def iterStackSlices(images, maxBytes = DEFAULT_BATCH_BYTES):
+    """yields [images, rows, cols] views of an existing stack of at most maxBytes each,
+       so the batch reductions below run on it with bounded temporary arrays"""
+    images = np.asarray(images)
+    if (len(images) == 0):
+        return
+    size = max(1, maxBytes // max(1, images[0].nbytes))
+    for start in range(0, len(images), size):
+        yield images[start:start + size]
+
+
+def batchSelect(batches, select):
+    """stacks select(batch) of every [images, rows, cols] batch along the image axis: the first
+       images, a few pixel time series, per image averages... Only the selection is kept, so it
+       works on files larger than memory. When select returns a tuple of arrays a tuple of
+       stacks is returned (None for each when there are no batches)."""
+    parts = []
+    for batch in batches:
+        selected = select(batch)
+        # copies, a view would keep the whole batch alive
+        parts.append(tuple(np.array(part) for part in selected) if isinstance(selected, tuple) else np.array(selected))
+    if (len(parts) == 0):
+        return None
+    if isinstance(parts[0], tuple):
+        return tuple(np.concatenate(column, 0) for column in zip(*parts))
+    return np.concatenate(parts, 0)
+
+
+def batchImages(batches, imageNumbers):
+    """returns the [images, rows, cols] stack of the images with the given numbers (counted from the
+       first image of the first batch, in increasing order). The batches after the last one are not read."""
+    imageNumbers = np.unique(np.asarray(imageNumbers, dtype = 'int64'))
+    images = []
+    start = 0
+    for batch in batches:
+        if (len(imageNumbers) == 0) or (start > imageNumbers[-1]):
+            break
+        selected = imageNumbers[(imageNumbers >= start) & (imageNumbers < start + len(batch))]
+        images.append(batch[selected - start])
+        start = start + len(batch)
+    return stackImages(images)
+
+
+##########################################################
+# batch by batch reductions
+##########################################################
+def batchMeanStd(batches):
+    """per pixel mean and standard deviation, batches are merged with the parallel variance algorithm
+       (same estimator as the viewer dark image, imgProcessing.PedestalEstimator)"""
+    estimator = imgPr.PedestalEstimator()
+    for batch in batches:
+        estimator.updateBatch(batch)
+    if (estimator.count == 0):
+        return [None, None]
+    return [estimator.pedestal(), estimator.rms()]
+
+
+def batchHistogram(batches, bins):
+    """histogram of all pixel values, accumulated batch by batch with fixed bin edges"""
+    bins = np.asarray(bins)
+    counts = np.zeros(len(bins) - 1, dtype = 'int64')
+    for batch in batches:
+        h, b = np.histogram(batch, bins)
+        counts = counts + h
+    return [counts, bins]
+
+
+def batchNoiseSpectrum(batches, segmentLength = None, overlap = 0.5, sampleRate = 1.0):
+    """Welch power spectral density of each channel (image row), averaged over all batches.
+       Returns [frequencies, psd] ([None, None] if there are no images)."""
+    spectrum = noiseSpectrum.NoiseSpectrum(segmentLength = segmentLength, overlap = overlap, sampleRate = sampleRate)
+    for batch in batches:
+        spectrum.update(batch)
+    if (spectrum.numSegments == 0):
+        return [None, None]
+    return [spectrum.frequencies(), spectrum.psd()]
+
+
+def batchToHdf5(batches, h5File, datasetName, dtype = 'uint16'):
+    """appends the batches to a resizable dataset (one chunk per image), returns the number of images written"""
+    dataset = None
+    numImages = 0
+    for batch in batches:
+        if (dataset is None):
+            dataset = h5File.create_dataset(datasetName, shape = (0,) + batch.shape[1:], maxshape = (None,) + batch.shape[1:],
+                                            chunks = (1,) + batch.shape[1:], dtype = dtype)
+        dataset.resize(numImages + batch.shape[0], axis = 0)
+        dataset[numImages:numImages + batch.shape[0]] = batch
+        numImages = numImages + batch.shape[0]
+    return numImages
@@ -0,0 +1,168 @@
+#!/usr/bin/env python
+#-----------------------------------------------------------------------------
+# Title      : code density linearity analysis
+#-----------------------------------------------------------------------------
+# File       : linearity.py
+# Created    : 2026-10-18
+# Last update: 2026-10-18
+#-----------------------------------------------------------------------------
+# Description:
+# Streaming DNL/INL analysis of ramp and sine wave tests. The batches of
+# descrambled images only update a per channel code histogram (and the sums
+# of the transfer curve fit when the input of each batch is known), so the
+# memory used does not depend on the length of the test. The transition
+# levels, DNL, INL and missing codes of all channels are computed at the end
+# from the histograms as [channels, codes] arrays.
+#
+# Partial analyses (e.g. of different files in different processes) are
+# combined with merge, and saved to / loaded from HDF5 so a test can be
+# analysed in several runs.
+#
+#-----------------------------------------------------------------------------
+# This file is part of the ePix rogue. It is subject to
+# the license terms in the LICENSE.txt file found in the top-level directory
+# of this distribution and at:
+#    https://confluence.slac.stanford.edu/display/ppareg/LICENSE.html.
+# No part of the ePix rogue, including this file, may be
+# copied, modified, propagated, or distributed except according to the terms
+# contained in the LICENSE.txt file.
+#-----------------------------------------------------------------------------
+
+import numpy as np
+import ePixViewer.imgProcessing as imgPr
+
+PRINT_VERBOSE = 0
+
+# input signals of the code density test
+SIGNALS = ['ramp', 'sine']
+
+
+################################################################################
+################################################################################
+#   Linearity analysis class
+################################################################################
+class LinearityAnalysis():
+    """code density linearity test of numChannels ADCs of numBits.
+       Feed the [channels, samples] images or [images, channels, samples]
+       batches with update (optionally with the input level of the batch for
+       the transfer curve fit) and get the results with results."""
+
+    def __init__(self, numChannels = 64, numBits = 16, signal = 'ramp', channelAxis = -2):
+        if signal not in SIGNALS:
+            raise ValueError("LinearityAnalysis: unknown signal " + str(signal))
+        self.numChannels = numChannels
+        self.numBits = numBits
+        self.signal = signal
+        self.channelAxis = channelAxis
+        self.histogram = imgPr.HistogramAccumulator(numChannels, numCodes = 1 << numBits, channelAxis = channelAxis)
+        self.reset()
+
+    def reset(self):
+        self.histogram.reset()
+        # per channel sums of the least squares fit code = gain * input + offset
+        self.fitSums = np.zeros((6, self.numChannels))
+
+    def update(self, data, stimulus = None):
+        """adds a batch of codes, stimulus is the input level of the whole batch (a ramp step)"""
+        data = np.asarray(data)
+        self.histogram.update(data)
+        if stimulus is None:
+            return
+        otherAxes = tuple(axis for axis in range(data.ndim) if axis != (self.channelAxis % data.ndim))
+        count = data.size // self.numChannels
+        codeSum = np.sum(data, axis = otherAxes, dtype = np.float64)
+        codeSquares = np.sum(np.square(data, dtype = np.float64), axis = otherAxes)
+        # n, sum x, sum x^2, sum y, sum x*y, sum y^2
+        self.fitSums[0] += count
+        self.fitSums[1] += count * stimulus
+        self.fitSums[2] += count * stimulus * stimulus
+        self.fitSums[3] += codeSum
+        self.fitSums[4] += stimulus * codeSum
+        self.fitSums[5] += codeSquares
+
+    def merge(self, other):
+        """adds a partial analysis of the same test, returns self"""
+        if (other.signal != self.signal):
+            raise ValueError("LinearityAnalysis: cannot merge " + other.signal + " and " + self.signal + " tests")
+        self.histogram.merge(other.histogram)
+        self.fitSums += other.fitSums
+        return self
+
+    def _transferFit(self):
+        """gain, offset and rms residual of the code vs input fit of each channel (nan without input)"""
+        n, sx, sxx, sy, sxy, syy = self.fitSums
+        with np.errstate(divide = 'ignore', invalid = 'ignore'):
+            gain = (n * sxy - sx * sy) / (n * sxx - sx * sx)
+            offset = (sy - gain * sx) / n
+            residual = np.sqrt(np.maximum(syy - offset * sy - gain * sxy, 0) / n)
+        return gain, offset, residual
+
+    def results(self):
+        """returns a dict of per channel results:
+             firstCode, lastCode  lowest and highest code hit (saturation, not analysed)
+             dnl, inl             [channels, codes] in LSB, nan outside firstCode < code < lastCode
+             missingCodes         [channels, codes] codes inside the range with no hit
+             numMissingCodes, maxDnl, maxInl, and gain, offset, residualRms of the transfer fit"""
+        counts = self.histogram.counts
+        codes = np.arange(counts.shape[1])
+        hit = counts > 0
+        anyHit = hit.any(axis = 1)
+        firstCode = np.where(anyHit, np.argmax(hit, axis = 1), 0)
+        lastCode = np.where(anyHit, counts.shape[1] - 1 - np.argmax(hit[:, ::-1], axis = 1), 0)
+        inner = (codes > firstCode[:, None]) & (codes < lastCode[:, None])
+        numInner = inner.sum(axis = 1)
+
+        # transition level above each code from the cumulative histogram
+        cumulative = np.cumsum(counts, axis = 1) / np.maximum(counts.sum(axis = 1), 1)[:, None]
+        if (self.signal == 'sine'):
+            # the codes of a sine are distributed as an arcsine, its transition levels are -cos(pi * cdf)
+            transition = -np.cos(np.pi * cumulative)
+        else:
+            transition = cumulative
+        width = np.diff(transition, axis = 1, prepend = 0)
+        # mean width of the inner codes, from the transitions below and above them
+        rows = np.arange(self.numChannels)
+        span = transition[rows, np.maximum(lastCode - 1, 0)] - transition[rows, firstCode]
+        lsb = np.where(numInner > 0, span / np.maximum(numInner, 1), np.nan)
+
+        with np.errstate(divide = 'ignore', invalid = 'ignore'):
+            dnl = np.where(inner, width / lsb[:, None] - 1, np.nan)
+            inl = np.where(inner, (transition - transition[rows, firstCode][:, None]) / lsb[:, None] - (codes - firstCode[:, None]), np.nan)
+        missingCodes = inner & ~hit
+        gain, offset, residual = self._transferFit()
+        return {'firstCode': firstCode, 'lastCode': lastCode, 'dnl': dnl, 'inl': inl,
+                'missingCodes': missingCodes, 'numMissingCodes': missingCodes.sum(axis = 1),
+                'maxDnl': np.max(np.abs(np.where(inner, dnl, 0)), axis = 1),
+                'maxInl': np.max(np.abs(np.where(inner, inl, 0)), axis = 1),
+                'gain': gain, 'offset': offset, 'residualRms': residual}
+
+    def toHdf5(self, h5File, groupName = 'linearity'):
+        """writes the histograms, the fit sums and the results to a group of an open HDF5 file"""
+        if groupName in h5File:
+            del h5File[groupName]
+        group = h5File.create_group(groupName)
+        group.attrs['signal'] = self.signal
+        group.attrs['numBits'] = self.numBits
+        group.create_dataset('counts', data = self.histogram.counts, compression = 'gzip', shuffle = True)
+        group['underflow'] = self.histogram.underflow
+        group['overflow'] = self.histogram.overflow
+        group['fitSums'] = self.fitSums
+        for name, value in self.results().items():
+            if (np.ndim(value) == 2):
+                group.create_dataset(name, data = value, compression = 'gzip', shuffle = True, chunks = (1, value.shape[1]))
+            else:
+                group[name] = value
+        return group
+
+    @classmethod
+    def fromHdf5(cls, h5File, groupName = 'linearity', channelAxis = -2):
+        """reads back an analysis written by toHdf5, it can then be merged or updated"""
+        group = h5File[groupName]
+        counts = group['counts'][:]
+        analysis = cls(numChannels = counts.shape[0], numBits = int(group.attrs['numBits']), signal = str(group.attrs['signal']),
+                       channelAxis = channelAxis)
+        analysis.histogram.counts[:] = counts
+        analysis.histogram.underflow[:] = group['underflow'][:]
+        analysis.histogram.overflow[:] = group['overflow'][:]
+        analysis.fitSums[:] = group['fitSums'][:]
+        return analysis
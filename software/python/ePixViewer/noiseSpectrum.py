@@ -0,0 +1,131 @@
+#!/usr/bin/env python
+#-----------------------------------------------------------------------------
+# Title      : noise power spectrum of the ADC channels
+#-----------------------------------------------------------------------------
+# File       : noiseSpectrum.py
+# Created    : 2026-10-18
+# Last update: 2026-10-18
+#-----------------------------------------------------------------------------
+# Description:
+# Welch power spectral density of every channel of [channels, samples]
+# images (the cryo64xN traces). The segments of all channels of a batch of
+# frames are windowed and transformed with a single rfft and only the sum of
+# their power is kept, so the spectra are averaged over any number of frames
+# without holding the time series. Pickup lines that are hidden in the
+# standard deviation of a channel stand out as peaks of its spectrum.
+#
+#-----------------------------------------------------------------------------
+# This file is part of the ePix rogue. It is subject to
+# the license terms in the LICENSE.txt file found in the top-level directory
+# of this distribution and at:
+#    https://confluence.slac.stanford.edu/display/ppareg/LICENSE.html.
+# No part of the ePix rogue, including this file, may be
+# copied, modified, propagated, or distributed except according to the terms
+# contained in the LICENSE.txt file.
+#-----------------------------------------------------------------------------
+
+import numpy as np
+
+PRINT_VERBOSE = 0
+
+# number of frequency bins of the baseline used to find pickup lines
+LINE_BASELINE_BINS = 33
+
+
+################################################################################
+################################################################################
+#   Noise spectrum class
+################################################################################
+class NoiseSpectrum():
+    """one sided power spectral density of each channel, averaged Welch style
+       over the segments of all frames added with update (same scaling as
+       scipy.signal.welch with a periodic Hann window, in units^2 / Hz).
+       The samples are along the last axis and the channels along the one
+       before. segmentLength = None uses whole frames as segments."""
+
+    def __init__(self, segmentLength = None, overlap = 0.5, sampleRate = 1.0):
+        self.segmentLength = segmentLength
+        self.overlap = overlap
+        self.sampleRate = sampleRate
+        self.reset()
+
+    def reset(self):
+        self.numChannels = None
+        self.numSegments = 0
+        self._powerSum = None
+
+    def _setup(self, numChannels, numSamples):
+        segmentLength = numSamples if self.segmentLength is None else min(self.segmentLength, numSamples)
+        self._segmentLength = segmentLength
+        self._step = max(1, int(segmentLength * (1 - self.overlap)))
+        # periodic Hann window
+        self._window = np.hanning(segmentLength + 1)[:-1]
+        self._scale = 1.0 / (self.sampleRate * np.sum(np.square(self._window)))
+        self.numChannels = numChannels
+        self._powerSum = np.zeros((numChannels, segmentLength // 2 + 1))
+        if (PRINT_VERBOSE): print("NoiseSpectrum:", numChannels, "channels, segments of", segmentLength, "samples")
+
+    def update(self, data):
+        """adds a [channels, samples] frame or an [images, channels, samples] batch"""
+        data = np.asarray(data)
+        if (data.ndim == 2):
+            data = data[None]
+        if self._powerSum is None:
+            self._setup(data.shape[1], data.shape[2])
+        if (data.shape[1] != self.numChannels) or (data.shape[2] < self._segmentLength):
+            raise ValueError("NoiseSpectrum: frame shape " + str(data.shape[1:]) + " does not match the spectrum")
+        # [images, channels, segments, segment samples] view of the overlapping segments
+        segments = np.lib.stride_tricks.sliding_window_view(data, self._segmentLength, axis = 2)[:, :, ::self._step]
+        # the mean of each segment is removed (it would leak into the first bins), then the window applied
+        windowed = segments - np.mean(segments, axis = 3, keepdims = True)
+        windowed *= self._window
+        spectrum = np.fft.rfft(windowed, axis = 3)
+        self._powerSum += np.sum(np.square(spectrum.real) + np.square(spectrum.imag), axis = (0, 2))
+        self.numSegments = self.numSegments + segments.shape[0] * segments.shape[2]
+
+    def merge(self, other):
+        """adds the segments of another spectrum with the same parameters, returns self"""
+        if other._powerSum is None:
+            return self
+        if self._powerSum is None:
+            self._setup(other.numChannels, other._segmentLength)
+        if (other._powerSum.shape != self._powerSum.shape) or (other.sampleRate != self.sampleRate):
+            raise ValueError("NoiseSpectrum: cannot merge spectra with different parameters")
+        self._powerSum += other._powerSum
+        self.numSegments = self.numSegments + other.numSegments
+        return self
+
+    def frequencies(self):
+        return np.fft.rfftfreq(self._segmentLength, 1.0 / self.sampleRate)
+
+    def psd(self):
+        """[channels, frequencies] one sided power spectral density"""
+        psd = self._powerSum * (self._scale / max(1, self.numSegments))
+        # the power of the negative frequencies is added to the positive ones (not DC and Nyquist)
+        last = None if (self._segmentLength % 2) else -1
+        psd[:, 1:last] *= 2
+        return psd
+
+
+def integratedNoise(frequencies, psd):
+    """rms noise of each channel from its power spectral density"""
+    return np.sqrt(np.sum(psd, axis = -1) * (frequencies[1] - frequencies[0]))
+
+
+def pickupLines(frequencies, psd, numLines = 5):
+    """returns the [channels, numLines] frequencies and heights (ratio to the local median
+       of the spectrum) of the highest narrow peaks of each channel"""
+    half = LINE_BASELINE_BINS // 2
+    padded = np.pad(psd, ((0, 0), (half, half)), mode = 'edge')
+    baseline = np.median(np.lib.stride_tricks.sliding_window_view(padded, LINE_BASELINE_BINS, axis = 1), axis = 2)
+    with np.errstate(divide = 'ignore', invalid = 'ignore'):
+        ratio = np.where(baseline > 0, psd / baseline, 0)
+    # only local maxima count, so the leakage into the bins next to a line is not another line
+    peak = np.ones(psd.shape, dtype = bool)
+    peak[:, 1:] &= psd[:, 1:] >= psd[:, :-1]
+    peak[:, :-1] &= psd[:, :-1] >= psd[:, 1:]
+    ratio[~peak] = 0
+    # DC is not a pickup line
+    ratio[:, 0] = 0
+    lines = np.argsort(ratio, axis = 1)[:, ::-1][:, :numLines]
+    return frequencies[lines], np.take_along_axis(ratio, lines, axis = 1)
@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+#-----------------------------------------------------------------------------
+# Title      : synthetic camera frames
+#-----------------------------------------------------------------------------
+# File       : syntheticFrames.py
+# Created    : 2026-10-18
+# Last update: 2026-10-18
+#-----------------------------------------------------------------------------
+# Description:
+# Generates frame payloads with the same size, header and packet sequence as
+# the ones sent by each camera, so the descramblers and frame builders can be
+# exercised and timed without hardware or recorded data. Pixel values are
+# random ADC samples; only the header fields used by the decoders are set.
+#
+#-----------------------------------------------------------------------------
+# This file is part of the ePix rogue. It is subject to
+# the license terms in the LICENSE.txt file found in the top-level directory
+# of this distribution and at:
+#    https://confluence.slac.stanford.edu/display/ppareg/LICENSE.html.
+# No part of the ePix rogue, including this file, may be
+# copied, modified, propagated, or distributed except according to the terms
+# contained in the LICENSE.txt file.
+#-----------------------------------------------------------------------------
+
+import numpy as np
+
+# default number of samples per channel of the cryo64xN and ePixHrePixM frames
+DEFAULT_SAMPLES = 1024
+
+
+def _header(numDwords, acqNum, dword0 = 0, dword2 = 0):
+    """payload header dwords: VC/ASIC, acquisition number, ASIC number/TOA flag"""
+    header = np.zeros(numDwords, dtype='uint32')
+    header[0] = dword0
+    header[1] = acqNum
+    header[2] = dword2
+    return header
+
+
+def _packet(header, samples):
+    """payload bytes of a header followed by 16 bit samples"""
+    return np.concatenate((header.view('uint8'), samples.astype('<u2').view('uint8')))
+
+
+def ePix100aFrames(camera, numImages, rng):
+    """one frame per image, 32 byte header followed by the rows of both ASIC sides (ePix100a/100p/10ka)"""
+    numSamples = camera.sensorHeight * camera._superRowSizeInBytes // 2
+    return [_packet(_header(8, acqNum), rng.integers(0, 1 << 14, numSamples)) for acqNum in range(numImages)]
+
+
+def quadPacketFrames(camera, numImages, rng):
+    """four 1155 dword packets per image (Tixel48x48/Cpix2): ASIC 0/1, time over threshold/time of arrival"""
+    frames = []
+    for acqNum in range(numImages):
+        for isTOA in (0, 1):
+            for asic in (0, 1):
+                # bit 0 of the Tixel samples flags a valid pixel
+                samples = rng.integers(0, 1 << 15, 48*48) | 1
+                frames.append(_packet(_header(3, acqNum, dword2 = (isTOA << 3) | asic), samples))
+    return frames
+
+
+def epixM32Frames(camera, numImages, rng):
+    """two 1027 dword packets per image, one per ASIC (quadrants of 64x32 pixels)"""
+    return [_packet(_header(3, acqNum, dword2 = asic), rng.integers(0, 1 << 14, 64*32))
+            for acqNum in range(numImages) for asic in (0, 1)]
+
+
+def hrAdc32x32Frames(camera, numImages, rng):
+    """two 515 dword packets per image, one per ASIC (quadrants of 32x32 pixels)"""
+    return [_packet(_header(3, acqNum, dword2 = asic), rng.integers(0, 1 << 14, 32*32))
+            for acqNum in range(numImages) for asic in (0, 1)]
+
+
+def cryoFrames(camera, numImages, rng, samples = DEFAULT_SAMPLES):
+    """one frame per image, 6 word header followed by samples x 64 channels, ASIC in header bit 4"""
+    return [_packet(_header(3, acqNum, dword0 = (acqNum % 2) << 4), rng.integers(0, 1 << 12, 64*samples))
+            for acqNum in range(numImages)]
+
+
+# frame generator of each camera type
+FRAME_GENERATORS = { 'ePix100a'     : ePix100aFrames,   'ePix100p'   : ePix100aFrames,
+                     'ePix10ka'     : ePix100aFrames,   'Tixel48x48' : quadPacketFrames,
+                     'Cpix2'        : quadPacketFrames, 'ePixM32Array' : epixM32Frames,
+                     'HrAdc32x32'   : hrAdc32x32Frames, 'cryo64xN'   : cryoFrames,
+                     'ePixHrePixM'  : cryoFrames }
+
+
+def generateFrames(camera, numImages, seed = 0, samples = DEFAULT_SAMPLES, interleave = 1):
+    """returns the list of uint8 frame payloads of numImages images of the camera, in arrival order.
+       With interleave > 1 the packets of groups of interleave images are shuffled, as when
+       several acquisitions are in flight. samples only applies to the cryo64xN and ePixHrePixM."""
+    rng = np.random.default_rng(seed)
+    generator = FRAME_GENERATORS[camera.cameraType]
+    if (generator is cryoFrames):
+        frames = generator(camera, numImages, rng, samples = samples)
+    else:
+        frames = generator(camera, numImages, rng)
+    if (interleave > 1):
+        framesPerImage = len(frames) // max(1, numImages)
+        group = interleave * framesPerImage
+        frames = [frames[start + i] for start in range(0, len(frames), group)
+                  for i in rng.permutation(min(group, len(frames) - start))]
+    return frames
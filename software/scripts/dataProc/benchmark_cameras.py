@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+#-----------------------------------------------------------------------------
+# Title      : camera decoding benchmark
+#-----------------------------------------------------------------------------
+# File       : benchmark_cameras.py
+# Created    : 2026-10-18
+# Last update: 2026-10-18
+#-----------------------------------------------------------------------------
+# Description:
+# Times the frame building, descrambling and batch paths of Cameras.py on
+# synthetic frames of each camera type and reports frames/s and MB/s of
+# payload. No hardware or data file is needed. The results are saved as JSON
+# and can be compared with a previous run.
+#
+# Example:
+#   python3 benchmark_cameras.py --output before.json
+#   python3 benchmark_cameras.py --output after.json --compare before.json
+#   python3 benchmark_cameras.py --cameras cryo64xN ePix10ka --samples 4096
+#
+#-----------------------------------------------------------------------------
+# This file is part of the ePix rogue. It is subject to
+# the license terms in the LICENSE.txt file found in the top-level directory
+# of this distribution and at:
+#    https://confluence.slac.stanford.edu/display/ppareg/LICENSE.html.
+# No part of the ePix rogue, including this file, may be
+# copied, modified, propagated, or distributed except according to the terms
+# contained in the LICENSE.txt file.
+#-----------------------------------------------------------------------------
+import setupLibPaths
+import os, sys, time
+import argparse
+import contextlib
+import json
+import platform
+import numpy as np
+import ePixViewer.Cameras as cameras
+import ePixViewer.imgStream as imgStream
+import ePixViewer.syntheticFrames as syntheticFrames
+
+# Set the argument parser
+parser = argparse.ArgumentParser()
+
+# Add arguments
+parser.add_argument(
+    "--cameras",
+    type     = str,
+    nargs    = '+',
+    required = False,
+    default  = ['ePix100a', 'ePix10ka', 'Tixel48x48', 'Cpix2', 'ePixM32Array', 'HrAdc32x32', 'cryo64xN', 'ePixHrePixM'],
+    help     = "camera types to benchmark",
+)
+
+parser.add_argument(
+    "--images",
+    type     = int,
+    required = False,
+    default  = 200,
+    help     = "number of images generated for each camera",
+)
+
+parser.add_argument(
+    "--samples",
+    type     = int,
+    required = False,
+    default  = syntheticFrames.DEFAULT_SAMPLES,
+    help     = "samples per channel of the cryo64xN and ePixHrePixM frames",
+)
+
+parser.add_argument(
+    "--interleave",
+    type     = int,
+    required = False,
+    default  = 1,
+    help     = "number of acquisitions whose packets are shuffled together",
+)
+
+parser.add_argument(
+    "--repeat",
+    type     = int,
+    required = False,
+    default  = 3,
+    help     = "each measurement is repeated and the fastest run is kept",
+)
+
+parser.add_argument(
+    "--output",
+    type     = str,
+    required = False,
+    default  = "",
+    help     = "JSON file the results are written to",
+)
+
+parser.add_argument(
+    "--compare",
+    type     = str,
+    required = False,
+    default  = "",
+    help     = "JSON file of a previous run to compare with",
+)
+
+##################################################
+# measurements
+##################################################
+def timeIt(function, repeat):
+    """returns the fastest of repeat calls of function, in seconds (camera prints are discarded)"""
+    best = None
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        for i in range(repeat):
+            startTime = time.perf_counter()
+            function()
+            elapsed = time.perf_counter() - startTime
+            best = elapsed if best is None else min(best, elapsed)
+    return best
+
+def buildFrames(camera, frames):
+    """frame building only, same logic as ePixViewer.Window.buildImageFrame, returns the image data"""
+    imageData = []
+    currentRawData = []
+    for newRawData in frames:
+        [frameComplete, readyForDisplay, rawImgFrame] = camera.buildImageFrame(currentRawData = currentRawData, newRawData = newRawData)
+        if (readyForDisplay):
+            imageData.append(rawImgFrame)
+        if (frameComplete == 0 and readyForDisplay == 1):
+            currentRawData = newRawData
+        elif (frameComplete == 1):
+            currentRawData = []
+        else:
+            currentRawData = rawImgFrame
+    return imageData
+
+def newCamera(cameraType):
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        return cameras.Camera(cameraType = cameraType)
+
+def benchmarkCamera(cameraType, args):
+    """returns a list of result dicts, one per measured stage"""
+    camera = newCamera(cameraType)
+    frames = syntheticFrames.generateFrames(camera, args.images, samples = args.samples, interleave = args.interleave)
+    frameBytes = sum(len(frame) for frame in frames)
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        imageData = buildFrames(newCamera(cameraType), frames)
+        image = camera.descrambleImage(imageData[0]) if len(imageData) else None
+    if image is None:
+        print(cameraType, ": no image was built")
+        return []
+    pedestal = np.zeros(image.shape, dtype = np.float32)
+
+    # stage name, function, number of frames and bytes processed by one call
+    # (the descramble stages process the images built from all the frames)
+    stages = [
+        ('buildImageFrame', lambda: buildFrames(newCamera(cameraType), frames), len(frames), frameBytes),
+        ('descrambleImage', lambda: [camera.descrambleImage(data) for data in imageData], len(frames), frameBytes),
+        ('descrambleImage pooled', lambda: [camera.descrambleImage(data, out = camera.bufferPool) for data in imageData], len(frames), frameBytes),
+        ('processImage', lambda: [camera.processImage(data, out = camera.bufferPool, pedestal = pedestal) for data in imageData], len(frames), frameBytes),
+        ('iterImages', lambda: list(imgStream.iterImages(newCamera(cameraType), frames, pooled = True)), len(frames), frameBytes),
+    ]
+    sameSize = all(len(frame) == len(frames[0]) for frame in frames)
+    if sameSize:
+        stack = np.stack(frames)
+        stages.append(('decodeHeaders', lambda: camera.decodeHeaders(stack), len(frames), frameBytes))
+        if (camera.batchCameras.get(cameraType) is not None):
+            stages.append(('descrambleBatch', lambda: camera.descrambleBatch(stack), len(frames), frameBytes))
+
+    results = []
+    for stage, function, numFrames, numBytes in stages:
+        seconds = timeIt(function, args.repeat)
+        results.append({'camera': cameraType, 'stage': stage, 'frames': numFrames, 'images': len(imageData),
+                        'bytes': numBytes, 'seconds': seconds,
+                        'framesPerSecond': numFrames / seconds, 'imagesPerSecond': len(imageData) / seconds,
+                        'MBPerSecond': numBytes / seconds / 1e6})
+    return results
+
+##################################################
+# main
+##################################################
+def main():
+    args = parser.parse_args()
+
+    previous = {}
+    if args.compare:
+        with open(args.compare) as f:
+            previous = {(r['camera'], r['stage']): r for r in json.load(f)['results']}
+
+    results = []
+    print("%-14s %-24s %12s %10s %10s" % ("camera", "stage", "frames/s", "MB/s", "vs. prev."))
+    for cameraType in args.cameras:
+        for result in benchmarkCamera(cameraType, args):
+            results.append(result)
+            ratio = ""
+            old = previous.get((result['camera'], result['stage']))
+            if old is not None:
+                ratio = "%.2fx" % (result['MBPerSecond'] / old['MBPerSecond'])
+            print("%-14s %-24s %12.1f %10.1f %10s" % (result['camera'], result['stage'], result['framesPerSecond'], result['MBPerSecond'], ratio))
+
+    if args.output:
+        report = {'date': time.strftime('%Y-%m-%d %H:%M:%S'), 'host': platform.node(), 'platform': platform.platform(),
+                  'python': platform.python_version(), 'numpy': np.__version__, 'arguments': vars(args), 'results': results}
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent = 1)
+        print("Saved", args.output)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+#-----------------------------------------------------------------------------
+# Title      : rogue .dat to compressed frame store converter
+#-----------------------------------------------------------------------------
+# File       : convert_dat_to_frameStore.py
+# Created    : 2026-10-18
+# Last update: 2026-10-18
+#-----------------------------------------------------------------------------
+# Description:
+# Writes a lossless compressed copy (.h5) of rogue .dat files. The copies can
+# be opened by the viewer and by the dataReader functions like the original
+# files.
+#
+# Example:
+#   python3 convert_dat_to_frameStore.py --compression gzip run1.dat run2.dat
+#
+#-----------------------------------------------------------------------------
+# This file is part of the ePix rogue. It is subject to
+# the license terms in the LICENSE.txt file found in the top-level directory
+# of this distribution and at:
+#    https://confluence.slac.stanford.edu/display/ppareg/LICENSE.html.
+# No part of the ePix rogue, including this file, may be
+# copied, modified, propagated, or distributed except according to the terms
+# contained in the LICENSE.txt file.
+#-----------------------------------------------------------------------------
+import setupLibPaths
+import os, sys, time
+import argparse
+import numpy as np
+import ePixViewer.dataReader as dataReader
+import ePixViewer.frameStore as frameStore
+
+# Set the argument parser
+parser = argparse.ArgumentParser()
+
+# Add arguments
+parser.add_argument(
+    "files",
+    type     = str,
+    nargs    = '+',
+    help     = "rogue .dat files to convert",
+)
+
+parser.add_argument(
+    "--compression",
+    type     = str,
+    required = False,
+    default  = 'lzf',
+    choices  = ['lzf', 'gzip'],
+    help     = "lzf (fast) or gzip (smaller)",
+)
+
+parser.add_argument(
+    "--level",
+    type     = int,
+    required = False,
+    default  = 4,
+    help     = "gzip compression level (1 to 9)",
+)
+
+parser.add_argument(
+    "--noVerify",
+    action   = 'store_true',
+    help     = "do not compare every frame of the store with the original file",
+)
+
+# Get the arguments
+args = parser.parse_args()
+
+for filename in args.files:
+    startTime = time.time()
+    storeFilename = frameStore.convertToFrameStore(filename, compression = args.compression, compressionLevel = args.level)
+    print("%s -> %s, %.1f MB -> %.1f MB in %.1f s" % (filename, storeFilename, os.path.getsize(filename)/1e6,
+          os.path.getsize(storeFilename)/1e6, time.time()-startTime))
+
+    if not args.noVerify:
+        original = dataReader.openFrameReader(filename)
+        store    = dataReader.openFrameReader(storeFilename)
+        for frameNumber in range(len(original)):
+            if not np.array_equal(original.frame(frameNumber, 'uint8'), store.frame(frameNumber, 'uint8')):
+                print("Frame", frameNumber, "differs")
+                break
+        else:
+            print("All", len(original), "frames verified")
+        original.close()
+        store.close()
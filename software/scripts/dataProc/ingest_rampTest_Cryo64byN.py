@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+#-----------------------------------------------------------------------------
+# Title      : parallel ramp test ingest
+#-----------------------------------------------------------------------------
+# File       : ingest_rampTest_Cryo64byN.py
+# Created    : 2026-10-18
+# Last update: 2026-10-18
+#-----------------------------------------------------------------------------
+# Description:
+# Converts the <root>_<i>.dat files written by fnRampTestCryo into a single
+# HDF5 file. The files are parsed and descrambled by a pool of worker
+# processes while the main process writes the images into one preallocated
+# [DAC step, frame, channel, sample] dataset, one chunk per DAC step.
+#
+# Example:
+#   python3 ingest_rampTest_Cryo64byN.py --path /data/rampTest/ --root T10_rampTest --steps 65536 --frames 4
+#
+#-----------------------------------------------------------------------------
+# This file is part of the ePix rogue. It is subject to
+# the license terms in the LICENSE.txt file found in the top-level directory
+# of this distribution and at:
+#    https://confluence.slac.stanford.edu/display/ppareg/LICENSE.html.
+# No part of the ePix rogue, including this file, may be
+# copied, modified, propagated, or distributed except according to the terms
+# contained in the LICENSE.txt file.
+#-----------------------------------------------------------------------------
+import setupLibPaths
+import os, sys, time
+import argparse
+import multiprocessing
+import numpy as np
+import ePixViewer.Cameras as cameras
+import ePixViewer.dataReader as dataReader
+import ePixViewer.imgStream as imgStream
+import h5py
+
+# Set the argument parser
+parser = argparse.ArgumentParser()
+
+# Add arguments
+parser.add_argument(
+    "--path",
+    type     = str,
+    required = True,
+    help     = "folder with the ramp test files",
+)
+
+parser.add_argument(
+    "--root",
+    type     = str,
+    required = True,
+    help     = "file name root, files are named <root>_<step>.dat",
+)
+
+parser.add_argument(
+    "--steps",
+    type     = int,
+    required = False,
+    default  = 65536,
+    help     = "number of DAC steps (files) of the ramp",
+)
+
+parser.add_argument(
+    "--frames",
+    type     = int,
+    required = False,
+    default  = 4,
+    help     = "number of frames kept for each DAC step",
+)
+
+parser.add_argument(
+    "--output",
+    type     = str,
+    required = False,
+    default  = "",
+    help     = "output hdf5 file (default <root>.hdf5)",
+)
+
+parser.add_argument(
+    "--workers",
+    type     = int,
+    required = False,
+    default  = multiprocessing.cpu_count(),
+    help     = "number of worker processes",
+)
+
+parser.add_argument(
+    "--cameraType",
+    type     = str,
+    required = False,
+    default  = 'cryo64xN',
+    help     = "camera type used to descramble the images",
+)
+
+parser.add_argument(
+    "--bitMask",
+    type     = lambda x: int(x,0),
+    required = False,
+    default  = 0xffff,
+    help     = "bit mask applied to the descrambled images",
+)
+
+##################################################
+# worker process
+##################################################
+currentCam = None
+
+def initWorker(cameraType, bitMask):
+    """creates one camera per worker process"""
+    global currentCam
+    currentCam = cameras.Camera(cameraType = cameraType)
+    currentCam.bitMask = bitMask
+
+def readStep(job):
+    """parses and descrambles the frames of one DAC step, returns (step, images)"""
+    step, filename, maxFrames = job
+    if not os.path.isfile(filename):
+        return step, None
+    # one small file per step read once: no index file is left in the (possibly shared) data directory
+    allFrames = dataReader.loadFrames(filename, channel = 1, maxFrames = maxFrames, useIndexFile = False)
+    imgDesc = imgStream.stackImages(imgStream.iterImageBatches(currentCam, allFrames, dtype = np.uint16))
+    if not len(imgDesc):
+        return step, None
+    return step, imgDesc
+
+##################################################
+# main process
+##################################################
+def getImageShape(args, cameraType, bitMask):
+    """descrambles the first readable step to get the [channel, sample] shape of the images"""
+    initWorker(cameraType, bitMask)
+    for step in range(args.steps):
+        filename = os.path.join(args.path, args.root + "_" + str(step) + ".dat")
+        step, imgDesc = readStep((step, filename, 1))
+        if imgDesc is not None:
+            return imgDesc.shape[1:]
+    return None
+
+def main():
+    args = parser.parse_args()
+    h5_filename = args.output if args.output else args.root + ".hdf5"
+
+    imgShape = getImageShape(args, args.cameraType, args.bitMask)
+    if imgShape is None:
+        print("No readable ramp test file found for", os.path.join(args.path, args.root))
+        return
+    print("Image shape", imgShape, ",", args.steps, "DAC steps,", args.frames, "frames per step")
+
+    jobs = [(step, os.path.join(args.path, args.root + "_" + str(step) + ".dat"), args.frames) for step in range(args.steps)]
+
+    f = h5py.File(h5_filename, "w")
+    # one chunk holds all frames of a DAC step so every write is a single chunk
+    adcData = f.create_dataset('adcData', shape = (args.steps, args.frames) + imgShape,
+                               chunks = (1, args.frames) + imgShape, dtype = 'uint16', fillvalue = 0)
+    # number of frames found for each DAC step (0 for missing or empty files)
+    numFrames = f.create_dataset('numFrames', shape = (args.steps,), dtype = 'uint16', fillvalue = 0)
+    adcData.attrs['cameraType'] = args.cameraType
+    adcData.attrs['bitMask']    = args.bitMask
+
+    startTime = time.time()
+    missing = 0
+    with multiprocessing.Pool(args.workers, initializer = initWorker, initargs = (args.cameraType, args.bitMask)) as pool:
+        for n, (step, imgDesc) in enumerate(pool.imap_unordered(readStep, jobs, chunksize = 16)):
+            if (imgDesc is None) or (imgDesc.shape[1:] != imgShape):
+                missing = missing + 1
+            else:
+                adcData[step, :imgDesc.shape[0]] = imgDesc
+                numFrames[step] = imgDesc.shape[0]
+            if ((n+1) % 1024 == 0):
+                print("%d of %d steps, %.1f steps/s" % (n+1, args.steps, (n+1)/(time.time()-startTime)))
+    f.close()
+
+    print("Saved", h5_filename, "in %.1f s," % (time.time()-startTime), missing, "steps missing or with unexpected shape")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+#-----------------------------------------------------------------------------
+# Title      : ramp and sine wave test linearity analysis
+#-----------------------------------------------------------------------------
+# File       : linearity_rampTest_Cryo64byN.py
+# Created    : 2026-10-18
+# Last update: 2026-10-18
+#-----------------------------------------------------------------------------
+# Description:
+# Code density DNL/INL analysis of the cryo ADCs. The data is read from the
+# <root>_<step>.dat files of a ramp test, from the HDF5 file written by
+# ingest_rampTest_Cryo64byN.py or from a list of .dat files (e.g. sine wave
+# captures). Groups of steps/files are analysed by a pool of worker processes
+# and the partial histograms are merged, so only one histogram per worker is
+# held in memory. The histograms and the results (DNL, INL, missing codes,
+# transfer curve fit against the DAC step) are written to HDF5.
+#
+# Example:
+#   python3 linearity_rampTest_Cryo64byN.py --path /data/rampTest/ --root T10_rampTest --steps 65536
+#   python3 linearity_rampTest_Cryo64byN.py --input T10_rampTest.hdf5
+#   python3 linearity_rampTest_Cryo64byN.py --files sine_*.dat --signal sine --output sine_linearity.hdf5
+#
+#-----------------------------------------------------------------------------
+# This file is part of the ePix rogue. It is subject to
+# the license terms in the LICENSE.txt file found in the top-level directory
+# of this distribution and at:
+#    https://confluence.slac.stanford.edu/display/ppareg/LICENSE.html.
+# No part of the ePix rogue, including this file, may be
+# copied, modified, propagated, or distributed except according to the terms
+# contained in the LICENSE.txt file.
+#-----------------------------------------------------------------------------
+import setupLibPaths
+import os, sys, time
+import argparse
+import multiprocessing
+import numpy as np
+import ePixViewer.Cameras as cameras
+import ePixViewer.imgStream as imgStream
+import ePixViewer.linearity as linearity
+import h5py
+
+# Set the argument parser
+parser = argparse.ArgumentParser()
+
+# Add arguments
+parser.add_argument(
+    "--path",
+    type     = str,
+    required = False,
+    default  = "",
+    help     = "folder with the ramp test files",
+)
+
+parser.add_argument(
+    "--root",
+    type     = str,
+    required = False,
+    default  = "",
+    help     = "file name root, files are named <root>_<step>.dat",
+)
+
+parser.add_argument(
+    "--steps",
+    type     = int,
+    required = False,
+    default  = 65536,
+    help     = "number of DAC steps (files) of the ramp",
+)
+
+parser.add_argument(
+    "--input",
+    type     = str,
+    required = False,
+    default  = "",
+    help     = "hdf5 file written by ingest_rampTest_Cryo64byN.py",
+)
+
+parser.add_argument(
+    "--files",
+    type     = str,
+    nargs    = '+',
+    required = False,
+    default  = [],
+    help     = "data files analysed without DAC step (no transfer curve fit)",
+)
+
+parser.add_argument(
+    "--signal",
+    type     = str,
+    required = False,
+    default  = 'ramp',
+    choices  = linearity.SIGNALS,
+    help     = "input signal of the test",
+)
+
+parser.add_argument(
+    "--numBits",
+    type     = int,
+    required = False,
+    default  = 16,
+    help     = "ADC resolution",
+)
+
+parser.add_argument(
+    "--output",
+    type     = str,
+    required = False,
+    default  = "",
+    help     = "output hdf5 file (default <root>_linearity.hdf5)",
+)
+
+parser.add_argument(
+    "--workers",
+    type     = int,
+    required = False,
+    default  = multiprocessing.cpu_count(),
+    help     = "number of worker processes",
+)
+
+parser.add_argument(
+    "--stepsPerJob",
+    type     = int,
+    required = False,
+    default  = 256,
+    help     = "number of steps (files) analysed by a worker before its histogram is merged",
+)
+
+parser.add_argument(
+    "--cameraType",
+    type     = str,
+    required = False,
+    default  = 'cryo64xN',
+    help     = "camera type used to descramble the images",
+)
+
+parser.add_argument(
+    "--bitMask",
+    type     = lambda x: int(x,0),
+    required = False,
+    default  = 0xffff,
+    help     = "bit mask applied to the descrambled images",
+)
+
+##################################################
+# worker process
+##################################################
+currentCam = None
+workerArgs = None
+
+def initWorker(args):
+    """creates one camera per worker process"""
+    global currentCam, workerArgs
+    workerArgs = args
+    currentCam = cameras.Camera(cameraType = args.cameraType)
+    currentCam.bitMask = args.bitMask
+
+def newAnalysis(numChannels):
+    return linearity.LinearityAnalysis(numChannels = numChannels, numBits = workerArgs.numBits, signal = workerArgs.signal)
+
+def analyseFiles(job):
+    """histograms a group of .dat files, job is a list of (DAC step or None, file name)"""
+    analysis = None
+    for step, filename in job:
+        if not os.path.isfile(filename):
+            continue
+        # read once, no index file is written into the ramp data directory
+        for batch in imgStream.iterImageBatchesFromFile(currentCam, filename, dtype = np.uint16, useIndexFile = False):
+            if analysis is None:
+                analysis = newAnalysis(batch.shape[1])
+            analysis.update(batch, stimulus = step)
+    return analysis
+
+def analyseHdf5Steps(job):
+    """histograms a range of DAC steps of an ingested ramp test"""
+    start, stop = job
+    analysis = None
+    with h5py.File(workerArgs.input, 'r') as f:
+        adcData = f['adcData']
+        numFrames = f['numFrames'][start:stop]
+        for n in range(stop - start):
+            if (numFrames[n] == 0):
+                continue
+            if analysis is None:
+                analysis = newAnalysis(adcData.shape[2])
+            # one chunk per DAC step
+            analysis.update(adcData[start + n, :numFrames[n]], stimulus = start + n)
+    return analysis
+
+##################################################
+# main process
+##################################################
+def makeJobs(args):
+    """returns the worker function, its jobs and the default output name"""
+    if args.input:
+        with h5py.File(args.input, 'r') as f:
+            args.steps = min(args.steps, f['adcData'].shape[0])
+        jobs = [(start, min(start + args.stepsPerJob, args.steps)) for start in range(0, args.steps, args.stepsPerJob)]
+        return analyseHdf5Steps, jobs, os.path.splitext(args.input)[0]
+    if args.files:
+        files = [(None, filename) for filename in args.files]
+        root = os.path.splitext(args.files[0])[0]
+    else:
+        files = [(step, os.path.join(args.path, args.root + "_" + str(step) + ".dat")) for step in range(args.steps)]
+        root = args.root
+    jobs = [files[start:start + args.stepsPerJob] for start in range(0, len(files), args.stepsPerJob)]
+    return analyseFiles, jobs, root
+
+def main():
+    args = parser.parse_args()
+    if not (args.input or args.files or args.root):
+        parser.error("one of --input, --files or --root is required")
+
+    worker, jobs, root = makeJobs(args)
+    h5_filename = args.output if args.output else root + "_linearity.hdf5"
+
+    startTime = time.time()
+    analysis = None
+    with multiprocessing.Pool(args.workers, initializer = initWorker, initargs = (args,)) as pool:
+        for n, partial in enumerate(pool.imap_unordered(worker, jobs)):
+            if partial is not None:
+                analysis = partial if analysis is None else analysis.merge(partial)
+            print("%d of %d jobs, %.1f s" % (n+1, len(jobs), time.time()-startTime))
+    if analysis is None:
+        print("No data found")
+        return
+
+    with h5py.File(h5_filename, 'a') as f:
+        group = analysis.toHdf5(f)
+        group.attrs['cameraType'] = args.cameraType
+    results = analysis.results()
+
+    print("%8s %10s %10s %8s %8s %8s %10s" % ("channel", "first", "last", "missing", "max DNL", "max INL", "gain"))
+    for channel in range(analysis.numChannels):
+        print("%8d %10d %10d %8d %8.3f %8.3f %10.4f" % (channel, results['firstCode'][channel], results['lastCode'][channel],
+              results['numMissingCodes'][channel], results['maxDnl'][channel], results['maxInl'][channel], results['gain'][channel]))
+    print("Saved", h5_filename, "in %.1f s" % (time.time()-startTime))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+#-----------------------------------------------------------------------------
+# Title      : noise spectrum report
+#-----------------------------------------------------------------------------
+# File       : noise_spectrum_report.py
+# Created    : 2026-10-18
+# Last update: 2026-10-18
+#-----------------------------------------------------------------------------
+# Description:
+# Welch noise power spectrum of every channel of a run (cryo64xN by default).
+# The spectrum is computed batch by batch from the file and kept in the data
+# cache, so a report of the same run with the same parameters is immediate.
+# Prints the rms noise and the strongest pickup lines of each channel and
+# saves a plot of the spectra.
+#
+# Example:
+#   python3 noise_spectrum_report.py --file run.dat --sampleRate 2.24e8 --segmentLength 1024
+#
+#-----------------------------------------------------------------------------
+# This file is part of the ePix rogue. It is subject to
+# the license terms in the LICENSE.txt file found in the top-level directory
+# of this distribution and at:
+#    https://confluence.slac.stanford.edu/display/ppareg/LICENSE.html.
+# No part of the ePix rogue, including this file, may be
+# copied, modified, propagated, or distributed except according to the terms
+# contained in the LICENSE.txt file.
+#-----------------------------------------------------------------------------
+import setupLibPaths
+import os, sys, time
+import argparse
+import numpy as np
+import ePixViewer.Cameras as cameras
+import ePixViewer.dataCache as dataCache
+import ePixViewer.noiseSpectrum as noiseSpectrum
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+
+# Set the argument parser
+parser = argparse.ArgumentParser()
+
+# Add arguments
+parser.add_argument(
+    "--file",
+    type     = str,
+    required = True,
+    help     = "rogue data file or frame store",
+)
+
+parser.add_argument(
+    "--cameraType",
+    type     = str,
+    required = False,
+    default  = 'cryo64xN',
+    help     = "camera type used to descramble the images",
+)
+
+parser.add_argument(
+    "--bitMask",
+    type     = lambda x: int(x,0),
+    required = False,
+    default  = 0xffff,
+    help     = "bit mask applied to the descrambled images",
+)
+
+parser.add_argument(
+    "--channel",
+    type     = int,
+    required = False,
+    default  = 1,
+    help     = "data channel (virtual channel) of the images",
+)
+
+parser.add_argument(
+    "--segmentLength",
+    type     = int,
+    required = False,
+    default  = None,
+    help     = "samples per Welch segment (default whole frames)",
+)
+
+parser.add_argument(
+    "--overlap",
+    type     = float,
+    required = False,
+    default  = 0.5,
+    help     = "overlap of the Welch segments",
+)
+
+parser.add_argument(
+    "--sampleRate",
+    type     = float,
+    required = False,
+    default  = 1.0,
+    help     = "sample rate in Hz (default frequencies in 1/sample)",
+)
+
+parser.add_argument(
+    "--numLines",
+    type     = int,
+    required = False,
+    default  = 3,
+    help     = "number of pickup lines reported per channel",
+)
+
+parser.add_argument(
+    "--output",
+    type     = str,
+    required = False,
+    default  = "",
+    help     = "plot file (default <file>_noiseSpectrum.png)",
+)
+
+##################################################
+# main
+##################################################
+def main():
+    args = parser.parse_args()
+    output = args.output if args.output else os.path.splitext(args.file)[0] + "_noiseSpectrum.png"
+
+    currentCam = cameras.Camera(cameraType = args.cameraType)
+    currentCam.bitMask = args.bitMask
+
+    startTime = time.time()
+    [frequencies, psd] = dataCache.cachedNoiseSpectrum(currentCam, args.file, segmentLength = args.segmentLength, overlap = args.overlap,
+                                                       sampleRate = args.sampleRate, channel = args.channel)
+    if psd is None:
+        print("No image found in", args.file)
+        return
+    print("Noise spectrum of", psd.shape[0], "channels,", len(frequencies), "bins, %.1f s" % (time.time()-startTime))
+
+    noise = noiseSpectrum.integratedNoise(frequencies, psd)
+    lineFrequencies, lineHeights = noiseSpectrum.pickupLines(frequencies, psd, args.numLines)
+    print("%8s %10s   %s" % ("channel", "rms", "pickup lines (frequency: height over baseline)"))
+    for channel in range(psd.shape[0]):
+        lines = "  ".join("%.4g: %.1f" % (f, h) for f, h in zip(lineFrequencies[channel], lineHeights[channel]))
+        print("%8d %10.3f   %s" % (channel, noise[channel], lines))
+
+    # spectra of all channels and the mean spectrum
+    unit = 'Hz' if (args.sampleRate != 1.0) else '1/sample'
+    fig, (ax1, ax2) = plt.subplots(2, 1, figsize = (10, 8))
+    ax1.semilogy(frequencies[1:], psd[:, 1:].T, linewidth = 0.5)
+    ax1.semilogy(frequencies[1:], np.mean(psd[:, 1:], axis = 0), 'k', linewidth = 1.5)
+    ax1.set_xlabel('Frequency (' + unit + ')')
+    ax1.set_ylabel('PSD (ADU^2/' + unit + ')')
+    ax1.set_title('Noise spectrum of ' + os.path.basename(args.file))
+    ax1.grid()
+    image = ax2.imshow(np.log10(psd[:, 1:]), aspect = 'auto', origin = 'lower', interpolation = 'nearest',
+                       extent = [frequencies[1], frequencies[-1], -0.5, psd.shape[0] - 0.5])
+    ax2.set_xlabel('Frequency (' + unit + ')')
+    ax2.set_ylabel('Channel')
+    fig.colorbar(image, ax = ax2, label = 'log10 PSD')
+    fig.tight_layout()
+    fig.savefig(output)
+    print("Saved", output)
+
+if __name__ == "__main__":
+    main()
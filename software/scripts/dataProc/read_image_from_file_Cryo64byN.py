@@ -23,6 +23,9 @@ import os, sys, time
 import numpy as np
 import ePixViewer.Cameras as cameras
 import ePixViewer.imgProcessing as imgPr
+import ePixViewer.dataReader as dataReader
+import ePixViewer.imgStream as imgStream
+import ePixViewer.dataCache as dataCache
 # 
 import matplotlib   
 matplotlib.use('QT4Agg')
@@ -51,6 +54,7 @@ PLOT_SET_HISTOGRAM    = False
 PLOT_ADC_VS_N         = False
 SAVEHDF5              = True
 SAVECSV               = False
+USE_CACHE             = True
 
 ##################################################
 # Dark images
@@ -60,90 +64,46 @@ if (len(sys.argv[1])>0):
 else:
     filename = ''
 
-f = open(filename, mode = 'rb')
-
-file_header = [0]
-numberOfFrames = 0
-previousSize = 0
-while ((len(file_header)>0) and ((numberOfFrames<MAX_NUMBER_OF_FRAMES_PER_BATCH) or (MAX_NUMBER_OF_FRAMES_PER_BATCH==-1))):
-    try:
-        # reads file header [the number of bytes to read, EVIO]
-        file_header = np.fromfile(f, dtype='uint32', count=2)
-        print("header 0: ", file_header[0])
-        print("header 1: ", (file_header[1]&0xff000000)>>24)
-        payloadSize = int(file_header[0]/4)-1 #-1 is need because size info includes the second word from the header
-
-        newPayload = np.fromfile(f, dtype='uint32', count=payloadSize) #(frame size splited by four to read 32 bit 
-        print ("Payload" , numberOfFrames, ":",  (newPayload[0:5]))
-        #save only serial data frames
-        if ((file_header[1]&0xff000000)>>24)==1: #image packet only, 2 mean scope data
-            if (numberOfFrames == 0):
-                allFrames = [newPayload.copy()]
-            else:
-                newFrame  = [newPayload.copy()]
-                allFrames = np.append(allFrames, newFrame, axis = 0)
-            numberOfFrames = numberOfFrames + 1 
-            print ("Payload" , numberOfFrames, ":",  (newPayload[0:5]))
-            previousSize = file_header
-
-        if (numberOfFrames%1000==0):
-            print("Read %d frames" % numberOfFrames)
-
-    except Exception: 
-        e = sys.exc_info()[0]
-        #print ("Message\n", e)
-        print ('size', file_header, 'previous size', previousSize)
-        print("numberOfFrames read: " ,numberOfFrames)
-
+currentCam = cameras.Camera(cameraType = cameraType)
+currentCam.bitMask = bitMask
 
 ##################################################
-# image descrambling
+# image descrambling, batch by batch
 ##################################################
-currentCam = cameras.Camera(cameraType = cameraType)
-currentCam.bitMask = bitMask
-#numberOfFrames = allFrames.shape[0]
-print("numberOfFrames in the 3D array: " ,numberOfFrames)
-print("Starting descrambling images")
-currentRawData = []
-imgDesc = []
-if(numberOfFrames==1):
-    [frameComplete, readyForDisplay, rawImgFrame] = currentCam.buildImageFrame(currentRawData = [], newRawData = allFrames[0])
-    imgDesc = np.array([currentCam.descrambleImage(bytearray(rawImgFrame.tobytes()))])
-else:
-    for i in range(0, numberOfFrames):
-        #get an specific frame
-        [frameComplete, readyForDisplay, rawImgFrame] = currentCam.buildImageFrame(currentRawData, newRawData = allFrames[i,:])
-        currentRawData = rawImgFrame
-
-        #get descrambled image from camera
-        if (len(imgDesc)==0 and (readyForDisplay)):
-            imgDesc = np.array([currentCam.descrambleImage(rawImgFrame)],dtype=np.float)
-            currentRawData = []
-        else:
-            if readyForDisplay:
-                currentRawData = []
-                newImage = currentCam.descrambleImage(rawImgFrame)
-                newImage = newImage.astype(np.float, copy=False)
-                #if (np.sum(np.sum(newImage))==0):
-                #    newImage[np.where(newImage==0)]=np.nan
-                imgDesc = np.concatenate((imgDesc, np.array([newImage])),0)
+def imageBatches():
+    """descrambled images of the file in [images, channels, samples] batches, the whole stack is never in memory"""
+    if (USE_CACHE and MAX_NUMBER_OF_FRAMES_PER_BATCH < 0):
+        # decoded once, later runs on the same file map the native uint16 images from the local cache
+        return imgStream.iterStackSlices(dataCache.cachedImages(currentCam, filename, channel = 1, mmapMode = 'r'))
+    # runs of image frames (channel 1) are descrambled straight from the mapped file
+    return imgStream.iterImageBatchesFromFile(currentCam, filename, channel = 1, maxFrames = MAX_NUMBER_OF_FRAMES_PER_BATCH)
+
 if(SAVEHDF5):
     print("Saving Hdf5")
     h5_filename = os.path.splitext(filename)[0]+".hdf5"
     f = h5py.File(h5_filename, "w")
-    f['adcData'] = imgDesc.astype('uint16')
+    imgStream.batchToHdf5(imageBatches(), f, 'adcData')
     f.close()
-if(SAVECSV):    
-    for runNum in range(imgDesc.shape[0]):
-        np.savetxt(os.path.splitext(filename)[0] + "_runNum" + str(runNum) + "_traces" + ".csv", imgDesc[runNum,:,:], fmt='%d', delimiter=',', newline='\n')
+if(SAVECSV):
+    runNum = 0
+    for batch in imageBatches():
+        for image in batch:
+            np.savetxt(os.path.splitext(filename)[0] + "_runNum" + str(runNum) + "_traces" + ".csv", image, fmt='%d', delimiter=',', newline='\n')
+            runNum = runNum + 1
 
 ##################################################
-#from here on we have a set of images to work with
+#from here on only the images and time series that are plotted are kept
 ##################################################
+standAloneADCPlot = 5
+firstImage = imgStream.batchImages(imageBatches(), [0])[0]
+# pixel (0,15) and (0,5) time series, column 5 and column standAloneADCPlot of every image
+[pixelTraces, column5, adcColumn] = imgStream.batchSelect(imageBatches(), lambda batch: (batch[:, 0, [15, 5]], batch[:, :, 5], batch[:, :, standAloneADCPlot]))
+numberOfImages = len(adcColumn)
+print("images read: " ,numberOfImages)
+
 if PLOT_ADC9_VS_N :
     # All averages
-    i=0
-    plt.plot(imgDesc[i,10,:])
+    plt.plot(firstImage[10,:])
     plt.title('ADC value')
     plt.show()
 
@@ -151,10 +111,10 @@ if PLOT_ADC9_VS_N :
     plt.figure(1)
     plt.subplot(211)
     plt.title('Average ADC value')
-    plt.plot(np.transpose(imgDesc[i,0:31,:]))
+    plt.plot(np.transpose(firstImage[0:31,:]))
 
     plt.subplot(212)
-    plt.plot(np.transpose(imgDesc[i,32:63,:]))
+    plt.plot(np.transpose(firstImage[32:63,:]))
     plt.title('Standard deviation of the ADC value')
     plt.show()
 
@@ -162,18 +122,22 @@ if PLOT_ADC9_VS_N :
 
 #show first image
 if PLOT_IMAGE :
-    for i in range(0, 1):
-        plt.imshow(imgDesc[i,:,:], interpolation='nearest')
-        plt.gray()
-        plt.colorbar()
-        plt.title('First image of :'+filename)
-        plt.show()
-    plt.plot(imgDesc[:,0,15])
-    plt.plot(imgDesc[:,0,5])
+    plt.imshow(firstImage, interpolation='nearest')
+    plt.gray()
+    plt.colorbar()
+    plt.title('First image of :'+filename)
+    plt.show()
+    plt.plot(pixelTraces[:,0])
+    plt.plot(pixelTraces[:,1])
     plt.title('Pixel time series (15,15) and (15,45) :'+filename)
     plt.show()
 
-darkImg = np.mean(imgDesc, axis=0)
+# per pixel mean and noise with the running estimator, one batch of images at a time
+if (USE_CACHE and MAX_NUMBER_OF_FRAMES_PER_BATCH < 0):
+    # streamed from the file once, later runs read them from the local cache
+    [darkImg, heatMap] = dataCache.cachedMeanStd(currentCam, filename, channel = 1)
+else:
+    [darkImg, heatMap] = imgStream.batchMeanStd(imageBatches())
 print(darkImg.shape)
 
 
@@ -184,7 +148,6 @@ if PLOT_IMAGE_DARK :
     plt.title('Dark image map of :'+filename)
     plt.show()
 
-heatMap = np.std(imgDesc, axis=0)
 if PLOT_IMAGE_HEATMAP :
     plt.imshow(heatMap, interpolation='nearest', vmin=0, vmax=200)
     plt.gray()
@@ -192,15 +155,12 @@ if PLOT_IMAGE_HEATMAP :
     plt.title('Heat map of :'+filename)
     plt.show()
 
-darkSub = imgDesc - darkImg
 if PLOT_IMAGE_DARKSUB :
-    for i in range(0, 1):
-        #plt.imshow(darkSub[i,:,0:31], interpolation='nearest')
-        plt.imshow(darkSub[i,:,:], interpolation='nearest')
-        plt.gray()
-        plt.colorbar()
-        plt.title('First image of :'+filename)
-        plt.show()
+    plt.imshow(firstImage - darkImg, interpolation='nearest')
+    plt.gray()
+    plt.colorbar()
+    plt.title('First image of :'+filename)
+    plt.show()
 
 
 
@@ -209,41 +169,31 @@ centralValue = 0
 if PLOT_SET_HISTOGRAM :
     nbins = 100
     EnergyTh = -50
-    n = np.zeros(nbins)
-    for i in range(0, imgDesc.shape[0]):
-    #    n, bins, patches = plt.hist(darkSub[5,:,:], bins=256, range=(0.0, 256.0), fc='k', ec='k')
-    #    [x,y] = np.where(darkSub[i,:,32:63]>EnergyTh)
-    #   h, b = np.histogram(darkSub[i,x,y], np.arange(-nbins/2,nbins/2+1))
-    #    h, b = np.histogram(np.average(darkSub[i,:,5]), np.arange(-nbins/2,nbins/2+1))
-        dataSet = darkSub[i,:,5]
-        h, b = np.histogram(np.average(dataSet), np.arange(centralValue-nbins/2,centralValue+nbins/2+1))
-        n = n + h
+    # histogram of the frame averages of column 5, all frames in one update
+    histogram = imgPr.HistogramAccumulator(1, numCodes = nbins, minCode = centralValue-nbins/2, channelAxis = -1)
+    histogram.update((np.average(column5, axis=1) - np.average(darkImg[:,5]))[:,None])
+    n = histogram.counts[0]
+    b = histogram.binEdges()[0]
 
     plt.bar(b[1:nbins+1],n, width = 0.55)
     plt.title('Histogram')
     plt.show()
 
 
-standAloneADCPlot = 5
-centralValue_even = np.average(imgDesc[0,np.arange(0,32,2),standAloneADCPlot])
-centralValue_odd  = np.average(imgDesc[0,np.arange(1,32,2),standAloneADCPlot])
+centralValue_even = np.average(firstImage[np.arange(0,32,2),standAloneADCPlot])
+centralValue_odd  = np.average(firstImage[np.arange(1,32,2),standAloneADCPlot])
 # the histogram of the data
 if PLOT_SET_HISTOGRAM :
     nbins = 100
     EnergyTh = -50
-    n_even = np.zeros(nbins)
-    n_odd  = np.zeros(nbins)
-    for i in range(0, imgDesc.shape[0]):
-    #    n, bins, patches = plt.hist(darkSub[5,:,:], bins=256, range=(0.0, 256.0), fc='k', ec='k')
-    #    [x,y] = np.where(darkSub[i,:,32:63]>EnergyTh)
-    #   h, b = np.histogram(darkSub[i,x,y], np.arange(-nbins/2,nbins/2+1))
-    #    h, b = np.histogram(np.average(darkSub[i,:,5]), np.arange(-nbins/2,nbins/2+1))
-        h, b = np.histogram(np.average(imgDesc[i,np.arange(0,32,2),standAloneADCPlot]), np.arange(centralValue_even-nbins/2,centralValue_even+nbins/2+1))
-        n_even = n_even + h
-        h, b = np.histogram(np.average(imgDesc[i,np.arange(1,32,2),standAloneADCPlot]), np.arange(centralValue_odd-nbins/2,centralValue_odd+nbins/2+1))
-        n_odd = n_odd + h
-
-    np.savez("adc_" + str(standAloneADCPlot), imgDesc[:,:,standAloneADCPlot])
+    # even and odd row averages of the ADC, one histogram channel each
+    histogram = imgPr.HistogramAccumulator(2, numCodes = nbins, minCode = [centralValue_even-nbins/2, centralValue_odd-nbins/2], channelAxis = -1)
+    histogram.update(np.stack((np.average(adcColumn[:,np.arange(0,32,2)], axis=1),
+                               np.average(adcColumn[:,np.arange(1,32,2)], axis=1)), axis=1))
+    [n_even, n_odd] = histogram.counts
+    b = histogram.binEdges()[1]
+
+    np.savez("adc_" + str(standAloneADCPlot), adcColumn)
 
     plt.bar(b[1:nbins+1],n_even, width = 0.55)
     plt.bar(b[1:nbins+1],n_odd,  width = 0.55,color='red')
@@ -252,12 +202,11 @@ if PLOT_SET_HISTOGRAM :
 
 
 numColumns = 64
-averages = np.zeros([imgDesc.shape[0],numColumns])
-noises   = np.zeros([imgDesc.shape[0],numColumns])
+averages = np.zeros([numberOfImages,numColumns])
+noises   = np.zeros([numberOfImages,numColumns])
 if PLOT_ADC_VS_N :
-    for i in range(0, imgDesc.shape[0]):
-        averages[i] = np.mean(imgDesc[i], axis=0)
-        noises[i]   = np.std(imgDesc[i], axis=0)
+    # mean and standard deviation of each image column, batch by batch
+    [averages, noises] = imgStream.batchSelect(imageBatches(), lambda batch: (np.mean(batch, axis=1), np.std(batch, axis=1)))
 
     #rolls matrix to enable dnl[n] = averages[n+1] - averages[n]
     dnls = np.roll(averages,-1, axis=0) - averages
@@ -23,6 +23,8 @@ import os, sys, time
 import numpy as np
 import ePixViewer.Cameras as cameras
 import ePixViewer.imgProcessing as imgPr
+import ePixViewer.dataReader as dataReader
+import ePixViewer.imgStream as imgStream
 # 
 import matplotlib   
 matplotlib.use('QT4Agg')
@@ -59,106 +61,54 @@ if (len(sys.argv[1])>0):
 else:
     filename = ''
 
-f = open(filename, mode = 'rb')
-
-file_header = [0]
-numberOfFrames = 0
-while ((len(file_header)>0) and ((numberOfFrames<MAX_NUMBER_OF_FRAMES_PER_BATCH) or (MAX_NUMBER_OF_FRAMES_PER_BATCH==-1))):
-    try:
-        # reads file header [the number of bytes to read, EVIO]
-        file_header = np.fromfile(f, dtype='uint32', count=2)
-        payloadSize = int(file_header[0]/4)-1 #-1 is need because size info includes the second word from the header
-        if ((GET_SERIAL_OR_TS_DATA == True) and (file_header[0] != PAYLOAD_SERIAL_FRAME)):
-            print ('size',  file_header)
-            pause(1)
-
-        #save only serial data frames
-        if ((GET_SERIAL_OR_TS_DATA == True) and (file_header[0] == PAYLOAD_SERIAL_FRAME)):
-            newPayload = np.fromfile(f, dtype='uint32', count=payloadSize) #(frame size splited by four to read 32 bit 
-            if (numberOfFrames == 0):
-                allFrames = [newPayload.copy()]
-            else:
-                newFrame  = [newPayload.copy()]
-                allFrames = np.append(allFrames, newFrame, axis = 0)
-            numberOfFrames = numberOfFrames + 1 
-            #print ("Payload" , numberOfFrames, ":",  (newPayload[0:5]))
-            previousSize = file_header
-        #save only TS data frames
-        if ((GET_SERIAL_OR_TS_DATA == False) and (file_header[0] == PAYLOAD_TS)):
-            newPayload = np.fromfile(f, dtype='uint32', count=payloadSize) #(frame size splited by four to read 32 bit 
-            if (numberOfFrames == 0):
-                allFrames = [newPayload.copy()]
-            else:
-                newFrame  = [newPayload.copy()]
-                allFrames = np.append(allFrames, newFrame, axis = 0)
-            numberOfFrames = numberOfFrames + 1 
-            #print ("Payload" , numberOfFrames, ":",  (newPayload[0:5]))
-            previousSize = file_header
-        if (numberOfFrames%1000==0):
-            print("Read %d frames" % numberOfFrames)
-
-    except Exception: 
-        e = sys.exc_info()[0]
-        print ("Message\n", e)
-        print ('size', file_header, 'previous size', previousSize)
-        print("numberOfFrames read: " ,numberOfFrames)
+# selects either all serial or all TS data frames
+if (GET_SERIAL_OR_TS_DATA == True):
+    payloadSize = PAYLOAD_SERIAL_FRAME - 4 #-4 is need because size info includes the second word from the header
+else:
+    payloadSize = PAYLOAD_TS - 4
 
 
 ##################################################
-# image descrambling
+# image descrambling, batch by batch
 ##################################################
 currentCam = cameras.Camera(cameraType = cameraType)
 currentCam.bitMask = bitMask
-#numberOfFrames = allFrames.shape[0]
-print("numberOfFrames in the 3D array: " ,numberOfFrames)
-print("Starting descrambling images")
-currentRawData = []
-imgDesc = []
-if(numberOfFrames==1):
-    [frameComplete, readyForDisplay, rawImgFrame] = currentCam.buildImageFrame(currentRawData = [], newRawData = allFrames[0])
-    imgDesc = np.array([currentCam.descrambleImage(bytearray(rawImgFrame.tobytes()))])
-else:
-    for i in range(0, numberOfFrames):
-        #get an specific frame
-        [frameComplete, readyForDisplay, rawImgFrame] = currentCam.buildImageFrame(currentRawData, newRawData = allFrames[i,:])
-        currentRawData = rawImgFrame
-
-        #get descrambled image from camera
-        if (len(imgDesc)==0 and (readyForDisplay)):
-            imgDesc = np.array([currentCam.descrambleImage(rawImgFrame)],dtype=np.float)
-            currentRawData = []
-        else:
-            if readyForDisplay:
-                currentRawData = []
-                newImage = currentCam.descrambleImage(rawImgFrame)
-                newImage = newImage.astype(np.float, copy=False)
-                #if (np.sum(np.sum(newImage))==0):
-                #    newImage[np.where(newImage==0)]=np.nan
-                imgDesc = np.concatenate((imgDesc, np.array([newImage])),0)
+
+def imageBatches():
+    """descrambled images of the selected frames in batches, the whole stack is never in memory"""
+    return imgStream.iterImageBatchesFromFile(currentCam, filename, channel = None, payloadSize = payloadSize, maxFrames = MAX_NUMBER_OF_FRAMES_PER_BATCH)
+
 if(SAVEHDF5):
     print("Saving Hdf5")
     h5_filename = os.path.splitext(filename)[0]+".hdf5"
     f = h5py.File(h5_filename, "w")
-    f['hrAdc'] = imgDesc.astype('uint16')
+    imgStream.batchToHdf5(imageBatches(), f, 'hrAdc')
     f.close()
 
 ##################################################
-#from here on we have a set of images to work with
+#from here on only the images and time series that are plotted are kept
 ##################################################
+standAloneADCPlot = 45
+firstImage = imgStream.batchImages(imageBatches(), [0])[0]
+# pixel (15,15) and (15,45) time series, column 5 and column standAloneADCPlot of every image
+[pixelTraces, column5, adcColumn] = imgStream.batchSelect(imageBatches(), lambda batch: (batch[:, 15, [15, 45]], batch[:, :, 5], batch[:, :, standAloneADCPlot]))
+numberOfImages = len(adcColumn)
+print("images read: " ,numberOfImages)
+
 #show first image
 if PLOT_IMAGE :
-    for i in range(0, 1):
-        plt.imshow(imgDesc[i,:,:], interpolation='nearest')
-        plt.gray()
-        plt.colorbar()
-        plt.title('First image of :'+filename)
-        plt.show()
-    plt.plot(imgDesc[:,15,15])
-    plt.plot(imgDesc[:,15,45])
+    plt.imshow(firstImage, interpolation='nearest')
+    plt.gray()
+    plt.colorbar()
+    plt.title('First image of :'+filename)
+    plt.show()
+    plt.plot(pixelTraces[:,0])
+    plt.plot(pixelTraces[:,1])
     plt.title('Pixel time series (15,15) and (15,45) :'+filename)
     plt.show()
 
-darkImg = np.mean(imgDesc, axis=0)
+# per pixel mean and noise with the running estimator, one batch of images at a time
+[darkImg, heatMap] = imgStream.batchMeanStd(imageBatches())
 print(darkImg.shape)
 
 
@@ -169,7 +119,6 @@ if PLOT_IMAGE_DARK :
     plt.title('Dark image map of :'+filename)
     plt.show()
 
-heatMap = np.std(imgDesc, axis=0)
 if PLOT_IMAGE_HEATMAP :
     plt.imshow(heatMap, interpolation='nearest', vmin=0, vmax=200)
     plt.gray()
@@ -177,15 +126,12 @@ if PLOT_IMAGE_HEATMAP :
     plt.title('Heat map of :'+filename)
     plt.show()
 
-darkSub = imgDesc - darkImg
 if PLOT_IMAGE_DARKSUB :
-    for i in range(0, 1):
-        #plt.imshow(darkSub[i,:,0:31], interpolation='nearest')
-        plt.imshow(darkSub[i,:,:], interpolation='nearest')
-        plt.gray()
-        plt.colorbar()
-        plt.title('First image of :'+filename)
-        plt.show()
+    plt.imshow(firstImage - darkImg, interpolation='nearest')
+    plt.gray()
+    plt.colorbar()
+    plt.title('First image of :'+filename)
+    plt.show()
 
 
 
@@ -194,41 +140,31 @@ centralValue = 0
 if PLOT_SET_HISTOGRAM :
     nbins = 100
     EnergyTh = -50
-    n = np.zeros(nbins)
-    for i in range(0, imgDesc.shape[0]):
-    #    n, bins, patches = plt.hist(darkSub[5,:,:], bins=256, range=(0.0, 256.0), fc='k', ec='k')
-    #    [x,y] = np.where(darkSub[i,:,32:63]>EnergyTh)
-    #   h, b = np.histogram(darkSub[i,x,y], np.arange(-nbins/2,nbins/2+1))
-    #    h, b = np.histogram(np.average(darkSub[i,:,5]), np.arange(-nbins/2,nbins/2+1))
-        dataSet = darkSub[i,:,5]
-        h, b = np.histogram(np.average(dataSet), np.arange(centralValue-nbins/2,centralValue+nbins/2+1))
-        n = n + h
+    # histogram of the frame averages of column 5, all frames in one update
+    histogram = imgPr.HistogramAccumulator(1, numCodes = nbins, minCode = centralValue-nbins/2, channelAxis = -1)
+    histogram.update((np.average(column5, axis=1) - np.average(darkImg[:,5]))[:,None])
+    n = histogram.counts[0]
+    b = histogram.binEdges()[0]
 
     plt.bar(b[1:nbins+1],n, width = 0.55)
     plt.title('Histogram')
     plt.show()
 
 
-standAloneADCPlot = 45
-centralValue_even = np.average(imgDesc[0,np.arange(0,32,2),standAloneADCPlot])
-centralValue_odd  = np.average(imgDesc[0,np.arange(1,32,2),standAloneADCPlot])
+centralValue_even = np.average(firstImage[np.arange(0,32,2),standAloneADCPlot])
+centralValue_odd  = np.average(firstImage[np.arange(1,32,2),standAloneADCPlot])
 # the histogram of the data
 if PLOT_SET_HISTOGRAM :
     nbins = 100
     EnergyTh = -50
-    n_even = np.zeros(nbins)
-    n_odd  = np.zeros(nbins)
-    for i in range(0, imgDesc.shape[0]):
-    #    n, bins, patches = plt.hist(darkSub[5,:,:], bins=256, range=(0.0, 256.0), fc='k', ec='k')
-    #    [x,y] = np.where(darkSub[i,:,32:63]>EnergyTh)
-    #   h, b = np.histogram(darkSub[i,x,y], np.arange(-nbins/2,nbins/2+1))
-    #    h, b = np.histogram(np.average(darkSub[i,:,5]), np.arange(-nbins/2,nbins/2+1))
-        h, b = np.histogram(np.average(imgDesc[i,np.arange(0,32,2),standAloneADCPlot]), np.arange(centralValue_even-nbins/2,centralValue_even+nbins/2+1))
-        n_even = n_even + h
-        h, b = np.histogram(np.average(imgDesc[i,np.arange(1,32,2),standAloneADCPlot]), np.arange(centralValue_odd-nbins/2,centralValue_odd+nbins/2+1))
-        n_odd = n_odd + h
-
-    np.savez("adc_" + str(standAloneADCPlot), imgDesc[:,:,standAloneADCPlot])
+    # even and odd row averages of the ADC, one histogram channel each
+    histogram = imgPr.HistogramAccumulator(2, numCodes = nbins, minCode = [centralValue_even-nbins/2, centralValue_odd-nbins/2], channelAxis = -1)
+    histogram.update(np.stack((np.average(adcColumn[:,np.arange(0,32,2)], axis=1),
+                               np.average(adcColumn[:,np.arange(1,32,2)], axis=1)), axis=1))
+    [n_even, n_odd] = histogram.counts
+    b = histogram.binEdges()[1]
+
+    np.savez("adc_" + str(standAloneADCPlot), adcColumn)
 
     plt.bar(b[1:nbins+1],n_even, width = 0.55)
     plt.bar(b[1:nbins+1],n_odd,  width = 0.55,color='red')
@@ -237,12 +173,11 @@ if PLOT_SET_HISTOGRAM :
 
 
 numColumns = 64
-averages = np.zeros([imgDesc.shape[0],numColumns])
-noises   = np.zeros([imgDesc.shape[0],numColumns])
+averages = np.zeros([numberOfImages,numColumns])
+noises   = np.zeros([numberOfImages,numColumns])
 if PLOT_ADC_VS_N :
-    for i in range(0, imgDesc.shape[0]):
-        averages[i] = np.mean(imgDesc[i], axis=0)
-        noises[i]   = np.std(imgDesc[i], axis=0)
+    # mean and standard deviation of each image column, batch by batch
+    [averages, noises] = imgStream.batchSelect(imageBatches(), lambda batch: (np.mean(batch, axis=1), np.std(batch, axis=1)))
 
     #rolls matrix to enable dnl[n] = averages[n+1] - averages[n]
     dnls = np.roll(averages,-1, axis=0) - averages
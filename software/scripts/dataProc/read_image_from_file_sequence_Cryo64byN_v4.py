@@ -23,6 +23,8 @@ import os, sys, time
 import numpy as np
 import ePixViewer.Cameras as cameras
 import ePixViewer.imgProcessing as imgPr
+import ePixViewer.dataReader as dataReader
+import ePixViewer.imgStream as imgStream
 # 
 import matplotlib   
 matplotlib.use('QT4Agg')
@@ -55,73 +57,17 @@ SAVEHDF5              = True
 ##################################################
 # Dark images
 ##################################################
-def getData(localFile):
-
-    file_header = [0]
-    numberOfFrames = 0
-    previousSize = 0
-    while ((len(file_header)>0) and ((numberOfFrames<MAX_NUMBER_OF_FRAMES_PER_BATCH) or (MAX_NUMBER_OF_FRAMES_PER_BATCH==-1))):
-        try:
-            # reads file header [the number of bytes to read, EVIO]
-            file_header = np.fromfile(localFile, dtype='uint32', count=2)
-#            print("header 0: ", file_header[0])
-#            print("header 1: ", (file_header[1]&0xff000000)>>24)
-            payloadSize = int(file_header[0]/4)-1 #-1 is need because size info includes the second word from the header
-
-            newPayload = np.fromfile(f, dtype='uint32', count=payloadSize) #(frame size splited by four to read 32 bit 
-#            print ("Payload" , numberOfFrames, ":",  (newPayload[0:5]))
-            #save only serial data frames
-            if ((file_header[1]&0xff000000)>>24)==1: #image packet only, 2 mean scope data
-                if (numberOfFrames == 0):
-                    allFrames = [newPayload.copy()]
-                else:
-                    newFrame  = [newPayload.copy()]
-                    allFrames = np.append(allFrames, newFrame, axis = 0)
-                numberOfFrames = numberOfFrames + 1 
-#                print ("Payload" , numberOfFrames, ":",  (newPayload[0:5]))
-                previousSize = file_header
-
-            if (numberOfFrames%1000==0):
-                print("Read %d frames" % numberOfFrames)
-
-        except Exception: 
-            e = sys.exc_info()[0]
-            #print ("Message\n", e)
-            print ('size', file_header, 'previous size', previousSize)
-            print("numberOfFrames read: " ,numberOfFrames)
-
+def getData(filename):
 
     ##################################################
     # image descrambling
     ##################################################
     currentCam = cameras.Camera(cameraType = cameraType)
     currentCam.bitMask = bitMask
-    #numberOfFrames = allFrames.shape[0]
-#    print("numberOfFrames in the 3D array: " ,numberOfFrames)
-#    print("Starting descrambling images")
-    currentRawData = []
-    imgDesc = []
-    if(numberOfFrames==1):
-        [frameComplete, readyForDisplay, rawImgFrame] = currentCam.buildImageFrame(currentRawData = [], newRawData = allFrames[0])
-        imgDesc = np.array([currentCam.descrambleImage(bytearray(rawImgFrame.tobytes()))])
-    else:
-        for i in range(0, numberOfFrames):
-            #get an specific frame
-            [frameComplete, readyForDisplay, rawImgFrame] = currentCam.buildImageFrame(currentRawData, newRawData = allFrames[i,:])
-            currentRawData = rawImgFrame
-
-            #get descrambled image from camera
-            if (len(imgDesc)==0 and (readyForDisplay)):
-                imgDesc = np.array([currentCam.descrambleImage(rawImgFrame)],dtype=np.float)
-                currentRawData = []
-            else:
-                if readyForDisplay:
-                    currentRawData = []
-                    newImage = currentCam.descrambleImage(rawImgFrame)
-                    newImage = newImage.astype(np.float, copy=False)
-                #if (np.sum(np.sum(newImage))==0):
-                #    newImage[np.where(newImage==0)]=np.nan
-                    imgDesc = np.concatenate((imgDesc, np.array([newImage])),0)
+    # one file per DAC step, only its first images are read and descrambled straight
+    # from the file in their native dtype, without writing an index file next to it
+    imgDesc = imgStream.stackImages(imgStream.iterImageBatchesFromFile(currentCam, filename, channel = 1, maxFrames = MAX_NUMBER_OF_FRAMES_PER_BATCH,
+                                                                       useIndexFile = False))
 
     return imgDesc
 
@@ -245,11 +191,10 @@ for j in range(0, 16):
     for i in range(j*int(65536/16), (j+1)*int(65536/16), 1):
         filename = filenamepath + filenameroot+"_"+ str(i)+".dat"
         print(filename)
-        f = open(filename, mode = 'rb')
-        newImage = getData(f)
+        newImage = getData(filename)
         if not len(newImage):
             print("padding image")
-            newImage = np.zeros((4,64,64))
+            newImage = np.zeros((4,64,64), dtype='uint16')
                         
         print(newImage.shape)
         if i == j*int(65536/16):
@@ -317,7 +262,8 @@ if PLOT_IMAGE :
     plt.hist(imgDesc[4,44,:])
     plt.show()
 
-darkImg = np.mean(imgDesc, axis=0)
+# per pixel mean and noise with the running estimator, one slice of images at a time
+[darkImg, heatMap] = imgStream.batchMeanStd(imgStream.iterStackSlices(imgDesc))
 print(darkImg.shape)
 
 
@@ -328,7 +274,6 @@ if PLOT_IMAGE_DARK :
     plt.title('Dark image map of :'+filename)
     plt.show()
 
-heatMap = np.std(imgDesc, axis=0)
 if PLOT_IMAGE_HEATMAP :
     plt.imshow(heatMap, interpolation='nearest', vmin=0, vmax=200)
     plt.gray()
@@ -353,15 +298,11 @@ centralValue = 0
 if PLOT_SET_HISTOGRAM :
     nbins = 100
     EnergyTh = -50
-    n = np.zeros(nbins)
-    for i in range(0, imgDesc.shape[0]):
-    #    n, bins, patches = plt.hist(darkSub[5,:,:], bins=256, range=(0.0, 256.0), fc='k', ec='k')
-    #    [x,y] = np.where(darkSub[i,:,32:63]>EnergyTh)
-    #   h, b = np.histogram(darkSub[i,x,y], np.arange(-nbins/2,nbins/2+1))
-    #    h, b = np.histogram(np.average(darkSub[i,:,5]), np.arange(-nbins/2,nbins/2+1))
-        dataSet = darkSub[i,:,5]
-        h, b = np.histogram(np.average(dataSet), np.arange(centralValue-nbins/2,centralValue+nbins/2+1))
-        n = n + h
+    # histogram of the frame averages of column 5, all frames in one update
+    histogram = imgPr.HistogramAccumulator(1, numCodes = nbins, minCode = centralValue-nbins/2, channelAxis = -1)
+    histogram.update(np.average(darkSub[:,:,5], axis=1)[:,None])
+    n = histogram.counts[0]
+    b = histogram.binEdges()[0]
 
     plt.bar(b[1:nbins+1],n, width = 0.55)
     plt.title('Histogram')
@@ -375,17 +316,12 @@ centralValue_odd  = np.average(imgDesc[0,np.arange(1,32,2),standAloneADCPlot])
 if PLOT_SET_HISTOGRAM :
     nbins = 100
     EnergyTh = -50
-    n_even = np.zeros(nbins)
-    n_odd  = np.zeros(nbins)
-    for i in range(0, imgDesc.shape[0]):
-    #    n, bins, patches = plt.hist(darkSub[5,:,:], bins=256, range=(0.0, 256.0), fc='k', ec='k')
-    #    [x,y] = np.where(darkSub[i,:,32:63]>EnergyTh)
-    #   h, b = np.histogram(darkSub[i,x,y], np.arange(-nbins/2,nbins/2+1))
-    #    h, b = np.histogram(np.average(darkSub[i,:,5]), np.arange(-nbins/2,nbins/2+1))
-        h, b = np.histogram(np.average(imgDesc[i,np.arange(0,32,2),standAloneADCPlot]), np.arange(centralValue_even-nbins/2,centralValue_even+nbins/2+1))
-        n_even = n_even + h
-        h, b = np.histogram(np.average(imgDesc[i,np.arange(1,32,2),standAloneADCPlot]), np.arange(centralValue_odd-nbins/2,centralValue_odd+nbins/2+1))
-        n_odd = n_odd + h
+    # even and odd row averages of the ADC, one histogram channel each
+    histogram = imgPr.HistogramAccumulator(2, numCodes = nbins, minCode = [centralValue_even-nbins/2, centralValue_odd-nbins/2], channelAxis = -1)
+    histogram.update(np.stack((np.average(imgDesc[:,np.arange(0,32,2),standAloneADCPlot], axis=1),
+                               np.average(imgDesc[:,np.arange(1,32,2),standAloneADCPlot], axis=1)), axis=1))
+    [n_even, n_odd] = histogram.counts
+    b = histogram.binEdges()[1]
 
     np.savez("adc_" + str(standAloneADCPlot), imgDesc[:,:,standAloneADCPlot])
 
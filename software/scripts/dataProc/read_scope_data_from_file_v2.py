@@ -23,6 +23,7 @@ import os, sys, time
 import numpy as np
 #import ePixViewer.Cameras as cameras
 #import ePixViewer.imgProcessing as imgPr
+import ePixViewer.dataReader as dataReader
 # 
 import matplotlib   
 matplotlib.use('QT4Agg')
@@ -49,39 +50,10 @@ if (len(sys.argv[1])>0):
 else:
     filename = '/data/cryoData/backend/pulse_pseudoScope.dat'
 
-f = open(filename, mode = 'rb')
-
-file_header = [0]
-numberOfFrames = 0
-previousSize = 0
-while ((len(file_header)>0) and ((numberOfFrames<MAX_NUMBER_OF_FRAMES_PER_BATCH) or (MAX_NUMBER_OF_FRAMES_PER_BATCH==-1))):
-    try:
-        # reads file header [the number of bytes to read, EVIO]
-        file_header = np.fromfile(f, dtype='uint32', count=2)
-        payloadSize = int(file_header[0]/4)-1 #-1 is need because size info includes the second word from the header
-        print ('packet size',  file_header)
-        
-
-        #save only serial data frames
-        newPayload = np.fromfile(f, dtype='uint16', count=payloadSize*2) #(frame size splited by four to read 32 bit 
-        if ((file_header[1]&0xff000000)>>24)==2: #image packet only, 2 mean scope data
-            if (numberOfFrames == 0):
-                allFrames = [newPayload.copy()]
-            else:
-                newFrame  = [newPayload.copy()]
-                allFrames = np.append(allFrames, newFrame, axis = 0)
-            numberOfFrames = numberOfFrames + 1 
-            previousSize = file_header
-        
-        if (numberOfFrames%1000==0):
-            print("Read %d frames" % numberOfFrames)
-
-    except Exception: 
-        e = sys.exc_info()[0]
-        #print ("Message\n", e)
-        print("End of file.")
-        print ('size', file_header, 'previous size', previousSize)
-        print("numberOfFrames read: " ,numberOfFrames)
+# reads all scope frames (channel 2) in a single pass
+allFrames = dataReader.loadFrames(filename, channel = 2, dtype = 'uint16', maxFrames = MAX_NUMBER_OF_FRAMES_PER_BATCH)
+numberOfFrames = len(allFrames)
+print("numberOfFrames read: " ,numberOfFrames)
 
 
 
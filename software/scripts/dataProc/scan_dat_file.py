@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+#-----------------------------------------------------------------------------
+# Title      : rogue .dat file scanner
+#-----------------------------------------------------------------------------
+# File       : scan_dat_file.py
+# Created    : 2026-10-18
+# Last update: 2026-10-18
+#-----------------------------------------------------------------------------
+# Description:
+# Reads only the frame headers of rogue .dat files and reports the number of
+# frames per channel, the gaps between frames and the corrupted regions that
+# were skipped. The index is saved next to each file for later reads.
+# With --cameraType the payload headers of the image frames are decoded and
+# the acquisition number gaps of each ASIC are reported.
+#
+# Example:
+#   python3 scan_dat_file.py run1.dat run2.dat
+#   python3 scan_dat_file.py --cameraType cryo64xN run1.dat
+#
+#-----------------------------------------------------------------------------
+# This file is part of the ePix rogue. It is subject to
+# the license terms in the LICENSE.txt file found in the top-level directory
+# of this distribution and at:
+#    https://confluence.slac.stanford.edu/display/ppareg/LICENSE.html.
+# No part of the ePix rogue, including this file, may be
+# copied, modified, propagated, or distributed except according to the terms
+# contained in the LICENSE.txt file.
+#-----------------------------------------------------------------------------
+import setupLibPaths
+import os, sys, time
+import argparse
+import numpy as np
+import ePixViewer.dataReader as dataReader
+
+# Set the argument parser
+parser = argparse.ArgumentParser()
+
+# Add arguments
+parser.add_argument(
+    "files",
+    type     = str,
+    nargs    = '+',
+    help     = "rogue .dat files to scan",
+)
+
+parser.add_argument(
+    "--rescan",
+    action   = 'store_true',
+    help     = "ignore the saved index files",
+)
+
+parser.add_argument(
+    "--anySize",
+    action   = 'store_true',
+    help     = "accept frame sizes that are not a multiple of 4 bytes",
+)
+
+parser.add_argument(
+    "--cameraType",
+    type     = str,
+    required = False,
+    default  = "",
+    help     = "camera type used to decode the payload headers (no header decoding if empty)",
+)
+
+# Get the arguments
+args = parser.parse_args()
+
+if args.cameraType:
+    import ePixViewer.Cameras as cameras
+    import ePixViewer.imgStream as imgStream
+    currentCam = cameras.Camera(cameraType = args.cameraType)
+
+for filename in args.files:
+    startTime = time.time()
+    index = dataReader.FrameIndex(filename, useIndexFile = not args.rescan,
+                                  sizeAlignment = None if args.anySize else dataReader.FRAME_SIZE_ALIGNMENT)
+    print(index.summary())
+    print("  scanned in %.3f s" % (time.time()-startTime))
+
+    if args.cameraType:
+        # the headers are read through the index built above, the file is not scanned again
+        reader = dataReader.MappedFrameReader(filename, index = index)
+        frameNumbers, headers = imgStream.decodeFileHeaders(currentCam, filename, channel = 1, reader = reader)
+        reader.close()
+        if (len(frameNumbers) == 0):
+            print("  no image frames")
+            continue
+        for asic in np.unique(headers['asic']).tolist():
+            acqNum = headers['acqNum'][headers['asic'] == asic].astype('int64')
+            if (len(acqNum) == 0):
+                continue
+            gaps = np.flatnonzero(np.diff(acqNum) != 1)
+            print("  ASIC %d: %d frames, acqNum %d to %d, %d gaps" % (asic, len(acqNum), acqNum[0], acqNum[-1], len(gaps)))
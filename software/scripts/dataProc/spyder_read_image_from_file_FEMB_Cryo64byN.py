@@ -24,6 +24,8 @@ import numpy as np
 import pyrogue as pr
 import ePixViewer.Cameras as cameras
 import ePixViewer.imgProcessing as imgPr
+import ePixViewer.dataReader as dataReader
+import ePixViewer.imgStream as imgStream
 # 
 import matplotlib   
 #matplotlib.use('QT4Agg')
@@ -97,144 +99,61 @@ filename = '/u1/cryo/data/FEMB_SN01/Baseline/Cold/T2_224MHz_ASIC0_ASIC1_ExtSuppl
 filename = '/u1/cryo/data/FEMB_SN01/Baseline/Cold/T2_224MHz_ASIC0_ASIC1_ExtSupply_AdaptBoard/FEMB01_224MHz_ASIC0_ASIC1_ExtSupply_AdaptBoard_Tp3u6us.dat'
 filename = '/u1/ddoering/data/cryo-c01/FEMB_at_offsiteLab/room/2MSPS/cryo_FEMB_SN1_AllCHsbut0And32_ASIC0_0x0399_tp2u4s_ASIC1_0x0395_4096.dat'
 
-f = open(filename, mode = 'rb')
-
-file_header = [0]
-numberOfFrames = [0 , 0]
-previousSize = 0
-asicID = 0
-while ((len(file_header)>0) and ((numberOfFrames[0]<MAX_NUMBER_OF_FRAMES_PER_BATCH) or (numberOfFrames[1]<MAX_NUMBER_OF_FRAMES_PER_BATCH) or (MAX_NUMBER_OF_FRAMES_PER_BATCH==-1))):
-    try:
-        # reads file header [the number of bytes to read, EVIO]
-        file_header = np.fromfile(f, dtype='uint32', count=2)
-        print("header 0: ", file_header[0])
-        print("header 1: ", (file_header[1]&0xff000000)>>24)
-        payloadSize = int(file_header[0]/4)-1 #-1 is need because size info includes the second word from the header
-
-        newPayload = np.fromfile(f, dtype='uint32', count=payloadSize) #(frame size splited by four to read 32 bit 
-        print ("Payload" , numberOfFrames, ":",  (newPayload[0:5]))
-        #save only serial data frames
-        if ((file_header[1]&0xff000000)>>24)==1: #image packet only, 2 mean scope data
-            asicID = (newPayload[0]&0x00000010)>>4
-            if asicID == 0:
-                if (numberOfFrames[asicID] == 0):
-                    allFrames_0 = [newPayload.copy()]
-                else:
-                    newFrame  = [newPayload.copy()]
-                    allFrames_0 = np.append(allFrames_0, newFrame, axis = 0)
-                numberOfFrames[asicID] = numberOfFrames[asicID] + 1 
-                print ("Payload 0" , numberOfFrames, ":",  (newPayload[0:5]))
-                previousSize = file_header
-            if asicID == 1:
-                if (numberOfFrames[asicID] == 0):
-                    allFrames_1 = [newPayload.copy()]
-                else:
-                    newFrame  = [newPayload.copy()]
-                    allFrames_1 = np.append(allFrames_1, newFrame, axis = 0)
-                numberOfFrames[asicID] = numberOfFrames[asicID] + 1 
-                print ("Payload 1 " , numberOfFrames, ":",  (newPayload[0:5]))
-                previousSize = file_header
-
-        if (numberOfFrames[asicID]%1000==0):
-            print("Read %d frames" % numberOfFrames)
-
-    except Exception: 
-        e = sys.exc_info()[0]
-        #print ("Message\n", e)
-        print ('size', file_header, 'previous size', previousSize)
-        print("numberOfFrames read: " ,numberOfFrames)
-
 #%%
 ##################################################
-# image descrambling
+# image descrambling, batch by batch
 ##################################################
 currentCam = cameras.Camera(cameraType = cameraType)
 currentCam.bitMask = bitMask
-#numberOfFrames = allFrames.shape[0]
-print("numberOfFrames in the 3D array: " ,numberOfFrames)
-print("Starting descrambling images")
-currentRawData = []
-asicID = 0
-imgDesc_0 = []
-if(numberOfFrames[asicID]==1):
-    [frameComplete, readyForDisplay, rawImgFrame] = currentCam.buildImageFrame(currentRawData = [], newRawData = allFrames_0[0])
-    imgDesc_0 = np.array([currentCam.descrambleImage(bytearray(rawImgFrame.tobytes()))])
-else:
-    for i in range(0, numberOfFrames[asicID]):
-        #get an specific frame
-        [frameComplete, readyForDisplay, rawImgFrame] = currentCam.buildImageFrame(currentRawData, newRawData = allFrames_0[i,:])
-        currentRawData = rawImgFrame
-
-        #get descrambled image from camera
-        if (len(imgDesc_0)==0 and (readyForDisplay)):
-            imgDesc_0 = np.array([currentCam.descrambleImage(rawImgFrame)],dtype=np.float)
-            currentRawData = []
-        else:
-            if readyForDisplay:
-                currentRawData = []
-                newImage = currentCam.descrambleImage(rawImgFrame)
-                newImage = newImage.astype(np.float, copy=False)
-                #if (np.sum(np.sum(newImage))==0):
-                #    newImage[np.where(newImage==0)]=np.nan
-                imgDesc_0 = np.concatenate((imgDesc_0, np.array([newImage])),0)
-#############################
-currentRawData = []
-asicID = 1
-imgDesc_1 = []
-if(numberOfFrames[asicID]==1):
-    [frameComplete, readyForDisplay, rawImgFrame] = currentCam.buildImageFrame(currentRawData = [], newRawData = allFrames_1[0])
-    imgDesc_1 = np.array([currentCam.descrambleImage(bytearray(rawImgFrame.tobytes()))])
-else:
-    for i in range(0, numberOfFrames[asicID]):
-        #get an specific frame
-        [frameComplete, readyForDisplay, rawImgFrame] = currentCam.buildImageFrame(currentRawData, newRawData = allFrames_1[i,:])
-        currentRawData = rawImgFrame
-
-        #get descrambled image from camera
-        if (len(imgDesc_1)==0 and (readyForDisplay)):
-            imgDesc_1 = np.array([currentCam.descrambleImage(rawImgFrame)],dtype=np.float)
-            currentRawData = []
-        else:
-            if readyForDisplay:
-                currentRawData = []
-                newImage = currentCam.descrambleImage(rawImgFrame)
-                newImage = newImage.astype(np.float, copy=False)
-                #if (np.sum(np.sum(newImage))==0):
-                #    newImage[np.where(newImage==0)]=np.nan
-                imgDesc_1 = np.concatenate((imgDesc_1, np.array([newImage])),0)
+
+def imageBatches(asic):
+    """descrambled images of the image frames (channel 1) of one ASIC in batches, the whole stack is never in memory"""
+    return imgStream.iterImageBatchesFromFile(currentCam, filename, channel = 1, asic = asic, maxFrames = MAX_NUMBER_OF_FRAMES_PER_BATCH)
+
 if(SAVE_HDF5):
     print("Saving Hdf5")
     h5_filename = os.path.splitext(filename)[0]+".hdf5"
     f = h5py.File(h5_filename, "w")
-    f['adcData_0'] = imgDesc_0.astype('uint16')
-    f['adcData_1'] = imgDesc_1.astype('uint16')
+    imgStream.batchToHdf5(imageBatches(0), f, 'adcData_0')
+    imgStream.batchToHdf5(imageBatches(1), f, 'adcData_1')
     f.close()
 
 if(SAVE_CSV):
-    for runNum in range(imgDesc_0.shape[0]):
-        np.savetxt(os.path.splitext(filename)[0] + "_asic0_runNum" + str(runNum) + "_traces" + ".csv", imgDesc_0[runNum,:,:], fmt='%d', delimiter=',', newline='\n')
-    for runNum in range(imgDesc_1.shape[0]):
-        np.savetxt(os.path.splitext(filename)[0] + "_asic1_runNum" + str(runNum) + "_traces" + ".csv", imgDesc_1[runNum,:,:], fmt='%d', delimiter=',', newline='\n')
+    for asic in range(2):
+        runNum = 0
+        for batch in imageBatches(asic):
+            for image in batch:
+                np.savetxt(os.path.splitext(filename)[0] + "_asic" + str(asic) + "_runNum" + str(runNum) + "_traces" + ".csv", image, fmt='%d', delimiter=',', newline='\n')
+                runNum = runNum + 1
 
 #%%
 ##################################################
-#from here on we have a set of images to work with
+#from here on only the images and time series that are plotted are kept
 ##################################################
+# sample 10 of channel 1 of every image and the sample images 98 to 108 of each ASIC
+sampleTrace_0 = imgStream.batchSelect(imageBatches(0), lambda batch: batch[:, 1, 10])
+sampleTrace_1 = imgStream.batchSelect(imageBatches(1), lambda batch: batch[:, 1, 10])
+numberOfImages = [0 if sampleTrace_0 is None else len(sampleTrace_0), 0 if sampleTrace_1 is None else len(sampleTrace_1)]
+print("images read: " ,numberOfImages)
+firstSample = 98
+sampleImages_0 = imgStream.batchImages(imageBatches(0), np.arange(firstSample, 109))
+sampleImages_1 = imgStream.batchImages(imageBatches(1), np.arange(firstSample, 109))
+
 if PLOT_ADC9_VS_N :
     i=108
     # All averages and stds
     plt.figure(2,figsize=[8,12])
     plt.subplot(311)
     plt.title('Sample offset vs acquisition number')
-    plt.plot(imgDesc_0[:,1,10],label="ASIC0")
-    plt.plot(imgDesc_1[:,1,10],label="ASIC1")
+    plt.plot(sampleTrace_0,label="ASIC0")
+    plt.plot(sampleTrace_1,label="ASIC1")
     
     plt.subplot(312)
-    plt.plot(np.transpose(imgDesc_0[i,0:63,:]))
+    plt.plot(np.transpose(sampleImages_0[i-firstSample,0:63,:]))
     plt.title('Traces ASIC 0')
     
     plt.subplot(313)
-    plt.plot(np.transpose(imgDesc_1[i,0:63,:]))
+    plt.plot(np.transpose(sampleImages_1[i-firstSample,0:63,:]))
     plt.title('Traces ASIC 1')
     plt.legend()
     plt.show()
@@ -247,11 +166,11 @@ if PLOT_ADC9_VS_N :
     plt.figure(2,figsize=[8,12])
     
     plt.subplot(211)
-    plt.plot(np.transpose(imgDesc_0[i,1:63,:]))
+    plt.plot(np.transpose(sampleImages_0[i-firstSample,1:63,:]))
     plt.title('Traces ASIC 0')
     
     plt.subplot(212)
-    plt.plot(np.transpose(imgDesc_1[i,1:63,:]))
+    plt.plot(np.transpose(sampleImages_1[i-firstSample,1:63,:]))
     plt.title('Traces ASIC 1')
     plt.legend()
     plt.show()
@@ -259,8 +178,8 @@ if PLOT_ADC9_VS_N :
 #%%
 #show first image
 if PLOT_IMAGE :
-    for i in range(98, 109):
-        plt.imshow(imgDesc_0[i,:,:], vmin=100, vmax=4000, interpolation='nearest')
+    for i in range(len(sampleImages_0)):
+        plt.imshow(sampleImages_0[i,:,:], vmin=100, vmax=4000, interpolation='nearest')
         plt.gray()
         #plt.colorbar()
         plt.title('Sample image of ASIC 0:'+filename)
@@ -269,8 +188,8 @@ if PLOT_IMAGE :
 
 #%%
 if PLOT_IMAGE :
-    for i in range(98, 109):
-        plt.imshow(imgDesc_1[i,:,:], vmin=100, vmax=4000, interpolation='nearest')
+    for i in range(len(sampleImages_1)):
+        plt.imshow(sampleImages_1[i,:,:], vmin=100, vmax=4000, interpolation='nearest')
         plt.gray()
         #plt.colorbar()
         plt.title('First image of ASIC 1:'+filename)
@@ -432,7 +351,8 @@ if PLOT_IMAGE :
     plt.title('Pixel time series (15,15) and (15,45) :'+filename)
     plt.show()
 
-darkImg = np.mean(imgDesc, axis=0)
+# per pixel mean and noise with the running estimator, one slice of images at a time
+[darkImg, heatMap] = imgStream.batchMeanStd(imgStream.iterStackSlices(imgDesc))
 print(darkImg.shape)
 
 #%%
@@ -443,7 +363,6 @@ if PLOT_IMAGE_DARK :
     plt.title('Dark image map of :'+filename)
     plt.show()
 #%%
-heatMap = np.std(imgDesc, axis=0)
 if PLOT_IMAGE_HEATMAP :
     plt.imshow(heatMap, interpolation='nearest', vmin=0, vmax=200)
     plt.gray()
@@ -0,0 +1,61 @@
+#-----------------------------------------------------------------------------
+# Title      : pytest configuration of the ePixViewer tests
+#-----------------------------------------------------------------------------
+# File       : conftest.py
+# Created    : 2026-10-18
+# Last update: 2026-10-18
+#-----------------------------------------------------------------------------
+# Description:
+# Puts software/python on the path (as setupLibPaths does for the scripts)
+# and provides a writer of rogue .dat files for the reader tests.
+# The package __init__ imports the Qt viewer and rogue, the ePixViewer package
+# is registered without running it so the numpy modules (dataReader, Cameras,
+# imgProcessing, imgStream, ...) import without rogue, pyrogue or PyQt.
+#
+#-----------------------------------------------------------------------------
+# This file is part of the ePix rogue. It is subject to
+# the license terms in the LICENSE.txt file found in the top-level directory
+# of this distribution and at:
+#    https://confluence.slac.stanford.edu/display/ppareg/LICENSE.html.
+# No part of the ePix rogue, including this file, may be
+# copied, modified, propagated, or distributed except according to the terms
+# contained in the LICENSE.txt file.
+#-----------------------------------------------------------------------------
+import os
+import sys
+import types
+import struct
+import numpy as np
+import pytest
+
+PYTHON_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'python')
+sys.path.insert(0, PYTHON_DIR)
+
+if 'ePixViewer' not in sys.modules:
+    package = types.ModuleType('ePixViewer')
+    package.__path__ = [os.path.join(PYTHON_DIR, 'ePixViewer')]
+    sys.modules['ePixViewer'] = package
+
+
+def rogueFrame(payload, channel = 1):
+    """bytes of a frame in rogue file format: size, channel and payload"""
+    payload = np.asarray(payload).tobytes()
+    return struct.pack('<II', len(payload) + 4, channel << 24) + payload
+
+
+def writeDatFile(filename, frames, mode = 'wb'):
+    """writes a list of (payload, channel) or raw bytes to a rogue file, returns its name"""
+    with open(filename, mode = mode) as f:
+        for frame in frames:
+            f.write(frame if isinstance(frame, bytes) else rogueFrame(*frame))
+    return str(filename)
+
+
+@pytest.fixture
+def datFile(tmp_path):
+    """writes the frames to a new file of the test directory and returns its name"""
+    counter = [0]
+    def write(frames):
+        counter[0] = counter[0] + 1
+        return writeDatFile(tmp_path / ("data%d.dat" % counter[0]), frames)
+    return write
@@ -0,0 +1,76 @@
+#-----------------------------------------------------------------------------
+# Title      : tests of the camera descramblers
+#-----------------------------------------------------------------------------
+# File       : test_cameras.py
+# Created    : 2026-10-18
+# Last update: 2026-10-18
+#-----------------------------------------------------------------------------
+# This file is part of the ePix rogue. It is subject to
+# the license terms in the LICENSE.txt file found in the top-level directory
+# of this distribution and at:
+#    https://confluence.slac.stanford.edu/display/ppareg/LICENSE.html.
+# No part of the ePix rogue, including this file, may be
+# copied, modified, propagated, or distributed except according to the terms
+# contained in the LICENSE.txt file.
+#-----------------------------------------------------------------------------
+import numpy as np
+import pytest
+import ePixViewer.Cameras as cameras
+import ePixViewer.imgStream as imgStream
+import ePixViewer.syntheticFrames as syntheticFrames
+
+NUM_IMAGES = 6
+
+
+@pytest.mark.parametrize('bitMask', [0xFFFF, 0x00FF])
+@pytest.mark.parametrize('cameraType', sorted(cameras.Camera.batchCameras))
+def test_descrambleBatch_matches_descrambleImage(cameraType, bitMask):
+    camera = cameras.Camera(cameraType = cameraType)
+    camera.bitMask = np.uint16(bitMask)
+    frames = syntheticFrames.generateFrames(camera, NUM_IMAGES, samples = 16)
+
+    # frame by frame, through the camera frame building
+    images = np.stack([image.copy() for image in imgStream.iterImages(camera, frames)])
+    batch = camera.descrambleBatch(np.stack(frames))
+    assert batch.shape == images.shape == (NUM_IMAGES,) + images.shape[1:]
+    assert np.array_equal(batch, images)
+    assert camera.descrambleErrors == 0
+
+
+@pytest.mark.parametrize('cameraType', ['cryo64xN', 'ePixHrePixM'])
+def test_descrambleBatch_of_strided_view(cameraType):
+    camera = cameras.Camera(cameraType = cameraType)
+    frames = np.stack(syntheticFrames.generateFrames(camera, NUM_IMAGES, samples = 8))
+    # payloads inside a larger buffer, as the frames of a mapped file with their headers
+    padded = np.zeros((NUM_IMAGES, frames.shape[1] + 8), dtype = 'uint8')
+    padded[:, 8:] = frames
+    assert np.array_equal(camera.descrambleBatch(padded[:, 8:]), camera.descrambleBatch(frames))
+
+
+@pytest.mark.parametrize('cameraType', ['cryo64xN', 'ePixHrePixM'])
+def test_batchImageShape_matches_the_images(cameraType):
+    camera = cameras.Camera(cameraType = cameraType)
+    frame = syntheticFrames.generateFrames(camera, 1, samples = 12)[0]
+    assert camera.batchImageShape(len(frame)) == camera.descrambleImage(frame).shape
+    # no image for a payload that does not hold whole samples, and nothing is counted
+    assert camera.batchImageShape(len(frame) + 2) is None
+    assert camera.descrambleErrors == 0
+
+
+def test_processImage_into_out_of_another_dtype():
+    camera = cameras.Camera(cameraType = 'cryo64xN')
+    camera.bitMask = np.uint16(0x0FFF)
+    frame = syntheticFrames.generateFrames(camera, 1, seed = 3, samples = 8)[0]
+    expected = camera.descrambleImage(frame).astype(np.float64)
+    out = np.empty(expected.shape, dtype = np.float32)
+    assert camera.descrambleImage(frame, out = out) is out
+    assert np.array_equal(out, expected)
+    pedestal = np.full(expected.shape, 10, dtype = np.float32)
+    assert np.allclose(camera.processImage(frame, pedestal = pedestal), expected - 10)
+
+
+def test_descrambleImage_wrong_length_is_counted():
+    camera = cameras.Camera(cameraType = 'cryo64xN')
+    assert camera.descrambleImage(np.zeros(13, dtype = 'uint8')) is None
+    assert camera.descrambleImage(np.zeros(14, dtype = 'uint8')) is None
+    assert camera.descrambleErrors == 2
@@ -0,0 +1,93 @@
+#-----------------------------------------------------------------------------
+# Title      : tests of the decoded data cache
+#-----------------------------------------------------------------------------
+# File       : test_dataCache.py
+# Created    : 2026-10-18
+# Last update: 2026-10-18
+#-----------------------------------------------------------------------------
+# This file is part of the ePix rogue. It is subject to
+# the license terms in the LICENSE.txt file found in the top-level directory
+# of this distribution and at:
+#    https://confluence.slac.stanford.edu/display/ppareg/LICENSE.html.
+# No part of the ePix rogue, including this file, may be
+# copied, modified, propagated, or distributed except according to the terms
+# contained in the LICENSE.txt file.
+#-----------------------------------------------------------------------------
+import os
+import numpy as np
+import pytest
+import ePixViewer.dataCache as dataCache
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return dataCache.DataCache(cacheDir = str(tmp_path / 'cache'), maxBytes = 1 << 20)
+
+
+@pytest.fixture
+def rawFile(tmp_path):
+    filename = tmp_path / 'raw.dat'
+    filename.write_bytes(b'\x00' * 64)
+    return str(filename)
+
+
+class Compute():
+    """counts the calls of a compute function"""
+    def __init__(self, result):
+        self.result = result
+        self.calls = 0
+
+    def __call__(self):
+        self.calls = self.calls + 1
+        return self.result
+
+
+def test_hit_does_not_compute_again(cache, rawFile):
+    compute = Compute(np.arange(100, dtype = np.uint16).reshape(10, 10))
+    first = cache.getOrCompute(rawFile, 'cryo64xN', 0xFFFF, 'images', compute)
+    second = cache.getOrCompute(rawFile, 'cryo64xN', 0xFFFF, 'images', compute, mmapMode = 'r')
+    assert compute.calls == 1
+    assert isinstance(second, np.memmap)
+    assert np.array_equal(first, second)
+    # another bit mask or parameter is another entry
+    cache.getOrCompute(rawFile, 'cryo64xN', 0x0FFF, 'images', compute)
+    cache.getOrCompute(rawFile, 'cryo64xN', 0xFFFF, 'images', compute, channel = 2)
+    assert compute.calls == 3
+
+
+def test_changed_file_is_computed_again(cache, rawFile):
+    compute = Compute(np.zeros(4))
+    cache.getOrCompute(rawFile, 'cryo64xN', 0xFFFF, 'images', compute)
+    with open(rawFile, 'ab') as f:
+        f.write(b'\x00' * 8)
+    cache.getOrCompute(rawFile, 'cryo64xN', 0xFFFF, 'images', compute)
+    assert compute.calls == 2
+
+
+def test_least_recently_used_is_evicted(cache, rawFile):
+    entry = np.zeros(100 * 1024, dtype = np.uint8)
+    keys = [cache.key(rawFile, 'cryo64xN', 0xFFFF, 'images', run = n) for n in range(3)]
+    for n, key in enumerate(keys[:2]):
+        cache.put(key, entry)
+        # oldest access first, whatever the file system time resolution
+        os.utime(cache._entry(key), ns = (n * 10**9, n * 10**9))
+    # reading the oldest entry makes the other one the least recently used
+    assert cache.get(keys[0]) is not None
+    cache.maxBytes = cache.size() + entry.nbytes // 2
+    cache.put(keys[2], entry)
+    assert cache.get(keys[1]) is None
+    assert cache.get(keys[0]) is not None and cache.get(keys[2]) is not None
+    assert cache.size() <= cache.maxBytes
+
+
+def test_lists_round_trip_and_none_is_not_stored(cache, rawFile):
+    key = cache.key(rawFile, 'cryo64xN', 0xFFFF, 'meanStd')
+    cache.put(key, [None, None])
+    assert cache.get(key) is None
+    result = [np.arange(6.0).reshape(2, 3), np.ones((2, 3))]
+    cache.put(key, result)
+    loaded = cache.get(key)
+    assert isinstance(loaded, list) and len(loaded) == 2
+    assert all(np.array_equal(a, b) for a, b in zip(loaded, result))
+    cache.clear()
+    assert cache.size() == 0
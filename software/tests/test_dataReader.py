@@ -0,0 +1,127 @@
+#-----------------------------------------------------------------------------
+# Title      : tests of the rogue file index and readers
+#-----------------------------------------------------------------------------
+# File       : test_dataReader.py
+# Created    : 2026-10-18
+# Last update: 2026-10-18
+#-----------------------------------------------------------------------------
+# This file is part of the ePix rogue. It is subject to
+# the license terms in the LICENSE.txt file found in the top-level directory
+# of this distribution and at:
+#    https://confluence.slac.stanford.edu/display/ppareg/LICENSE.html.
+# No part of the ePix rogue, including this file, may be
+# copied, modified, propagated, or distributed except according to the terms
+# contained in the LICENSE.txt file.
+#-----------------------------------------------------------------------------
+import os
+import struct
+import numpy as np
+import pytest
+from conftest import rogueFrame, writeDatFile
+import ePixViewer.dataReader as dataReader
+
+
+def payloads(numFrames, numWords = 16, seed = 0):
+    rng = np.random.default_rng(seed)
+    return [rng.integers(0, 1 << 32, numWords, dtype = 'uint32') for n in range(numFrames)]
+
+
+def test_index_file_reload(datFile, monkeypatch):
+    frames = payloads(3)
+    filename = datFile([(frames[0], 1), b'\xff' * 8, (frames[1], 1), (frames[2], 3)])
+    first = dataReader.FrameIndex(filename)
+    assert os.path.isfile(filename + dataReader.INDEX_FILE_SUFFIX)
+
+    # an up to date index file is loaded without scanning the data file
+    def noScan(self, maxFrames = None):
+        raise AssertionError("the data file was scanned again")
+    monkeypatch.setattr(dataReader.FrameIndex, 'update', noScan)
+    second = dataReader.FrameIndex(filename)
+    for name in ('offset', 'size', 'channel', 'asic', 'badRegions'):
+        assert np.array_equal(getattr(first, name), getattr(second, name))
+    monkeypatch.undo()
+
+    # a file that changed is indexed again
+    writeDatFile(filename, [(frames[0], 1)], mode = 'ab')
+    third = dataReader.FrameIndex(filename)
+    assert len(third) == len(first) + 1
+
+
+def test_useIndexFile_false_writes_no_index_file(datFile):
+    frames = payloads(2)
+    filename = datFile([(frames[0], 1), (frames[1], 1)])
+    assert len(dataReader.loadFrames(filename, useIndexFile = False)) == 2
+    assert not os.path.exists(filename + dataReader.INDEX_FILE_SUFFIX)
+
+
+def test_demux_splits_only_the_image_channel_by_asic(datFile):
+    words = np.zeros(4, dtype = 'uint32')
+    asic1 = words.copy()
+    asic1[0] = 0x10
+    filename = datFile([(words, 1), (asic1, 1), (words, 2), (asic1, 2)])
+    demuxed = dataReader.demuxFrames(filename)
+    assert sorted(demuxed, key = str) == sorted([(1, 0), (1, 1), (2, None)], key = str)
+    assert len(demuxed[(2, None)]) == 2
+
+
+def test_resync_skips_corrupted_region(datFile):
+    frames = payloads(4)
+    garbage = b'\xff' * 37
+    filename = datFile([(frames[0], 1), (frames[1], 1), garbage, (frames[2], 1), (frames[3], 2)])
+
+    index = dataReader.FrameIndex(filename, useIndexFile = False)
+    assert len(index) == 4
+    # the bad region starts at the garbage and ends at the next header
+    garbageStart = 2 * len(rogueFrame(frames[0]))
+    assert index.badRegions.tolist() == [[garbageStart, garbageStart + len(garbage)]]
+    assert index.channel.tolist() == [1, 1, 1, 2]
+    with open(filename, 'rb') as f:
+        data = f.read()
+    for n, frame in enumerate(frames):
+        offset, size = int(index.offset[n]), int(index.size[n])
+        assert data[offset:offset + size] == frame.tobytes()
+
+
+def test_size_past_end_of_finished_file_is_resynced(datFile):
+    frames = payloads(4)
+    # the size of the third frame is corrupted and runs past the end of the file
+    corrupted = struct.pack('<II', 1 << 20, 1 << 24) + frames[2].tobytes()
+    filename = datFile([(frames[0], 1), (frames[1], 1), corrupted, (frames[3], 1)])
+    frameBytes = len(rogueFrame(frames[0]))
+
+    index = dataReader.FrameIndex(filename, useIndexFile = False)
+    assert len(index) == 3
+    assert index.badRegions.tolist() == [[2 * frameBytes, 3 * frameBytes]]
+    # a file still being written waits for the rest of the frame instead
+    growing = dataReader.FrameIndex(filename, useIndexFile = False, growing = True)
+    assert len(growing) == 2
+    assert len(growing.badRegions) == 0
+
+
+def test_truncated_last_frame(datFile):
+    frames = payloads(3)
+    lastFrame = rogueFrame(frames[2])
+    filename = datFile([(frames[0], 1), (frames[1], 1), lastFrame[:20]])
+    frameBytes = len(lastFrame)
+
+    index = dataReader.FrameIndex(filename, useIndexFile = False)
+    assert len(index) == 2
+    assert index.badRegions.tolist() == [[2 * frameBytes, 2 * frameBytes + 20]]
+
+    growing = dataReader.FrameIndex(filename, useIndexFile = False, growing = True)
+    assert len(growing) == 2
+    assert len(growing.badRegions) == 0
+    writeDatFile(filename, [lastFrame[20:]], mode = 'ab')
+    assert growing.update() == 1
+    assert len(growing.badRegions) == 0
+
+
+def test_size_alignment(datFile):
+    frames = payloads(1)
+    filename = datFile([(np.arange(6, dtype = 'uint8'), 1), (frames[0], 1)])
+    index = dataReader.FrameIndex(filename, useIndexFile = False)
+    assert index.size.tolist() == [len(frames[0].tobytes())]
+    assert index.badRegions.tolist() == [[0, len(rogueFrame(np.arange(6, dtype = 'uint8')))]]
+    anySize = dataReader.FrameIndex(filename, useIndexFile = False, sizeAlignment = None)
+    assert anySize.size.tolist() == [6, len(frames[0].tobytes())]
+    assert len(anySize.badRegions) == 0
@@ -0,0 +1,108 @@
+#-----------------------------------------------------------------------------
+# Title      : tests of the Tixel48x48/Cpix2 frame assembler
+#-----------------------------------------------------------------------------
+# File       : test_frameAssembler.py
+# Created    : 2026-10-18
+# Last update: 2026-10-18
+#-----------------------------------------------------------------------------
+# This file is part of the ePix rogue. It is subject to
+# the license terms in the LICENSE.txt file found in the top-level directory
+# of this distribution and at:
+#    https://confluence.slac.stanford.edu/display/ppareg/LICENSE.html.
+# No part of the ePix rogue, including this file, may be
+# copied, modified, propagated, or distributed except according to the terms
+# contained in the LICENSE.txt file.
+#-----------------------------------------------------------------------------
+import numpy as np
+import pytest
+import ePixViewer.Cameras as cameras
+import ePixViewer.frameAssembler as frameAssembler
+import ePixViewer.syntheticFrames as syntheticFrames
+
+NUM_IMAGES = 12
+
+
+def assemble(assembler, packets):
+    """returns the images completed by the packets, keyed by acquisition number"""
+    images = {}
+    for packet in packets:
+        image = assembler.addPacket(packet)
+        if image is not None:
+            # trace dword 0 is the valid flag, then header dword 0 and the acquisition number
+            images[int(image[0, 2])] = image
+    return images
+
+
+@pytest.fixture(params = ['Tixel48x48', 'Cpix2'])
+def camera(request):
+    return cameras.Camera(cameraType = request.param)
+
+
+def test_in_order_packets(camera):
+    packets = syntheticFrames.generateFrames(camera, NUM_IMAGES)
+    assembler = frameAssembler.FrameAssembler()
+    images = assemble(assembler, packets)
+    assert sorted(images) == list(range(NUM_IMAGES))
+    assert assembler.stats() == {'completedImages': NUM_IMAGES, 'droppedImages': 0, 'droppedPackets': 0, 'inFlight': 0}
+    for acqNum, image in images.items():
+        assert np.all(image[:, 0] == 1)
+        # traces: asic 0 TOT, asic 1 TOT, asic 0 TOA, asic 1 TOA (packets of an image are in that order)
+        for trace in range(frameAssembler.NUM_TRACES):
+            assert image[trace, 1:].tobytes() == packets[4 * acqNum + trace].tobytes()
+
+
+def test_interleaved_packets(camera):
+    ordered = assemble(frameAssembler.FrameAssembler(), syntheticFrames.generateFrames(camera, NUM_IMAGES))
+    assembler = frameAssembler.FrameAssembler()
+    interleaved = assemble(assembler, syntheticFrames.generateFrames(camera, NUM_IMAGES, interleave = 3))
+    assert sorted(interleaved) == sorted(ordered)
+    for acqNum in ordered:
+        assert np.array_equal(interleaved[acqNum], ordered[acqNum])
+    assert assembler.stats()['droppedImages'] == 0
+
+
+def test_missing_packet_expires(camera):
+    packets = syntheticFrames.generateFrames(camera, NUM_IMAGES)
+    # the TOA packet of ASIC 1 of acquisition 2 is lost
+    del packets[4 * 2 + 3]
+    assembler = frameAssembler.FrameAssembler(timeout = 8)
+    images = assemble(assembler, packets)
+    assert sorted(images) == [acqNum for acqNum in range(NUM_IMAGES) if acqNum != 2]
+    stats = assembler.stats()
+    assert (stats['droppedImages'], stats['inFlight']) == (1, 0)
+
+
+def test_no_timeout_keeps_incomplete_acquisition(camera):
+    packets = syntheticFrames.generateFrames(camera, 2)
+    assembler = frameAssembler.FrameAssembler(timeout = None)
+    assembler.addPacket(packets[0])
+    # without timeout an incomplete acquisition stays until its slot is needed
+    assert len(assemble(assembler, packets[4:])) == 1
+    assert assembler.stats()['inFlight'] == 1
+    assert len(assemble(assembler, packets[1:4])) == 1
+
+
+def test_late_duplicate_is_dropped(camera):
+    packets = syntheticFrames.generateFrames(camera, 3)
+    assembler = frameAssembler.FrameAssembler()
+    images = assemble(assembler, packets[:4] + [packets[1]] + packets[4:])
+    assert sorted(images) == [0, 1, 2]
+    stats = assembler.stats()
+    assert (stats['droppedPackets'], stats['inFlight'], stats['droppedImages']) == (1, 0, 0)
+
+
+def test_oldest_acquisition_dropped_without_free_slot(camera):
+    packets = syntheticFrames.generateFrames(camera, 3)
+    assembler = frameAssembler.FrameAssembler(numSlots = 2, timeout = None)
+    # one packet of each acquisition, the third one takes the slot of the first
+    assert assemble(assembler, [packets[0], packets[4], packets[8]]) == {}
+    assert (assembler.stats()['droppedImages'], assembler.stats()['inFlight']) == (1, 2)
+    assert sorted(assemble(assembler, packets[5:8] + packets[9:12])) == [1, 2]
+
+
+def test_camera_frame_building(camera):
+    packets = syntheticFrames.generateFrames(camera, 4, interleave = 2)
+    built = [camera.buildImageFrame([], packet) for packet in packets]
+    complete = [data for frameComplete, readyForDisplay, data in built if frameComplete]
+    assert len(complete) == 4
+    assert all(camera.descrambleImage(data).shape == (camera.sensorHeight, camera.sensorWidth) for data in complete)
@@ -0,0 +1,175 @@
+#-----------------------------------------------------------------------------
+# Title      : tests of the image processing tools
+#-----------------------------------------------------------------------------
+# File       : test_imgProcessing.py
+# Created    : 2026-10-18
+# Last update: 2026-10-18
+#-----------------------------------------------------------------------------
+# This file is part of the ePix rogue. It is subject to
+# the license terms in the LICENSE.txt file found in the top-level directory
+# of this distribution and at:
+#    https://confluence.slac.stanford.edu/display/ppareg/LICENSE.html.
+# No part of the ePix rogue, including this file, may be
+# copied, modified, propagated, or distributed except according to the terms
+# contained in the LICENSE.txt file.
+#-----------------------------------------------------------------------------
+import numpy as np
+import pytest
+import ePixViewer.Cameras as cameras
+import ePixViewer.imgProcessing as imgPr
+import ePixViewer.imgStream as imgStream
+
+
+##########################################################
+# PedestalEstimator
+##########################################################
+def darkFrames(numFrames = 60, shape = (8, 12), seed = 0):
+    rng = np.random.default_rng(seed)
+    return rng.normal(1000, 5, (numFrames,) + shape) + rng.normal(0, 50, shape)
+
+
+def test_pedestal_frame_by_frame():
+    frames = darkFrames()
+    estimator = imgPr.PedestalEstimator()
+    for frame in frames:
+        estimator.update(frame)
+    assert estimator.count == len(frames)
+    assert np.allclose(estimator.pedestal(), np.mean(frames, axis = 0))
+    assert np.allclose(estimator.rms(), np.std(frames, axis = 0))
+
+
+def test_pedestal_batches_and_merge():
+    frames = darkFrames()
+    first = imgPr.PedestalEstimator()
+    for batch in imgStream.iterStackSlices(frames[:35], maxBytes = frames[0].nbytes * 8):
+        first.updateBatch(batch)
+    second = imgPr.PedestalEstimator()
+    second.updateBatch(frames[35:])
+    merged = imgPr.PedestalEstimator().merge(first).merge(second)
+    assert merged.count == len(frames)
+    assert np.allclose(merged.pedestal(), np.mean(frames, axis = 0))
+    assert np.allclose(merged.rms(), np.std(frames, axis = 0))
+
+
+def test_pedestal_batch_reduced_in_slices(monkeypatch):
+    frames = darkFrames(seed = 1).astype(np.uint16)
+    # slices of 3 frames, the batch is still added in one call
+    monkeypatch.setattr(imgPr, 'PEDESTAL_SLICE_BYTES', 3 * 8 * frames[0].size)
+    estimator = imgPr.PedestalEstimator()
+    estimator.updateBatch(frames)
+    assert estimator.count == len(frames)
+    assert np.allclose(estimator.pedestal(), np.mean(frames, axis = 0))
+    assert np.allclose(estimator.rms(), np.std(frames, axis = 0))
+
+
+def test_pedestal_forgetting_follows_a_step():
+    estimator = imgPr.PedestalEstimator(forgetting = 0.1)
+    for n in range(20):
+        estimator.update(np.zeros((2, 2)))
+    for n in range(200):
+        estimator.update(np.full((2, 2), 10.0))
+    # a plain average would be at 10 * 200 / 220
+    assert np.allclose(estimator.pedestal(), 10.0, atol = 1e-6)
+    with pytest.raises(ValueError):
+        imgPr.PedestalEstimator().merge(estimator)
+
+
+##########################################################
+# CommonModeCorrection
+##########################################################
+def naiveCommonMode(images, blockShape, statistic):
+    """block by block reference of the common mode correction"""
+    corrected = np.array(images, dtype = np.float64)
+    numImages, rows, cols = corrected.shape
+    blockRows = rows if blockShape[0] is None else blockShape[0]
+    blockCols = cols if blockShape[1] is None else blockShape[1]
+    for image in corrected:
+        for row in range(0, rows, blockRows):
+            for col in range(0, cols, blockCols):
+                block = image[row:row + blockRows, col:col + blockCols]
+                block -= statistic(block)
+    return corrected
+
+
+@pytest.mark.parametrize('blockShape', [(8, 1), (32, 1), (1, None), (1, 4), (16, 4)])
+@pytest.mark.parametrize('method', ['median', 'mean'])
+def test_common_mode_matches_naive_blocks(blockShape, method):
+    rng = np.random.default_rng(2)
+    images = rng.normal(0, 10, (3, 64, 16)) + rng.normal(0, 100, (3, 64, 1))
+    correction = imgPr.CommonModeCorrection(blockShape, method = method)
+    expected = naiveCommonMode(images, blockShape, np.median if method == 'median' else np.mean)
+    assert np.allclose(correction.correct(images), expected)
+    # single image and in place
+    single = images[1].copy()
+    correction.correct(single, out = single)
+    assert np.allclose(single, expected[1])
+
+
+def test_common_mode_masked_mean_ignores_hits():
+    images = np.zeros((1, 8, 4))
+    images[0, :, 1] = 5.0
+    images[0, 3, 1] = 500.0
+    correction = imgPr.CommonModeCorrection((8, 1), method = 'maskedMean', hitThreshold = 100)
+    corrected = correction.correct(images)
+    assert np.allclose(np.delete(corrected[0, :, 1], 3), 0.0)
+    assert np.isclose(corrected[0, 3, 1], 495.0)
+
+
+def test_common_mode_integer_images():
+    images = np.arange(2 * 8 * 2, dtype = np.uint16).reshape(2, 8, 2)
+    corrected = imgPr.CommonModeCorrection((8, 1)).correct(images)
+    assert corrected.dtype == np.float32
+    assert np.allclose(corrected, naiveCommonMode(images, (8, 1), np.median))
+
+
+def test_camera_common_mode_groupings():
+    camera = cameras.Camera(cameraType = 'cryo64xN')
+    # cryo images are [channels, samples], the blocks run along the channels
+    assert sorted(camera.commonModeBlocks) == ['adc', 'bank']
+    assert camera.commonModeCorrection('bank').blockShape == (32, 1)
+    with pytest.raises(ValueError):
+        camera.commonModeCorrection('row')
+
+
+##########################################################
+# HistogramAccumulator
+##########################################################
+def test_histogram_of_integer_codes():
+    rng = np.random.default_rng(3)
+    data = rng.integers(0, 4096, (5, 4, 300), dtype = np.uint16)
+    accumulator = imgPr.HistogramAccumulator(4, numCodes = 4096)
+    accumulator.update(data[:2])
+    accumulator.update(data[2:])
+    for channel in range(4):
+        expected, edges = np.histogram(data[:, channel, :], bins = np.arange(4097))
+        assert np.array_equal(accumulator.counts[channel], expected)
+    assert accumulator.underflow.sum() == accumulator.overflow.sum() == 0
+
+
+def test_histogram_of_wide_bins_with_under_and_overflow():
+    rng = np.random.default_rng(4)
+    data = rng.uniform(0, 1000, (3, 300, 2))
+    minCode = np.array([100.0, 50.0])
+    accumulator = imgPr.HistogramAccumulator(2, numCodes = 64, minCode = minCode, binWidth = 8, channelAxis = -1)
+    accumulator.update(data)
+    edges = accumulator.binEdges()
+    for channel in range(2):
+        values = data[..., channel]
+        expected, unused = np.histogram(values, bins = edges[channel])
+        assert np.array_equal(accumulator.counts[channel], expected)
+        assert accumulator.underflow[channel] == np.count_nonzero(values < edges[channel, 0])
+        assert accumulator.overflow[channel] == np.count_nonzero(values >= edges[channel, -1])
+
+
+def test_histogram_merge():
+    rng = np.random.default_rng(5)
+    data = rng.integers(0, 256, (4, 3, 50))
+    whole = imgPr.HistogramAccumulator(3, numCodes = 256)
+    whole.update(data)
+    first = imgPr.HistogramAccumulator(3, numCodes = 256)
+    first.update(data[:1])
+    second = imgPr.HistogramAccumulator(3, numCodes = 256)
+    second.update(data[1:])
+    assert np.array_equal(first.merge(second).counts, whole.counts)
+    with pytest.raises(ValueError):
+        first.merge(imgPr.HistogramAccumulator(3, numCodes = 128))
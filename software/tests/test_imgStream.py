@@ -0,0 +1,97 @@
+#-----------------------------------------------------------------------------
+# Title      : tests of the batch by batch image pipeline
+#-----------------------------------------------------------------------------
+# File       : test_imgStream.py
+# Created    : 2026-10-18
+# Last update: 2026-10-18
+#-----------------------------------------------------------------------------
+# This file is part of the ePix rogue. It is subject to
+# the license terms in the LICENSE.txt file found in the top-level directory
+# of this distribution and at:
+#    https://confluence.slac.stanford.edu/display/ppareg/LICENSE.html.
+# No part of the ePix rogue, including this file, may be
+# copied, modified, propagated, or distributed except according to the terms
+# contained in the LICENSE.txt file.
+#-----------------------------------------------------------------------------
+import numpy as np
+import pytest
+import ePixViewer.Cameras as cameras
+import ePixViewer.dataReader as dataReader
+import ePixViewer.imgStream as imgStream
+import ePixViewer.syntheticFrames as syntheticFrames
+
+NUM_IMAGES = 7
+
+
+@pytest.fixture
+def cryoFile(datFile):
+    """cryo64xN file of NUM_IMAGES images (channel 1) with a frame of channel 2 in between.
+       Returns (camera, file name, [images, rows, cols] images)."""
+    camera = cameras.Camera(cameraType = 'cryo64xN')
+    frames = syntheticFrames.generateFrames(camera, NUM_IMAGES, samples = 8)
+    filename = datFile([(frame, 1) for frame in frames[:3]] + [(np.zeros(4, dtype = 'uint32'), 2)] +
+                       [(frame, 1) for frame in frames[3:]])
+    images = np.stack([camera.descrambleImage(frame) for frame in frames])
+    return camera, filename, images
+
+
+def test_batches_from_file_match_the_images(cryoFile):
+    camera, filename, images = cryoFile
+    # small batches, so the images span several of them
+    batches = list(imgStream.iterImageBatchesFromFile(camera, filename, maxBytes = 3 * images[0].nbytes))
+    assert len(batches) > 1
+    assert np.array_equal(imgStream.stackImages(batches), images)
+    assert np.array_equal(imgStream.stackImages(imgStream.iterImageBatchesFromFile(camera, filename, maxFrames = 4)), images[:4])
+    size = len(syntheticFrames.generateFrames(camera, 1, samples = 8)[0])
+    assert imgStream.stackImages(imgStream.iterImageBatchesFromFile(camera, filename, payloadSize = size + 1)) == []
+
+
+def test_batchSelect_and_batchImages(cryoFile):
+    camera, filename, images = cryoFile
+    def batches():
+        return imgStream.iterImageBatchesFromFile(camera, filename, maxBytes = 2 * images[0].nbytes)
+    [traces, averages] = imgStream.batchSelect(batches(), lambda batch: (batch[:, 0, [1, 5]], np.mean(batch, axis = 2)))
+    assert np.array_equal(traces, images[:, 0, [1, 5]])
+    assert np.allclose(averages, np.mean(images, axis = 2))
+    assert np.array_equal(imgStream.batchSelect(batches(), lambda batch: batch[:, 3, 2]), images[:, 3, 2])
+    assert imgStream.batchSelect(iter([]), lambda batch: batch) is None
+    # numbers out of order, repeated or past the last image
+    assert np.array_equal(imgStream.batchImages(batches(), [5, 0, 5, 2, 40]), images[[0, 2, 5]])
+
+
+def test_reductions_of_slices_match_numpy():
+    images = np.random.default_rng(0).integers(0, 4096, (25, 6, 9)).astype('uint16')
+    slices = list(imgStream.iterStackSlices(images, maxBytes = 4 * images[0].nbytes))
+    assert [len(part) for part in slices] == [4] * 6 + [1]
+    [mean, std] = imgStream.batchMeanStd(slices)
+    assert np.allclose(mean, images.mean(axis = 0))
+    assert np.allclose(std, images.std(axis = 0))
+    bins = np.arange(0, 4097, 256)
+    assert np.array_equal(imgStream.batchHistogram(slices, bins)[0], np.histogram(images, bins)[0])
+    assert imgStream.batchMeanStd(iter([])) == [None, None]
+
+
+def test_stackImages_of_mixed_shapes_raises():
+    with pytest.raises(ValueError):
+        imgStream.stackImages([np.zeros((2, 64, 8)), np.zeros((1, 64, 9))])
+
+
+def test_batchToHdf5(tmp_path, cryoFile):
+    h5py = pytest.importorskip('h5py')
+    camera, filename, images = cryoFile
+    with h5py.File(tmp_path / 'images.hdf5', 'w') as f:
+        batches = imgStream.iterImageBatchesFromFile(camera, filename, maxBytes = 3 * images[0].nbytes)
+        assert imgStream.batchToHdf5(batches, f, 'adcData') == NUM_IMAGES
+        assert np.array_equal(f['adcData'][:], images)
+
+
+def test_decodeFileHeaders_with_an_open_reader(cryoFile):
+    camera, filename, images = cryoFile
+    frameNumbers, headers = imgStream.decodeFileHeaders(camera, filename)
+    reader = dataReader.MappedFrameReader(filename, index = dataReader.FrameIndex(filename, useIndexFile = False))
+    readerFrameNumbers, readerHeaders = imgStream.decodeFileHeaders(camera, filename, reader = reader)
+    assert np.array_equal(readerFrameNumbers, frameNumbers)
+    assert np.array_equal(readerHeaders, headers)
+    # the reader given is left open for the caller
+    assert len(reader.frame(frameNumbers[0])) > 0
+    reader.close()
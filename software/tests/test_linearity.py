@@ -0,0 +1,95 @@
+#-----------------------------------------------------------------------------
+# Title      : tests of the ADC linearity analysis
+#-----------------------------------------------------------------------------
+# File       : test_linearity.py
+# Created    : 2026-10-18
+# Last update: 2026-10-18
+#-----------------------------------------------------------------------------
+# This file is part of the ePix rogue. It is subject to
+# the license terms in the LICENSE.txt file found in the top-level directory
+# of this distribution and at:
+#    https://confluence.slac.stanford.edu/display/ppareg/LICENSE.html.
+# No part of the ePix rogue, including this file, may be
+# copied, modified, propagated, or distributed except according to the terms
+# contained in the LICENSE.txt file.
+#-----------------------------------------------------------------------------
+import numpy as np
+import pytest
+import ePixViewer.linearity as linearity
+
+NUM_CHANNELS = 4
+NUM_BITS = 8
+MISSING_CODE = 100
+
+
+def rampImages(numImages = 3, periods = 4):
+    """[images, channels, samples] ideal ramps, the last channel never outputs MISSING_CODE"""
+    ramp = np.tile(np.arange(1 << NUM_BITS, dtype = np.uint16), periods)
+    images = np.broadcast_to(ramp, (numImages, NUM_CHANNELS, ramp.size)).copy()
+    images[:, -1][images[:, -1] == MISSING_CODE] = MISSING_CODE + 1
+    return images
+
+
+def test_ramp_with_missing_code():
+    analysis = linearity.LinearityAnalysis(numChannels = NUM_CHANNELS, numBits = NUM_BITS, signal = 'ramp')
+    for image in rampImages():
+        analysis.update(image)
+    results = analysis.results()
+    assert results['firstCode'].tolist() == [0] * NUM_CHANNELS
+    assert results['lastCode'].tolist() == [(1 << NUM_BITS) - 1] * NUM_CHANNELS
+    assert results['numMissingCodes'].tolist() == [0] * (NUM_CHANNELS - 1) + [1]
+    assert np.flatnonzero(results['missingCodes'][-1]).tolist() == [MISSING_CODE]
+
+    dnl, inl = results['dnl'], results['inl']
+    # the end codes are not analysed
+    assert np.all(np.isnan(dnl[:, [0, -1]])) and np.all(np.isnan(inl[:, [0, -1]]))
+    assert np.allclose(dnl[:-1, 1:-1], 0) and np.allclose(inl[:-1, 1:-1], 0)
+    assert np.isclose(dnl[-1, MISSING_CODE], -1) and np.isclose(dnl[-1, MISSING_CODE + 1], 1)
+    others = np.ones(dnl.shape[1], dtype = bool)
+    others[[0, MISSING_CODE, MISSING_CODE + 1, -1]] = False
+    assert np.allclose(dnl[-1, others], 0)
+    # the transition above the missing code comes one LSB early, the codes after it are back in place
+    assert np.isclose(inl[-1, MISSING_CODE], -1)
+    assert np.allclose(inl[-1, MISSING_CODE + 1:-1], 0)
+    assert np.allclose(results['maxDnl'], [0] * (NUM_CHANNELS - 1) + [1])
+
+
+def test_batches_and_merge_match_single_pass():
+    images = rampImages()
+    whole = linearity.LinearityAnalysis(numChannels = NUM_CHANNELS, numBits = NUM_BITS)
+    whole.update(images)
+    first = linearity.LinearityAnalysis(numChannels = NUM_CHANNELS, numBits = NUM_BITS)
+    first.update(images[:1])
+    second = linearity.LinearityAnalysis(numChannels = NUM_CHANNELS, numBits = NUM_BITS)
+    second.update(images[1:])
+    merged = first.merge(second).results()
+    for name, value in whole.results().items():
+        assert np.array_equal(value, merged[name], equal_nan = True)
+    with pytest.raises(ValueError):
+        first.merge(linearity.LinearityAnalysis(numChannels = NUM_CHANNELS, numBits = NUM_BITS, signal = 'sine'))
+
+
+def test_transfer_fit():
+    rng = np.random.default_rng(0)
+    gain = np.array([2.0, 2.5, 3.0, 3.5])
+    offset = np.array([10.0, 20.0, 30.0, 40.0])
+    analysis = linearity.LinearityAnalysis(numChannels = NUM_CHANNELS, numBits = 12)
+    for stimulus in np.linspace(0, 1000, 11):
+        codes = gain[:, None] * stimulus + offset[:, None] + rng.normal(0, 1, (NUM_CHANNELS, 200))
+        analysis.update(np.round(codes).astype(np.uint16), stimulus = stimulus)
+    results = analysis.results()
+    assert np.allclose(results['gain'], gain, rtol = 1e-3)
+    assert np.allclose(results['offset'], offset, atol = 0.5)
+    assert np.all(results['residualRms'] < 1.5)
+
+
+def test_hdf5_round_trip(tmp_path):
+    h5py = pytest.importorskip('h5py')
+    analysis = linearity.LinearityAnalysis(numChannels = NUM_CHANNELS, numBits = NUM_BITS)
+    analysis.update(rampImages())
+    with h5py.File(tmp_path / 'linearity.h5', 'w') as h5File:
+        analysis.toHdf5(h5File)
+    with h5py.File(tmp_path / 'linearity.h5', 'r') as h5File:
+        loaded = linearity.LinearityAnalysis.fromHdf5(h5File)
+    assert np.array_equal(loaded.histogram.counts, analysis.histogram.counts)
+    assert loaded.results()['numMissingCodes'].tolist() == analysis.results()['numMissingCodes'].tolist()
@@ -0,0 +1,77 @@
+#-----------------------------------------------------------------------------
+# Title      : tests of the noise spectrum
+#-----------------------------------------------------------------------------
+# File       : test_noiseSpectrum.py
+# Created    : 2026-10-18
+# Last update: 2026-10-18
+#-----------------------------------------------------------------------------
+# This file is part of the ePix rogue. It is subject to
+# the license terms in the LICENSE.txt file found in the top-level directory
+# of this distribution and at:
+#    https://confluence.slac.stanford.edu/display/ppareg/LICENSE.html.
+# No part of the ePix rogue, including this file, may be
+# copied, modified, propagated, or distributed except according to the terms
+# contained in the LICENSE.txt file.
+#-----------------------------------------------------------------------------
+import numpy as np
+import pytest
+import ePixViewer.noiseSpectrum as noiseSpectrum
+
+SAMPLE_RATE = 1000.0
+
+
+def noiseFrames(numFrames = 5, numChannels = 3, numSamples = 1024, seed = 0):
+    rng = np.random.default_rng(seed)
+    return rng.normal(100, 2, (numFrames, numChannels, numSamples))
+
+
+def test_matches_scipy_welch():
+    signal = pytest.importorskip('scipy.signal')
+    frames = noiseFrames()
+    spectrum = noiseSpectrum.NoiseSpectrum(segmentLength = 256, overlap = 0.5, sampleRate = SAMPLE_RATE)
+    for frame in frames:
+        spectrum.update(frame)
+    frequencies, psd = signal.welch(frames, fs = SAMPLE_RATE, window = 'hann', nperseg = 256, noverlap = 128,
+                                    detrend = 'constant', axis = -1)
+    assert np.allclose(spectrum.frequencies(), frequencies)
+    # every frame has the same number of segments, so the mean of the per frame spectra is the Welch average
+    assert np.allclose(spectrum.psd(), np.mean(psd, axis = 0))
+
+
+def test_integrated_noise_is_the_rms():
+    frames = noiseFrames(numFrames = 20)
+    spectrum = noiseSpectrum.NoiseSpectrum(sampleRate = SAMPLE_RATE)
+    spectrum.update(frames)
+    rms = noiseSpectrum.integratedNoise(spectrum.frequencies(), spectrum.psd())
+    # the Hann window keeps the power of white noise, up to the statistics of 20 frames
+    assert np.allclose(rms, np.mean(np.std(frames, axis = 2), axis = 0), rtol = 0.05)
+
+
+def test_batches_and_merge_match_single_pass():
+    frames = noiseFrames()
+    whole = noiseSpectrum.NoiseSpectrum(segmentLength = 128, sampleRate = SAMPLE_RATE)
+    whole.update(frames)
+    first = noiseSpectrum.NoiseSpectrum(segmentLength = 128, sampleRate = SAMPLE_RATE)
+    first.update(frames[:2])
+    second = noiseSpectrum.NoiseSpectrum(segmentLength = 128, sampleRate = SAMPLE_RATE)
+    for frame in frames[2:]:
+        second.update(frame)
+    merged = noiseSpectrum.NoiseSpectrum(segmentLength = 128, sampleRate = SAMPLE_RATE).merge(first).merge(second)
+    assert merged.numSegments == whole.numSegments
+    assert np.allclose(merged.psd(), whole.psd())
+    with pytest.raises(ValueError):
+        merged.merge(noiseSpectrum.NoiseSpectrum(segmentLength = 64, sampleRate = SAMPLE_RATE).merge(first))
+    with pytest.raises(ValueError):
+        whole.update(frames[:, :2])
+
+
+def test_pickup_line_is_found():
+    frames = noiseFrames(numChannels = 2)
+    time = np.arange(frames.shape[2]) / SAMPLE_RATE
+    frames[:, 1] += 3 * np.sin(2 * np.pi * 125.0 * time)
+    spectrum = noiseSpectrum.NoiseSpectrum(segmentLength = 256, sampleRate = SAMPLE_RATE)
+    spectrum.update(frames)
+    frequencies, heights = noiseSpectrum.pickupLines(spectrum.frequencies(), spectrum.psd(), numLines = 3)
+    assert frequencies[1, 0] == 125.0
+    assert heights[1, 0] > 20
+    assert heights[0, 0] < heights[1, 0] / 10